@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up. The live product feed is served by a plain
+# ASGI app so that thousands of idle watchers do not hold Django's threads.
+from legerity import live  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].startswith(live.PREFIX):
+        await live.application(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await live.lifespan(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
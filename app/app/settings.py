@@ -62,6 +62,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'helpers.middleware.HealthCheckMiddleware',  # /healthz and /readyz probes
+    'helpers.middleware.ProfilingMiddleware',  # Staff profiling on request
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
 
@@ -98,6 +100,10 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Longest a single SQL statement may run, in milliseconds (0 disables); run.sh
+# sets it for the web workers only, see helpers.db
+REQUEST_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 0))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -107,6 +113,55 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD'),
     }
 }
+if REQUEST_STATEMENT_TIMEOUT:
+    DATABASES['default']['OPTIONS'] = {
+        'options': f'-c statement_timeout={REQUEST_STATEMENT_TIMEOUT}',
+    }
+
+# Optional read replica used by reporting queries
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ.get('DB_REPLICA_HOST'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+REPORTS_DATABASE = 'replica' if 'replica' in DATABASES else 'default'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# 'shared' is the cache every worker sees: Redis when REDIS_URL is set, else
+# a per-process stand-in. 'default' keeps a bounded per-worker copy of it in
+# memory, see helpers.cache.
+if os.environ.get('REDIS_URL'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL'),
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+
+CACHES = {
+    'shared': SHARED_CACHE,
+    'default': {
+        'BACKEND': 'helpers.cache.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            # Per-worker memory budget in bytes
+            'L1_MAX_BYTES': int(os.environ.get('CACHE_L1_MAX_BYTES', 16 * 1024 * 1024)),
+            # Longest a worker serves an entry from memory, in seconds
+            'L1_TIMEOUT': float(os.environ.get('CACHE_L1_TIMEOUT', 60)),
+            # How often, in seconds, each worker applies other workers' invalidations
+            'SYNC_INTERVAL': float(os.environ.get('CACHE_SYNC_INTERVAL', 1)),
+            # Longest a recompute holds off other workers, in seconds
+            'FLIGHT_TIMEOUT': float(os.environ.get('CACHE_FLIGHT_TIMEOUT', 10)),
+        },
+    },
+}
 
 
 # Password validation
@@ -159,10 +214,75 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'customer.authentication.CachedJWTAuthentication',
     ),
+    # Trust REMOTE_ADDR only; nginx passes the client address through uwsgi_params.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '20/min',
+        'login_email': '5/min',
+        'register_ip': '10/hour',
+        'token_refresh_ip': '60/min',
+        'checkout_user': '10/min',
+        'checkout_ip': '30/min',
+    },
 }
 
+# How long responses to Idempotency-Key requests are kept for replay
+IDEMPOTENCY_KEY_TTL = timedelta(hours=int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24)))
+
+# Upper bound on storefront fragment lifetime; changes invalidate them sooner
+STOREFRONT_CACHE_TTL = int(os.environ.get('STOREFRONT_CACHE_TTL', 3600))
+
+# Per-worker product snapshot cache: memory budget and how often, in seconds,
+# each worker checks the shared version for changes made by other workers
+PRODUCT_SNAPSHOT_CACHE_BYTES = int(os.environ.get('PRODUCT_SNAPSHOT_CACHE_BYTES', 4 * 1024 * 1024))
+PRODUCT_SNAPSHOT_VERSION_CHECK = float(os.environ.get('PRODUCT_SNAPSHOT_VERSION_CHECK', 1))
+# Seconds a product snapshot is reused; bounds how long checkouts' stock
+# changes, which do not invalidate snapshots, go unseen
+PRODUCT_SNAPSHOT_TTL = float(os.environ.get('PRODUCT_SNAPSHOT_TTL', 30))
+
+# Seconds an authenticated user is served from the cache; saves and deletes
+# invalidate it sooner
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 300))
+
+# Milliseconds inside helpers.db.long_statements() (exports, catalog imports)
+LONG_STATEMENT_TIMEOUT = int(os.environ.get('DB_LONG_STATEMENT_TIMEOUT', 600000))
+
+# Seconds a worker reuses a passing /readyz result before checking again
+HEALTH_CHECK_TTL = float(os.environ.get('HEALTH_CHECK_TTL', 5))
+
+# Per-request profiles for staff: where they are kept, how many, and how
+# long, in seconds, a profiling token from the admin stays valid
+PROFILE_ROOT = os.environ.get('PROFILE_ROOT', '/vol/web/profiles')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))
+PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', 3600))
+
+# Slow query sampling: statements over the threshold (0 disables) on these
+# apps' tables are aggregated per fingerprint, flushed to the database at
+# most every flush interval, and get an EXPLAIN plan at most once per
+# explain interval; all times in seconds unless suffixed with _MS
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_APPS = ('legerity', 'customer')
+SLOW_QUERY_FLUSH_INTERVAL = float(os.environ.get('SLOW_QUERY_FLUSH_INTERVAL', 30))
+SLOW_QUERY_EXPLAIN_INTERVAL = int(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', 24 * 60 * 60))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.environ.get('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', 5000))
+SLOW_QUERY_RETENTION_DAYS = int(os.environ.get('SLOW_QUERY_RETENTION_DAYS', 30))
+
+# Prebuilt OpenAPI schema written by the build_schema command; SCHEMA_LIVE
+# regenerates it on every request instead (the default with DEBUG)
+SCHEMA_ROOT = os.environ.get('SCHEMA_ROOT', '/vol/web/schema')
+SCHEMA_LIVE = bool(int(os.environ.get('SCHEMA_LIVE', DEBUG)))
+
+# Live product feed served by app.asgi: seconds between SSE heartbeats, the
+# longest a long poll waits, how many recent changes each process keeps for
+# resuming clients, how many changes may queue for one client before it is
+# told to reload, and the most product ids one client may watch
+LIVE_HEARTBEAT = float(os.environ.get('LIVE_HEARTBEAT', 15))
+LIVE_POLL_TIMEOUT = float(os.environ.get('LIVE_POLL_TIMEOUT', 25))
+LIVE_BACKLOG = int(os.environ.get('LIVE_BACKLOG', 1000))
+LIVE_QUEUE_SIZE = int(os.environ.get('LIVE_QUEUE_SIZE', 200))
+LIVE_MAX_IDS = int(os.environ.get('LIVE_MAX_IDS', 500))
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Legerity',
@@ -233,6 +353,9 @@ JAZZMIN_SETTINGS = {
     "site_logo": "admin/legerity.png",
     "show_sidebar": True,
     "navigation_expanded": True,
+    "topmenu_links": [
+        {"name": "Request profiles", "url": "admin-profiles"},
+    ],
     "hide_models": [
         "token_blacklist.OutstandingToken",
         "token_blacklist.BlacklistedToken",
@@ -17,19 +17,25 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
+from helpers.views import (CacheStatsView, SchemaDocsView, SchemaView, VersionedSchemaView,
+                           profile_detail, profile_download, profile_list)
 
 from django.conf.urls.static import static
 from django.conf import settings
 
 urlpatterns = [
+    path('admin/profiles/', admin.site.admin_view(profile_list), name='admin-profiles'),
+    path('admin/profiles/<str:profile_id>/', admin.site.admin_view(profile_detail),
+         name='admin-profile'),
+    path('admin/profiles/<str:profile_id>/download/', admin.site.admin_view(profile_download),
+         name='admin-profile-download'),
     path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
-    path('api/docs/', SpectacularSwaggerView.as_view(url_name='api-schema'),
+    path('api/schema/', SchemaView.as_view(), name='api-schema'),
+    path('api/schema/<str:version>/', VersionedSchemaView.as_view(),
+         name='api-schema-version'),
+    path('api/docs/', SchemaDocsView.as_view(url_name='api-schema'),
          name='api-docs'),
+    path('api/cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
 
     path('tinymce/', include('tinymce.urls')),  # Add TinyMCE URLs
     path('legerity/', include('legerity.urls')),  # Legerity
@@ -7,10 +7,18 @@ For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 """
 
+import gc
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+# Import every view, serializer and admin module now, in the uwsgi master, and
+# move the resulting objects out of the collector's reach so forked workers
+# keep sharing their memory pages.
+get_resolver().url_patterns
+gc.freeze()
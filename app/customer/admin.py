@@ -1,4 +1,11 @@
 from django.contrib import admin
 from customer.models import User
 # Register your models here.
-admin.site.register(User)
+
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    list_display = ('id', 'email', 'fullname', 'is_active', 'is_staff')
+    list_filter = ('is_staff', 'is_active')
+    search_fields = ('email', 'fullname')
+    ordering = ('id',)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CustomerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'customer'
+
+    def ready(self):
+        # Connect the cached authentication invalidation receivers.
+        from customer import signals  # noqa: F401
@@ -0,0 +1,48 @@
+'''
+JWT authentication that reads the token's user through the default cache.
+
+The user is cached without its password hash for AUTH_USER_CACHE_TTL
+seconds, so most authenticated requests find it in the worker's memory
+instead of querying the database. Saves and deletes drop the entry on every
+worker (customer/signals.py); changes made with ``QuerySet.update`` are only
+picked up when the entry expires.
+'''
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+USER_KEY = 'customer:auth-user:{}'
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation compares the token with the current password hash.
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = cache.get_or_set(USER_KEY.format(user_id), lambda: self.load_user(user_id),
+                                timeout=settings.AUTH_USER_CACHE_TTL)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+    def load_user(self, user_id):
+        # Unknown ids are cached as None too, so a deleted user's tokens stay cheap.
+        return (self.user_model.objects.defer('password')
+                .filter(**{api_settings.USER_ID_FIELD: user_id}).first())
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    ''' Document CachedJWTAuthentication as the same bearer scheme. '''
+    target_class = CachedJWTAuthentication
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.7 on 2026-10-19 16:28
+
+import django.core.validators
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+def drop_field_index(alter_field, *indexes):
+    ''' Apply ``alter_field`` to the state but drop its indexes concurrently. '''
+    return migrations.SeparateDatabaseAndState(
+        state_operations=[alter_field],
+        database_operations=[
+            migrations.RunSQL(
+                f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"',
+                reverse_sql=f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON {definition}',
+            )
+            for name, definition in indexes
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('customer', '0002_remove_user_phone_number_alter_user_email'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Upper('email'), name='email_upper'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='user',
+            name='email',
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.EmailField(max_length=255, unique=True, validators=[django.core.validators.EmailValidator(message='Enter a valid email address.')], verbose_name='Email'),
+        ),
+        drop_field_index(
+            migrations.AlterField(
+                model_name='user',
+                name='is_active',
+                field=models.BooleanField(default=True),
+            ),
+            ('customer_user_is_active_0cb6be26', '"customer_user" ("is_active")'),
+        ),
+        drop_field_index(
+            migrations.AlterField(
+                model_name='user',
+                name='is_staff',
+                field=models.BooleanField(default=False),
+            ),
+            ('customer_user_is_staff_96cc0883', '"customer_user" ("is_staff")'),
+        ),
+    ]
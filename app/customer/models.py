@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
+from django.db.models.functions import Upper
 from django.core.validators import EmailValidator
 from django.utils.translation import gettext_lazy as _
 # Create your models here.
@@ -28,12 +29,11 @@ class User(AbstractBaseUser, PermissionsMixin):
         _('Email'),
         max_length=255,
         unique=True,
-        db_index=True,
         validators=[EmailValidator(message=_("Enter a valid email address."))]
     )
     fullname = models.CharField(_('Fullname'), max_length=255)
-    is_active = models.BooleanField(default=True, db_index=True)
-    is_staff = models.BooleanField(default=False, db_index=True)
+    is_active = models.BooleanField(default=True)
+    is_staff = models.BooleanField(default=False)
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
 
     objects = UserManager()
@@ -43,7 +43,8 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     class Meta:
         indexes = [
-            models.Index(fields=['email'], name='email'),
+            # Serves case-insensitive (email__iexact) lookups.
+            models.Index(Upper('email'), name='email_upper'),
             models.Index(fields=['is_active'], name='active'),
             models.Index(fields=['is_staff'], name='staff')
         ]
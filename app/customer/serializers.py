@@ -20,7 +20,7 @@ class RegisterSerializer(serializers.ModelSerializer):
             validate_email(value)
         except DjangoValidationError:
             raise serializers.ValidationError("Enter a valid email address.")
-        if User.objects.filter(email=value).exists():
+        if User.objects.filter(email__iexact=value).exists():
             raise serializers.ValidationError("This email is already in use.")
         return value
 
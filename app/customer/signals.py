@@ -0,0 +1,18 @@
+'''
+Drop cached authentication lookups when users change.
+'''
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from customer.authentication import USER_KEY
+from customer.models import User
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login only, which the cached user does not need to be fresh.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        key = USER_KEY.format(instance.pk)
+        transaction.on_commit(lambda: cache.delete(key))
@@ -1,3 +1,51 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from customer.models import User
+from helpers.testing import LOCMEM_CACHES, QueryBudgetMixin
+
+PASSWORD = 'Sufficiently-long-2024'
+
+
+@override_settings(CACHES=LOCMEM_CACHES,
+                   PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AuthQueryTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password=PASSWORD)
+
+    def test_register(self):
+        response = self.assertQueryBudget(
+            3, self.client.post, '/auth/register/',
+            {'email': 'new@example.com', 'fullname': 'New Customer', 'password': PASSWORD},
+            format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_login(self):
+        response = self.assertQueryBudget(
+            2, self.client.post, '/auth/login/',
+            {'email': 'buyer@example.com', 'password': PASSWORD}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_token_refresh(self):
+        refresh = self.client.post('/auth/login/', {'email': 'buyer@example.com',
+                                                    'password': PASSWORD}, format='json')
+        response = self.assertQueryBudget(
+            13, self.client.post, '/auth/token/refresh/',
+            {'refresh': refresh.data['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_authenticated_user_is_cached(self):
+        login = self.client.post('/auth/login/', {'email': 'buyer@example.com',
+                                                  'password': PASSWORD}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {login.data["access"]}')
+        self.assertQueryBudget(2, self.client.get, '/legerity/orders/', label='cold')
+        response = self.assertQueryBudget(1, self.client.get, '/legerity/orders/', label='warm')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        response = self.client.get('/legerity/orders/')
+        self.assertEqual(response.status_code, 401, response.content)
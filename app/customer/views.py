@@ -3,11 +3,15 @@ from rest_framework.response import Response
 from customer.serializers import RegisterSerializer, LoginSerializer
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.views import TokenRefreshView
+from helpers.throttling import ScopedEmailThrottle, ScopedIPThrottle
 
 User = get_user_model()
 
 
 class CustomTokenRefreshView(TokenRefreshView):
+    throttle_scope = 'token_refresh'
+    throttle_classes = [ScopedIPThrottle]
+
     def post(self, request, *args, **kwargs):
         response = super().post(request, *args, **kwargs)
         return Response({"access": response.data["access"]}, status=status.HTTP_200_OK)
@@ -16,10 +20,14 @@ class CustomTokenRefreshView(TokenRefreshView):
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
+    throttle_scope = 'register'
+    throttle_classes = [ScopedIPThrottle]
 
 
 class LoginView(generics.GenericAPIView):
     serializer_class = LoginSerializer
+    throttle_scope = 'login'
+    throttle_classes = [ScopedIPThrottle, ScopedEmailThrottle]
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
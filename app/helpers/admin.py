@@ -1,3 +1,53 @@
 from django.contrib import admin
-
+from django.core.cache import cache
+from django.utils import timezone
+from helpers.models import Job, SlowQuery
+from helpers.slowqueries import EXPLAIN_LOCK
 # Register your models here.
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'locked_by')
+    list_filter = ('status', 'name')
+    readonly_fields = ('attempts', 'last_error', 'locked_by', 'locked_at', 'created_at')
+    actions = ('retry',)
+
+    @admin.action(description='Retry selected jobs now')
+    def retry(self, request, queryset):
+        updated = queryset.filter(status=Job.Status.failed).update(
+            status=Job.Status.queued, run_at=timezone.now(), attempts=0)
+        self.message_user(request, f'{updated} jobs queued for retry.')
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('fingerprint_prefix', 'short_statement', 'source', 'calls', 'total_ms',
+                    'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'last_seen', 'has_plan')
+    list_filter = ('database',)
+    search_fields = ('statement', 'source', 'fingerprint')
+    ordering = ('-total_ms',)
+    readonly_fields = [field.name for field in SlowQuery._meta.fields]
+    actions = ('recapture_plan',)
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Fingerprint')
+    def fingerprint_prefix(self, obj):
+        return obj.fingerprint[:12]
+
+    @admin.display(description='Statement')
+    def short_statement(self, obj):
+        return obj.statement[:120]
+
+    @admin.display(description='Plan', boolean=True)
+    def has_plan(self, obj):
+        return bool(obj.plan)
+
+    @admin.action(description='Capture the plan again on next occurrence')
+    def recapture_plan(self, request, queryset):
+        keys = list(queryset.values_list('fingerprint', flat=True))
+        cache.delete_many([EXPLAIN_LOCK.format(key) for key in keys])
+        updated = queryset.update(plan_captured_at=None)
+        self.message_user(request, f'{updated} plans will be captured again.')
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.utils.module_loading import autodiscover_modules
 
 
 class HelpersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'helpers'
+
+    def ready(self):
+        # Register job handlers declared in each app's jobs module.
+        autodiscover_modules('jobs')
+
+        from helpers import slowqueries
+        connection_created.connect(slowqueries.install)
+        request_finished.connect(slowqueries.flush_if_due)
@@ -0,0 +1,381 @@
+'''
+A two-tier cache backend: a bounded in-process L1 in front of a shared L2.
+
+Reads are served from the worker's memory when they can be and fall back to
+the L2 cache alias named by LOCATION, filling L1 on the way back. Writes go
+to L2 first and are then recorded in an invalidation log kept in L2: a
+counter plus one short-lived entry per write listing the keys it touched.
+Every worker reads the counter at most every SYNC_INTERVAL seconds and drops
+the logged keys from its L1, so another worker's write is seen within that
+delay (two of them if the write is caught between its two steps); if the
+log is lost or the worker fell too far behind, it clears its L1 instead. L1
+entries also expire after L1_TIMEOUT seconds as a backstop.
+
+``get_or_set`` is single-flight: one thread per worker, and one worker per
+fleet (through an ``add`` lock in L2), recomputes a missing value while the
+others wait for it, for at most FLIGHT_TIMEOUT seconds.
+
+Values are pickled in L1, so callers never share mutable objects and the
+memory budget counts real bytes. Counters are not kept in L1; use the L2
+alias directly for rate limits, locks and round-trip checks.
+'''
+import os
+import pickle
+import threading
+import time
+import zlib
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from helpers.lru import LRUCache, sizeof
+
+LOG_SEQUENCE = 'two-tier:%s:sequence'
+LOG_ENTRY = 'two-tier:%s:%d'
+FLIGHT_LOCK = 'two-tier:%s:flight:%s'
+FLIGHT_POLL = 0.05
+
+_MISSING = object()
+
+
+def entry_size(value):
+    # Keys are strings; values are (pickled, expires) pairs.
+    if isinstance(value, tuple):
+        return len(value[0]) + sizeof(value[1])
+    return sizeof(value)
+
+
+class Tier:
+    ''' The L1 entries and invalidation log position shared by a worker's threads. '''
+
+    def __init__(self, max_bytes):
+        self.entries = LRUCache(max_bytes, sizeof=entry_size)
+        self.lock = threading.Lock()
+        self.flights = [threading.Lock() for _ in range(64)]
+        self.sequence = None
+        self.waiting = None
+        self.own = set()
+        # Bumped whenever entries may have been invalidated, so a value read
+        # from L2 before that is not put back into L1.
+        self.epoch = 0
+        self.checked = float('-inf')
+        self.counters = dict.fromkeys(
+            ('expired', 'l2_hits', 'misses', 'writes', 'published', 'applied', 'resyncs',
+             'flights', 'flight_waits'), 0)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def flight(self, key):
+        return self.flights[zlib.crc32(key.encode()) % len(self.flights)]
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+def tier_for(name, max_bytes):
+    with _tiers_lock:
+        if name not in _tiers:
+            _tiers[name] = Tier(max_bytes)
+        return _tiers[name]
+
+
+class TwoTierCache(BaseCache):
+    '''
+    Django cache backend; LOCATION is the alias of the L2 cache.
+
+    OPTIONS: L1_MAX_BYTES, L1_TIMEOUT, SYNC_INTERVAL, LOG_TIMEOUT, LOG_LENGTH
+    and FLIGHT_TIMEOUT; all times in seconds.
+    '''
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self.l1_timeout = options.get('L1_TIMEOUT', 60)
+        self.sync_interval = options.get('SYNC_INTERVAL', 1)
+        self.log_timeout = options.get('LOG_TIMEOUT', 600)
+        self.log_length = options.get('LOG_LENGTH', 1000)
+        self.flight_timeout = options.get('FLIGHT_TIMEOUT', 10)
+        self.tier = tier_for(location, options.get('L1_MAX_BYTES', 16 * 1024 * 1024))
+
+    @property
+    def shared(self):
+        return caches[self.location]
+
+    # L1
+
+    def relative(self, timeout):
+        # L2 gets this backend's TIMEOUT rather than its own default.
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def l1_expiry(self, timeout):
+        timeout = self.relative(timeout)
+        if timeout is not None and timeout <= 0:
+            return None
+        return time.monotonic() + min(self.l1_timeout, timeout or self.l1_timeout)
+
+    def l1_get(self, key):
+        entry = self.tier.entries.get(key)
+        if entry is None:
+            return _MISSING
+        pickled, expires = entry
+        if expires <= time.monotonic():
+            self.tier.entries.delete(key)
+            self.tier.count('expired')
+            return _MISSING
+        return pickle.loads(pickled)
+
+    def l1_fill(self, key, value, epoch, timeout=DEFAULT_TIMEOUT):
+        ''' Keep a value read from L2 unless an invalidation was applied since ``epoch``. '''
+        expires = self.l1_expiry(timeout)
+        if expires is None:
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.tier.lock:
+            if self.tier.epoch == epoch:
+                self.tier.entries.set(key, (pickled, expires))
+
+    def l1_write(self, items, timeout=DEFAULT_TIMEOUT):
+        ''' Replace local entries after this worker wrote them to L2. '''
+        expires = self.l1_expiry(timeout)
+        with self.tier.lock:
+            self.tier.epoch += 1
+            for key, value in items.items():
+                if expires is None:
+                    self.tier.entries.delete(key)
+                else:
+                    self.tier.entries.set(
+                        key, (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires))
+
+    def l1_drop(self, keys):
+        with self.tier.lock:
+            self.tier.epoch += 1
+            for key in keys:
+                self.tier.entries.delete(key)
+
+    # Invalidation log
+
+    def publish(self, keys):
+        ''' Log that ``keys`` changed, for the other workers to drop. '''
+        shared, sequence_key = self.shared, LOG_SEQUENCE % self.location
+        try:
+            sequence = shared.incr(sequence_key)
+        except ValueError:
+            shared.add(sequence_key, 0, timeout=None)
+            sequence = shared.incr(sequence_key)
+        shared.set(LOG_ENTRY % (self.location, sequence), list(keys), self.log_timeout)
+        with self.tier.lock:
+            if self.tier.sequence is not None and sequence > self.tier.sequence:
+                self.tier.own.add(sequence)
+            self.tier.counters['published'] += 1
+
+    def sync(self):
+        ''' Apply the log entries written since the last check, at most every SYNC_INTERVAL. '''
+        tier = self.tier
+        now = time.monotonic()
+        if now - tier.checked < self.sync_interval:
+            return
+        with tier.lock:
+            if now - tier.checked < self.sync_interval:
+                return
+            idle, tier.checked = now - tier.checked, now
+            sequence = self.shared.get(LOG_SEQUENCE % self.location)
+            if tier.sequence is None:
+                tier.sequence = sequence or 0
+                return
+            if sequence is None or sequence < tier.sequence or idle >= self.log_timeout or \
+                    sequence - tier.sequence > self.log_length:
+                # The log was lost (flushed or evicted), or entries this worker
+                # has not applied may have expired or been cut off.
+                self.resync(sequence or 0)
+                return
+            numbers = range(tier.sequence + 1, sequence + 1)
+            entries = self.shared.get_many([
+                LOG_ENTRY % (self.location, n) for n in numbers if n not in tier.own])
+            for number in numbers:
+                keys = entries.get(LOG_ENTRY % (self.location, number))
+                if number in tier.own:
+                    tier.own.discard(number)
+                elif keys is None:
+                    # Numbered but not written yet; give it one more interval.
+                    if tier.waiting == number:
+                        self.resync(sequence)
+                    else:
+                        tier.waiting = number
+                    return
+                else:
+                    tier.epoch += 1
+                    tier.counters['applied'] += 1
+                    for key in keys:
+                        tier.entries.delete(key)
+                tier.sequence = number
+            tier.waiting = None
+
+    def resync(self, sequence):
+        # Called with the tier lock held.
+        self.tier.entries.clear()
+        self.tier.epoch += 1
+        self.tier.counters['resyncs'] += 1
+        self.tier.sequence = sequence
+        self.tier.waiting = None
+        self.tier.own.clear()
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        value = self.lookup(key, version)
+        return default if value is _MISSING else value
+
+    def lookup(self, key, version=None):
+        self.sync()
+        full_key = self.make_and_validate_key(key, version=version)
+        value = self.l1_get(full_key)
+        if value is not _MISSING:
+            return value
+        epoch = self.tier.epoch
+        value = self.shared.get(full_key, _MISSING)
+        if value is _MISSING:
+            self.tier.count('misses')
+        else:
+            self.tier.count('l2_hits')
+            self.l1_fill(full_key, value, epoch)
+        return value
+
+    def get_many(self, keys, version=None):
+        self.sync()
+        found, missing = {}, {}
+        for key in keys:
+            full_key = self.make_and_validate_key(key, version=version)
+            value = self.l1_get(full_key)
+            if value is _MISSING:
+                missing[full_key] = key
+            else:
+                found[key] = value
+        if missing:
+            epoch = self.tier.epoch
+            values = self.shared.get_many(list(missing))
+            self.tier.count('l2_hits', len(values))
+            self.tier.count('misses', len(missing) - len(values))
+            for full_key, value in values.items():
+                found[missing[full_key]] = value
+                self.l1_fill(full_key, value, epoch)
+        return found
+
+    def has_key(self, key, version=None):
+        return self.lookup(key, version) is not _MISSING
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_and_validate_key(key, version=version)
+        self.shared.set(full_key, value, self.relative(timeout))
+        self.publish([full_key])
+        self.tier.count('writes')
+        self.l1_write({full_key: value}, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # No worker can hold a missing key in L1, so an add needs no broadcast.
+        full_key = self.make_and_validate_key(key, version=version)
+        added = self.shared.add(full_key, value, self.relative(timeout))
+        if added:
+            self.tier.count('writes')
+            self.l1_write({full_key: value}, timeout)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = {self.make_and_validate_key(key, version=version): value
+                 for key, value in data.items()}
+        if not items:
+            return []
+        failed = self.shared.set_many(items, self.relative(timeout))
+        self.publish(items)
+        self.tier.count('writes', len(items))
+        self.l1_write({key: value for key, value in items.items() if key not in failed}, timeout)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_and_validate_key(key, version=version)
+        return self.shared.touch(full_key, self.relative(timeout))
+
+    def delete(self, key, version=None):
+        full_key = self.make_and_validate_key(key, version=version)
+        deleted = self.shared.delete(full_key)
+        self.publish([full_key])
+        self.l1_drop([full_key])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        full_keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if full_keys:
+            self.shared.delete_many(full_keys)
+            self.publish(full_keys)
+            self.l1_drop(full_keys)
+
+    def incr(self, key, delta=1, version=None):
+        full_key = self.make_and_validate_key(key, version=version)
+        value = self.shared.incr(full_key, delta)
+        self.publish([full_key])
+        self.l1_drop([full_key])
+        return value
+
+    def clear(self):
+        # Flushing L2 drops the log too, which makes every worker resync.
+        self.shared.clear()
+        with self.tier.lock:
+            self.resync(0)
+            self.tier.checked = time.monotonic()
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        value = self.lookup(key, version)
+        if value is not _MISSING:
+            return value
+        full_key = self.make_and_validate_key(key, version=version)
+        with self.tier.flight(full_key):
+            # Another thread of this worker may have just computed it.
+            value = self.lookup(key, version)
+            if value is not _MISSING:
+                return value
+            lock = FLIGHT_LOCK % (self.location, full_key)
+            locked = self.shared.add(lock, os.getpid(), self.flight_timeout)
+            if not locked:
+                value = self.wait_for(full_key)
+                if value is not _MISSING:
+                    return value
+            try:
+                value = default() if callable(default) else default
+                self.tier.count('flights')
+                self.set(key, value, timeout, version)
+            finally:
+                if locked:
+                    self.shared.delete(lock)
+            return value
+
+    def wait_for(self, full_key):
+        ''' Wait for the worker holding the flight lock to store ``full_key``. '''
+        self.tier.count('flight_waits')
+        deadline = time.monotonic() + self.flight_timeout
+        while time.monotonic() < deadline:
+            time.sleep(FLIGHT_POLL)
+            epoch = self.tier.epoch
+            value = self.shared.get(full_key, _MISSING)
+            if value is not _MISSING:
+                self.l1_fill(full_key, value, epoch)
+                return value
+        return _MISSING
+
+    def stats(self):
+        l1 = self.tier.entries.stats()
+        with self.tier.lock:
+            counters = dict(self.tier.counters, sequence=self.tier.sequence)
+        # Expired entries were L1 hits to the LRU but are misses here.
+        lookups = l1['hits'] + l1['misses']
+        l1_hits = l1['hits'] - counters['expired']
+        hits = l1_hits + counters['l2_hits']
+        return {
+            'pid': os.getpid(),
+            'l1': l1,
+            **counters,
+            'hit_rate': round(hits / lookups, 4) if lookups else None,
+            'l1_hit_rate': round(l1_hits / lookups, 4) if lookups else None,
+        }
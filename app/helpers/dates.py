@@ -0,0 +1,16 @@
+'''
+Helpers for turning local calendar dates into aware datetimes.
+'''
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def local_midnight(day):
+    ''' Return the aware start of ``day`` in the current time zone. '''
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def local_day_range(start, end):
+    ''' Return ``[since, until)`` covering the local dates ``start`` to ``end``. '''
+    return local_midnight(start), local_midnight(end + timedelta(days=1))
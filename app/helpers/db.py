@@ -0,0 +1,35 @@
+'''
+Database session limits for web requests.
+
+Web workers connect with ``statement_timeout`` set to REQUEST_STATEMENT_TIMEOUT
+(see settings), so a runaway query ends with an error instead of tying up a
+worker thread. Work built for long runs lifts it with ``long_statements``.
+'''
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@contextmanager
+def long_statements(using=DEFAULT_DB_ALIAS):
+    ''' Allow statements up to LONG_STATEMENT_TIMEOUT, then restore the session default. '''
+    if not settings.REQUEST_STATEMENT_TIMEOUT:
+        yield
+        return
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute('SET statement_timeout = %s', [settings.LONG_STATEMENT_TIMEOUT])
+    try:
+        yield
+    finally:
+        # A rolled back transaction already undid the SET.
+        if connection.connection is not None and not connection.needs_rollback:
+            with connection.cursor() as cursor:
+                cursor.execute('SET statement_timeout TO DEFAULT')
+
+
+def long_running(rows, using=DEFAULT_DB_ALIAS):
+    ''' Iterate ``rows`` (e.g. a streamed response body) under ``long_statements``. '''
+    with long_statements(using):
+        yield from rows
@@ -0,0 +1,191 @@
+'''
+Read-only list serialization straight from ``values_list()`` rows.
+
+A FastSerializer is declared like a ModelSerializer (``Meta.model``,
+``Meta.fields`` and explicitly declared fields) and produces the same
+output, but it is compiled once per class into the columns to select and a
+generated list comprehension that turns the rows into dicts: no model
+instances, no per-field ``to_representation`` and no method dispatch.
+
+Model fields are rendered as DRF renders them: decimals as strings and
+files as (absolute, given a request) URLs; other types DRF reformats have to
+be declared explicitly. Nested objects are read over forward foreign keys in
+the same query.
+'''
+import decimal
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Model fields whose DRF representation is not the database value.
+REFORMATTED = (models.DateField, models.TimeField, models.DurationField,
+               models.UUIDField, models.JSONField)
+
+
+def decimal_renderer(max_digits, decimal_places):
+    ''' The string DRF's DecimalField renders for a value of this model field. '''
+    exponent = decimal.Decimal('.1') ** decimal_places
+    context = decimal.getcontext().copy()
+    context.prec = max_digits
+
+    def render(value):
+        return '{:f}'.format(value.quantize(exponent, context=context))
+    return render
+
+
+class Compiler:
+    ''' Collects the selected columns and the objects the generated code refers to. '''
+
+    def __init__(self, model):
+        self.model = model
+        self.columns = []
+        self.namespace = {}
+
+    def column(self, lookup):
+        if lookup not in self.columns:
+            self.columns.append(lookup)
+        return f'row[{self.columns.index(lookup)}]'
+
+    def bind(self, value):
+        name = f'_{len(self.namespace)}'
+        self.namespace[name] = value
+        return name
+
+    def model_field(self, lookup):
+        model = self.model
+        *path, name = lookup.split('__')
+        for part in path:
+            model = model._meta.get_field(part).related_model
+        return model._meta.get_field(name)
+
+
+class Field:
+    ''' One output key; ``expression`` returns the source that computes it from ``row``. '''
+
+    def __init__(self, source=None):
+        self.source = source
+
+    def expression(self, name, compiler, prefix):
+        raise NotImplementedError
+
+
+class Column(Field):
+    ''' A model field, ``source`` or the output name, rendered as DRF would. '''
+
+    def expression(self, name, compiler, prefix):
+        lookup = prefix + (self.source or name)
+        column = compiler.column(lookup)
+        field = compiler.model_field(lookup)
+        if isinstance(field, models.FileField):
+            url = compiler.bind(field.storage.url)
+            return f'(absolute({url}({column})) if {column} else None)'
+        if isinstance(field, models.DecimalField):
+            if not api_settings.COERCE_DECIMAL_TO_STRING:
+                return column
+            render = compiler.bind(decimal_renderer(field.max_digits, field.decimal_places))
+            return f'(None if {column} is None else {render}({column}))'
+        if isinstance(field, REFORMATTED):
+            raise ImproperlyConfigured(
+                f'{lookup} needs an explicit Computed field to match DRF output.')
+        return column
+
+
+class Computed(Field):
+    ''' ``function`` called with the values of ``sources``, e.g. a property over its inputs. '''
+
+    def __init__(self, function, *sources):
+        super().__init__()
+        self.function = function
+        self.sources = sources
+
+    def expression(self, name, compiler, prefix):
+        arguments = ', '.join(compiler.column(prefix + source) for source in self.sources)
+        return f'{compiler.bind(self.function)}({arguments})'
+
+
+class Nested(Field):
+    ''' ``serializer_class`` over a forward foreign key; None when it is null. '''
+
+    def __init__(self, serializer_class, source=None):
+        super().__init__(source)
+        self.serializer_class = serializer_class
+
+    def expression(self, name, compiler, prefix):
+        lookup = prefix + (self.source or name)
+        related = compiler.model_field(lookup).related_model
+        if related is not self.serializer_class.Meta.model:
+            raise ImproperlyConfigured(
+                f'{self.serializer_class.__name__} does not serialize {related.__name__}.')
+        pk = compiler.column(f'{lookup}__{related._meta.pk.name}')
+        body = self.serializer_class.dict_expression(compiler, f'{lookup}__')
+        return f'(None if {pk} is None else {body})'
+
+
+class FastSerializer:
+    '''
+    Serialize a queryset into a list of dicts: ``Serializer(queryset, context=...).data``.
+
+    Fields listed in ``Meta.fields`` but not declared are model fields.
+    '''
+
+    class Meta:
+        model = None
+        fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.declared_fields = {
+            name: value
+            for base in reversed(cls.__mro__) for name, value in vars(base).items()
+            if isinstance(value, Field)
+        }
+        cls.compiled = None
+
+    def __init__(self, queryset, context=None):
+        self.queryset = queryset
+        self.context = context or {}
+
+    @classmethod
+    def dict_expression(cls, compiler, prefix=''):
+        items = []
+        for name in cls.Meta.fields:
+            field = cls.declared_fields.get(name) or Column()
+            items.append(f'{name!r}: {field.expression(name, compiler, prefix)}')
+        return '{' + ', '.join(items) + '}'
+
+    @classmethod
+    def compile(cls):
+        ''' ``(columns, serialize)``: what to select and ``serialize(rows, absolute)``. '''
+        if cls.compiled is None:
+            compiler = Compiler(cls.Meta.model)
+            body = cls.dict_expression(compiler)
+            source = f'def serialize(rows, absolute):\n    return [{body} for row in rows]\n'
+            exec(compile(source, f'<{cls.__name__}>', 'exec'), compiler.namespace)
+            cls.compiled = tuple(compiler.columns), compiler.namespace['serialize']
+        return cls.compiled
+
+    @property
+    def data(self):
+        columns, serialize = self.compile()
+        request = self.context.get('request')
+        absolute = request.build_absolute_uri if request is not None else str
+        return serialize(self.queryset.values_list(*columns), absolute)
+
+
+class FastListMixin:
+    '''
+    Answer an unpaginated ListAPIView from ``fast_serializer_class``.
+
+    ``serializer_class`` stays in place for the schema and for paginated
+    responses, which take the regular path.
+    '''
+    fast_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(self.fast_serializer_class(
+            queryset, context=self.get_serializer_context()).data)
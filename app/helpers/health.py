@@ -0,0 +1,103 @@
+'''
+Liveness and readiness probes.
+
+``healthz`` only proves the process can answer. ``readyz`` checks the
+database, unapplied migrations and the cache; its result is kept in the
+worker for HEALTH_CHECK_TTL seconds (HEALTH_CHECK_FAILURE_TTL after a
+failure, so recovery is noticed quickly) and concurrent probes share one
+check instead of each opening a round-trip to Postgres.
+'''
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import JsonResponse
+
+HEALTH_CHECK_FAILURE_TTL = 1
+
+_lock = threading.Lock()
+_cached = {'expires': 0, 'checks': None}
+_migrated = False
+
+
+def check_database():
+    connection = connections[DEFAULT_DB_ALIAS]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Exception:
+        # Drop the broken connection so the next probe reconnects.
+        connection.close()
+        raise
+
+
+def check_migrations():
+    global _migrated
+    if _migrated:
+        # Code cannot gain migrations without a restart, so once applied stays applied.
+        return
+    executor = MigrationExecutor(connections[DEFAULT_DB_ALIAS])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    if plan:
+        raise RuntimeError(f'{len(plan)} unapplied migrations')
+    _migrated = True
+
+
+def check_cache():
+    # The shared cache itself: a round-trip through memory would prove nothing.
+    cache = caches['shared']
+    cache.set('readyz', 1, timeout=10)
+    if cache.get('readyz') != 1:
+        raise RuntimeError('cache round-trip failed')
+
+
+CHECKS = {
+    'database': check_database,
+    'migrations': check_migrations,
+    'cache': check_cache,
+}
+
+
+def run_checks():
+    results = {}
+    for name, check in CHECKS.items():
+        if name == 'migrations' and results['database'] != 'ok':
+            results[name] = 'skipped'
+            continue
+        try:
+            check()
+            results[name] = 'ok'
+        except Exception as e:
+            results[name] = f'error: {e.__class__.__name__}: {e}'
+    return results
+
+
+def readiness():
+    ''' Return the cached check results, refreshing them once they expire. '''
+    with _lock:
+        now = time.monotonic()
+        if _cached['checks'] is None or now >= _cached['expires']:
+            checks = run_checks()
+            healthy = all(result == 'ok' for result in checks.values())
+            ttl = settings.HEALTH_CHECK_TTL if healthy else HEALTH_CHECK_FAILURE_TTL
+            _cached.update(checks=checks, expires=time.monotonic() + ttl)
+        return _cached['checks']
+
+
+def probe_response(checks):
+    healthy = all(result == 'ok' for result in checks.values())
+    response = JsonResponse({'status': 'ok' if healthy else 'unavailable', 'checks': checks},
+                            status=200 if healthy else 503)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def healthz(request):
+    return probe_response({})
+
+
+def readyz(request):
+    return probe_response(readiness())
@@ -0,0 +1,129 @@
+'''
+Helpers to derive safe HTML and plain-text excerpts from rich text.
+'''
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+from django.utils.text import Truncator
+
+EXCERPT_LENGTH = 200
+
+ALLOWED_TAGS = {
+    'a', 'b', 'blockquote', 'br', 'code', 'em', 'h1', 'h2', 'h3', 'h4',
+    'h5', 'h6', 'hr', 'i', 'img', 'li', 'ol', 'p', 'pre', 's', 'span',
+    'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'th', 'thead', 'tr',
+    'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'img': {'src', 'alt', 'title', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan'},
+}
+ALLOWED_SCHEMES = {'', 'http', 'https', 'mailto'}
+URL_ATTRIBUTES = {'href', 'src'}
+VOID_TAGS = {'br', 'hr', 'img'}
+# Tags whose content is dropped together with the tag itself.
+DROPPED_TAGS = {
+    'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript',
+    'svg', 'math',
+}
+BLOCK_TAGS = {
+    'blockquote', 'br', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr',
+    'li', 'p', 'pre', 'td', 'th', 'tr',
+}
+
+
+class _Sanitizer(HTMLParser):
+    ''' Rebuild markup keeping only allow-listed tags and attributes. '''
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.dropped_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropped_depth += 1
+            return
+        if self.dropped_depth:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in ALLOWED_TAGS:
+            return
+
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        rendered = ''.join(
+            f' {name}="{escape(value, quote=True)}"'
+            for name, value in attrs
+            if name in allowed and value is not None and self._is_safe(name, value)
+        )
+        self.html.append(f'<{tag}{rendered}>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in DROPPED_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropped_depth = max(self.dropped_depth - 1, 0)
+            return
+        if self.dropped_depth:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in self.open_tags:
+            return
+        # Close any unclosed tags nested inside this one to keep output balanced.
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.html.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.dropped_depth:
+            return
+        self.html.append(escape(data, quote=False))
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.html.append(f'</{self.open_tags.pop()}>')
+
+    @staticmethod
+    def _is_safe(name, value):
+        if name not in URL_ATTRIBUTES:
+            return True
+        try:
+            scheme = urlparse(''.join(value.split())).scheme
+        except ValueError:
+            return False
+        return scheme.lower() in ALLOWED_SCHEMES
+
+
+def derive_html(value, length=EXCERPT_LENGTH):
+    ''' Return ``(sanitized_html, excerpt)`` with a single parse of ``value``. '''
+    parser = _Sanitizer()
+    parser.feed(value or '')
+    parser.close()
+    text = ' '.join(''.join(parser.text).split())
+    return ''.join(parser.html), Truncator(text).chars(length)
+
+
+def sanitize_html(value):
+    ''' Return ``value`` with disallowed tags, attributes and URLs removed. '''
+    return derive_html(value)[0]
+
+
+def html_excerpt(value, length=EXCERPT_LENGTH):
+    ''' Return a whitespace-normalized plain-text excerpt of ``value``. '''
+    return derive_html(value, length)[1]
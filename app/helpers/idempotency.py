@@ -0,0 +1,70 @@
+'''
+Idempotency-Key support for unsafe API methods.
+'''
+import hashlib
+import json
+from functools import wraps
+
+from django.db import transaction
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from helpers.models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    raw = f'{request.method} {request.path}\n{body}'
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def idempotent(scope):
+    '''
+    Replay the stored response for requests repeating an Idempotency-Key.
+
+    The key row is inserted in the same transaction as the view's writes, so
+    a concurrent duplicate blocks on the unique index until the first request
+    commits and then replays its response instead of running the view again.
+    Only successful responses are kept; anything else rolls the key back.
+    '''
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.META.get(HEADER)
+            if not key:
+                return method(view, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response({'error': 'Idempotency-Key is too long'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            with transaction.atomic():
+                record, created = IdempotencyKey.objects.get_or_create(
+                    user=request.user, scope=scope, key=key,
+                    defaults={'fingerprint': fingerprint(request)})
+                if not created:
+                    return replay(record, request)
+
+                response = method(view, request, *args, **kwargs)
+                if not status.is_success(response.status_code):
+                    transaction.set_rollback(True)
+                    return response
+
+                record.status_code = response.status_code
+                record.response = json.loads(JSONRenderer().render(response.data) or 'null')
+                record.save(update_fields=['status_code', 'response'])
+                return response
+
+        return wrapper
+    return decorator
+
+
+def replay(record, request):
+    if record.fingerprint != fingerprint(request):
+        return Response({'error': 'Idempotency-Key was already used for a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(record.response, status=record.status_code,
+                    headers={'Idempotent-Replayed': 'true'})
@@ -0,0 +1,162 @@
+'''
+A small Postgres-backed job queue.
+
+Handlers are registered with ``@job`` in each app's ``jobs`` module and
+enqueued with ``enqueue``, which writes through the caller's connection so
+the job commits or rolls back together with the surrounding transaction.
+Workers claim due jobs with ``SELECT ... FOR UPDATE SKIP LOCKED``; jobs left
+running by a worker that died are requeued on worker start and every
+REQUEUE_EVERY by a periodic job.
+'''
+import logging
+import random
+import traceback
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from helpers.models import IdempotencyKey, Job, SlowQuery
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 5
+BACKOFF_MAX = 3600
+STALE_AFTER = timedelta(minutes=15)
+REQUEUE_EVERY = timedelta(minutes=1)
+
+
+@dataclass(frozen=True)
+class Handler:
+    func: object
+    max_attempts: int
+    every: timedelta = None
+
+
+registry = {}
+
+
+def job(name, max_attempts=5, every=None):
+    ''' Register a handler; ``every`` makes it periodic. '''
+    def decorator(func):
+        registry[name] = Handler(func, max_attempts, every)
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, run_at=None, delay=None, unique_key=None):
+    '''
+    Queue ``name`` to run with ``payload`` as keyword arguments.
+
+    With ``unique_key`` the job is skipped if one with the same key is already
+    queued or running.
+    '''
+    handler = registry[name]
+    if run_at is None:
+        run_at = timezone.now() + (delay or timedelta())
+    new_job = Job(name=name, payload=payload or {}, run_at=run_at,
+                  max_attempts=handler.max_attempts, unique_key=unique_key)
+    if unique_key is None:
+        new_job.save()
+    else:
+        Job.objects.bulk_create([new_job], ignore_conflicts=True)
+    return new_job
+
+
+def schedule_periodic():
+    ''' Make sure every periodic handler has a pending run. '''
+    for name, handler in registry.items():
+        if handler.every:
+            enqueue(name, unique_key=f'periodic:{name}')
+
+
+def requeue_stale(stale_after=STALE_AFTER):
+    ''' Return jobs held by workers that died mid-run to the queue. '''
+    return Job.objects.filter(
+        status=Job.Status.running,
+        locked_at__lt=timezone.now() - stale_after,
+    ).update(status=Job.Status.queued, locked_by='', locked_at=None)
+
+
+def claim(worker_id, limit=1):
+    ''' Lock up to ``limit`` due jobs for ``worker_id`` without waiting on other workers. '''
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.Status.queued, run_at__lte=now)
+            .order_by('run_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        Job.objects.filter(id__in=ids).update(
+            status=Job.Status.running, locked_by=worker_id, locked_at=now,
+            attempts=F('attempts') + 1)
+    return list(Job.objects.filter(id__in=ids).order_by('run_at'))
+
+
+def backoff(attempts):
+    ''' Exponential delay with jitter before retrying a failed job. '''
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def run(claimed):
+    ''' Run a claimed job, then delete it, retry it later or mark it failed. '''
+    handler = registry.get(claimed.name)
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for {claimed.name!r}')
+        # The handler's writes and the job's removal commit together.
+        with transaction.atomic():
+            handler.func(**claimed.payload)
+            Job.objects.filter(id=claimed.id).delete()
+            if handler.every:
+                enqueue(claimed.name, delay=handler.every,
+                        unique_key=f'periodic:{claimed.name}')
+        return True
+    except Exception:
+        logger.exception('Job %s failed (attempt %s)', claimed, claimed.attempts)
+        claimed.last_error = traceback.format_exc()
+        claimed.locked_by, claimed.locked_at = '', None
+        if handler is None or claimed.attempts >= claimed.max_attempts:
+            claimed.status = Job.Status.failed
+        else:
+            claimed.status = Job.Status.queued
+            claimed.run_at = timezone.now() + backoff(claimed.attempts)
+        claimed.save(update_fields=['status', 'run_at', 'last_error',
+                                    'locked_by', 'locked_at'])
+        if claimed.status == Job.Status.failed and handler and handler.every:
+            # Failed rows fall outside the pending unique key, so the schedule goes on.
+            enqueue(claimed.name, delay=handler.every,
+                    unique_key=f'periodic:{claimed.name}')
+        return False
+
+
+@job('helpers.requeue_stale_jobs', every=REQUEUE_EVERY)
+def requeue_stale_jobs():
+    ''' Requeue jobs of workers that died while the others keep running. '''
+    requeue_stale()
+
+
+@job('helpers.purge_idempotency_keys', every=timedelta(hours=1))
+def purge_idempotency_keys(batch_size=5000):
+    ''' Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL. '''
+    cutoff = timezone.now() - settings.IDEMPOTENCY_KEY_TTL
+    while True:
+        ids = list(IdempotencyKey.objects.filter(created_at__lt=cutoff)
+                   .values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return
+        IdempotencyKey.objects.filter(id__in=ids).delete()
+
+
+@job('helpers.purge_slow_queries', every=timedelta(days=1))
+def purge_slow_queries():
+    ''' Forget slow query fingerprints not seen for SLOW_QUERY_RETENTION_DAYS. '''
+    cutoff = timezone.now() - timedelta(days=settings.SLOW_QUERY_RETENTION_DAYS)
+    SlowQuery.objects.filter(last_seen__lt=cutoff).delete()
@@ -0,0 +1,26 @@
+'''
+Django command to prebuild the OpenAPI schema served by the API.
+'''
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from helpers.schema import build_schema, read_artifact, write_artifact
+
+
+class Command(BaseCommand):
+    ''' Django command to write the versioned schema artifact. '''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', default=None,
+                            help='Output directory (default: SCHEMA_ROOT).')
+
+    def handle(self, *args, **options):
+        ''' Entrypoint for command. '''
+        root = options['root'] or settings.SCHEMA_ROOT
+        artifact = build_schema()
+        existing = read_artifact(root)
+        if existing and existing.version == artifact.version:
+            self.stdout.write(f'Schema {artifact.version} is already current.')
+            return
+        write_artifact(artifact, root)
+        self.stdout.write(self.style.SUCCESS(f'Schema {artifact.version} written to {root}.'))
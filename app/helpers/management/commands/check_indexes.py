@@ -0,0 +1,156 @@
+'''
+Django command to flag duplicate, redundant and unused indexes.
+'''
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+INDEXES_SQL = '''
+    SELECT t.relname, i.relname, x.indisunique OR x.indisprimary,
+           x.indkey::text, x.indclass::text,
+           COALESCE(pg_get_expr(x.indexprs, x.indrelid), ''),
+           COALESCE(pg_get_expr(x.indpred, x.indrelid), ''),
+           am.amname, pg_relation_size(x.indexrelid)
+    FROM pg_index x
+    JOIN pg_class t ON t.oid = x.indrelid
+    JOIN pg_class i ON i.oid = x.indexrelid
+    JOIN pg_am am ON am.oid = i.relam
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    WHERE n.nspname = current_schema() AND t.relname = ANY(%s)
+'''
+
+UNUSED_SQL = '''
+    SELECT s.relname, s.indexrelname, pg_relation_size(s.indexrelid)
+    FROM pg_stat_user_indexes s
+    JOIN pg_index x ON x.indexrelid = s.indexrelid
+    WHERE s.relname = ANY(%s) AND s.idx_scan = 0
+      AND NOT x.indisunique AND NOT x.indisprimary
+    ORDER BY pg_relation_size(s.indexrelid) DESC
+'''
+
+STATS_RESET_SQL = '''
+    SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()
+'''
+
+
+class Command(BaseCommand):
+    ''' Django command to report indexes that cost writes without serving reads. '''
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_labels', nargs='*',
+                            help='Limit the check to these apps (default: all).')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--no-unused', action='store_true',
+                            help='Skip the pg_stat_user_indexes usage check.')
+        parser.add_argument('--fail', action='store_true',
+                            help='Exit with an error when duplicate or redundant indexes are found.')
+
+    def handle(self, *args, **options):
+        ''' Entrypoint for command. '''
+        connection = connections[options['database']]
+        self.models = [model for model in apps.get_models()
+                       if model._meta.managed and not model._meta.proxy
+                       and (not options['app_labels']
+                            or model._meta.app_label in options['app_labels'])]
+        tables = sorted({model._meta.db_table for model in self.models})
+
+        problems = self.check_models()
+        with connection.cursor() as cursor:
+            cursor.execute(INDEXES_SQL, [tables])
+            problems += self.check_database(cursor.fetchall())
+
+        for problem in problems:
+            self.stdout.write(self.style.WARNING(problem))
+
+        if not options['no_unused']:
+            with connection.cursor() as cursor:
+                cursor.execute(STATS_RESET_SQL)
+                row = cursor.fetchone()
+                cursor.execute(UNUSED_SQL, [tables])
+                unused = cursor.fetchall()
+            since = row[0] if row and row[0] else 'server start'
+            for table, index, size in unused:
+                self.stdout.write(
+                    f'{table}.{index}: never scanned since {since} ({size} bytes).')
+
+        if problems and options['fail']:
+            raise CommandError(f'{len(problems)} index problems found.')
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('No duplicate or redundant indexes.'))
+
+    def check_models(self):
+        ''' Compare the btree column lists each model declares. '''
+        problems = []
+        for model in self.models:
+            opts = model._meta
+            declared = []
+            for field in opts.local_fields:
+                if field.primary_key:
+                    continue
+                if field.unique:
+                    declared.append((f'{field.name} (unique)', (field.column,), True))
+                elif field.db_index:
+                    declared.append((f'{field.name} (db_index)', (field.column,), False))
+            for index in opts.indexes:
+                if index.fields and not index.condition and not index.include:
+                    columns = tuple(opts.get_field(name.lstrip('-')).column
+                                    for name in index.fields)
+                    declared.append((index.name, columns, False))
+            for constraint in opts.constraints:
+                fields = getattr(constraint, 'fields', ())
+                if fields and not getattr(constraint, 'condition', None):
+                    columns = tuple(opts.get_field(name).column for name in fields)
+                    declared.append((constraint.name, columns, True))
+
+            for name, columns, unique in declared:
+                for other, other_columns, other_unique in declared:
+                    if name == other or unique:
+                        continue
+                    if self.covers(columns, name, other_columns, other, other_unique):
+                        problems.append(
+                            f'{opts.label}: index {name} {list(columns)} is covered by {other} '
+                            f'{list(other_columns)}.')
+                        break
+        return problems
+
+    def check_database(self, rows):
+        ''' Find identical or left-prefix btree indexes among the live indexes. '''
+        by_table = defaultdict(list)
+        for table, index, unique, keys, classes, exprs, predicate, method, size in rows:
+            by_table[table].append({
+                'name': index, 'unique': unique, 'keys': tuple(keys.split()),
+                'classes': tuple(classes.split()), 'exprs': exprs,
+                'predicate': predicate, 'method': method, 'size': size,
+            })
+
+        problems = []
+        for table, indexes in sorted(by_table.items()):
+            for index in indexes:
+                if index['unique'] or index['method'] != 'btree':
+                    continue
+                for other in indexes:
+                    if other is index or other['method'] != 'btree':
+                        continue
+                    if (other['exprs'], other['predicate']) != (index['exprs'], index['predicate']):
+                        continue
+                    width = len(index['keys'])
+                    if (other['keys'][:width], other['classes'][:width]) != (index['keys'], index['classes']):
+                        continue
+                    if len(other['keys']) == width and not other['unique'] and other['name'] > index['name']:
+                        # Report each identical pair once.
+                        continue
+                    kind = 'duplicates' if len(other['keys']) == width else 'is a prefix of'
+                    problems.append(
+                        f'{table}.{index["name"]} {kind} {other["name"]} '
+                        f'({index["size"]} bytes could be dropped).')
+                    break
+        return problems
+
+    @staticmethod
+    def covers(columns, name, other_columns, other, other_unique):
+        if other_columns[:len(columns)] != columns:
+            return False
+        # Identical non-unique declarations are reported once, from the later name.
+        return len(other_columns) > len(columns) or other_unique or name > other
@@ -0,0 +1,66 @@
+'''
+Django command to run background jobs from the database queue.
+'''
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from helpers import jobs
+
+
+class Command(BaseCommand):
+    ''' Django command to process queued jobs with a pool of threads. '''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2)
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Longest sleep in seconds when the queue is empty.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no jobs are due.')
+
+    def handle(self, *args, **options):
+        ''' Entrypoint for command. '''
+        self.stop = threading.Event()
+        self.options = options
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stop.set())
+            signal.signal(signal.SIGINT, lambda *_: self.stop.set())
+
+        jobs.requeue_stale()
+        jobs.schedule_periodic()
+
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        threads = [
+            threading.Thread(target=self.work, args=(f'{prefix}:{n}',), daemon=True)
+            for n in range(options['concurrency'])
+        ]
+        self.stdout.write(
+            f'Worker {prefix} started with {len(threads)} threads.')
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stdout.write(self.style.SUCCESS('Worker stopped.'))
+
+    def work(self, worker_id):
+        ''' Claim and run jobs until stopped, backing off while idle. '''
+        idle = 0.05
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                claimed = jobs.claim(worker_id)
+                if not claimed:
+                    if self.options['burst']:
+                        return
+                    self.stop.wait(idle)
+                    idle = min(idle * 2, self.options['poll_interval'])
+                    continue
+                idle = 0.05
+                for job in claimed:
+                    jobs.run(job)
+        finally:
+            connection.close()
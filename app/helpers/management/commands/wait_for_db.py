@@ -3,7 +3,8 @@ Django command to wait for the database to be available.
 '''
 import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 
 from django.db.utils import OperationalError
 from psycopg2 import OperationalError as Psycopg2OpError
@@ -12,16 +13,32 @@ from psycopg2 import OperationalError as Psycopg2OpError
 class Command(BaseCommand):
     ''' Django command to wait for database. '''
 
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Give up after this many seconds.')
+        parser.add_argument('--max-delay', type=float, default=1.0,
+                            help='Longest pause between connection attempts.')
+
     def handle(self, *args, **options):
         ''' Entrypoint for command. '''
         self.stdout.write('Waiting for database...')
-        db_up = False
-        while db_up is False:
+        connection = connections[options['database']]
+        deadline = time.monotonic() + options['timeout']
+        delay = 0.05
+        while True:
             try:
-                self.check(databases=['default'])
-                db_up = True
+                # A bare round-trip; the system check framework is not needed here.
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                break
             except (Psycopg2OpError, OperationalError):
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
+                connection.close()
+                if time.monotonic() + delay > deadline:
+                    raise CommandError(
+                        f'Database unavailable after {options["timeout"]:g} seconds.')
+                self.stdout.write(f'Database unavailable, waiting {delay:.2f} seconds...')
+                time.sleep(delay)
+                delay = min(delay * 2, options['max_delay'])
 
         self.stdout.write(self.style.SUCCESS('Database available!'))
@@ -0,0 +1,47 @@
+'''
+Middleware shared by all apps.
+'''
+from helpers import profiling
+from helpers.health import healthz, readyz
+
+
+class HealthCheckMiddleware:
+    '''
+    Answer the orchestrator's probes before any other middleware runs.
+
+    Placed first, probes skip ALLOWED_HOSTS validation (they arrive addressed
+    to the pod IP), sessions, authentication and URL resolution.
+    '''
+    probes = {
+        '/healthz': healthz,
+        '/readyz': readyz,
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        probe = self.probes.get(request.path_info.rstrip('/'))
+        if probe is not None and request.method in ('GET', 'HEAD'):
+            return probe(request)
+        return self.get_response(request)
+
+
+class ProfilingMiddleware:
+    '''
+    Profile requests that carry a staff profiling token.
+
+    See ``helpers.profiling``; anything else passes straight through.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = profiling.request_token(request)
+        if token is None:
+            return self.get_response(request)
+        user_id = profiling.token_user_id(token)
+        if user_id is None:
+            return self.get_response(request)
+        return profiling.profile_request(request, self.get_response, user_id)
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.7 on 2026-10-19 16:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Name')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Payload')),
+                ('status', models.CharField(choices=[('Queued', 'Queued'), ('Running', 'Running'), ('Failed', 'Failed')], default='Queued', max_length=10, verbose_name='Status')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Run At')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Attempts')),
+                ('max_attempts', models.IntegerField(default=5, verbose_name='Max Attempts')),
+                ('last_error', models.TextField(blank=True, verbose_name='Last Error')),
+                ('unique_key', models.CharField(blank=True, max_length=200, null=True, verbose_name='Unique Key')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Locked By')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Locked At')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'Queued')), fields=['run_at'], name='job_queue'), models.Index(condition=models.Q(('status', 'Running')), fields=['locked_at'], name='job_running')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['Queued', 'Running'])), fields=('unique_key',), name='job_unique_pending'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.7 on 2026-10-19 16:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helpers', '0003_rationalize_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True, verbose_name='Fingerprint')),
+                ('database', models.CharField(max_length=100, verbose_name='Database')),
+                ('statement', models.TextField(verbose_name='Statement')),
+                ('source', models.CharField(blank=True, max_length=255, verbose_name='Source')),
+                ('sample_sql', models.TextField(blank=True, verbose_name='Sample SQL')),
+                ('sample_params', models.TextField(blank=True, verbose_name='Sample Parameters')),
+                ('calls', models.BigIntegerField(default=0, verbose_name='Calls')),
+                ('total_ms', models.FloatField(default=0, verbose_name='Total ms')),
+                ('max_ms', models.FloatField(default=0, verbose_name='Max ms')),
+                ('p50_ms', models.FloatField(default=0, verbose_name='p50 ms')),
+                ('p95_ms', models.FloatField(default=0, verbose_name='p95 ms')),
+                ('p99_ms', models.FloatField(default=0, verbose_name='p99 ms')),
+                ('histogram', models.JSONField(blank=True, default=list, verbose_name='Histogram')),
+                ('plan', models.TextField(blank=True, verbose_name='Plan')),
+                ('plan_captured_at', models.DateTimeField(blank=True, null=True, verbose_name='Plan Captured At')),
+                ('first_seen', models.DateTimeField(default=django.utils.timezone.now, verbose_name='First Seen')),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Last Seen')),
+            ],
+            options={
+                'verbose_name_plural': 'Slow queries',
+            },
+        ),
+    ]
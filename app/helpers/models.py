@@ -1,3 +1,95 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 
 # Create your models here.
+
+
+class Job(models.Model):
+    ''' A unit of background work claimed by `run_worker` processes. '''
+    class Status(models.TextChoices):
+        queued = 'Queued', _('Queued')
+        running = 'Running', _('Running')
+        failed = 'Failed', _('Failed')
+
+    name = models.CharField(_('Name'), max_length=100)
+    payload = models.JSONField(_('Payload'), default=dict, blank=True)
+    status = models.CharField(_('Status'), max_length=10,
+                              choices=Status.choices, default=Status.queued)
+    run_at = models.DateTimeField(_('Run At'), default=timezone.now)
+    attempts = models.IntegerField(_('Attempts'), default=0)
+    max_attempts = models.IntegerField(_('Max Attempts'), default=5)
+    last_error = models.TextField(_('Last Error'), blank=True)
+    unique_key = models.CharField(
+        _('Unique Key'), max_length=200, null=True, blank=True)
+    locked_by = models.CharField(_('Locked By'), max_length=100, blank=True)
+    locked_at = models.DateTimeField(_('Locked At'), null=True, blank=True)
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_at'], name='job_queue',
+                         condition=Q(status='Queued')),
+            models.Index(fields=['locked_at'], name='job_running',
+                         condition=Q(status='Running')),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['unique_key'], name='job_unique_pending',
+                condition=Q(status__in=['Queued', 'Running'])),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.id} ({self.status})'
+
+
+class IdempotencyKey(models.Model):
+    ''' The stored outcome of a request sent with an Idempotency-Key header. '''
+    user = models.ForeignKey('customer.User', verbose_name=_('User'), db_index=False,
+                             on_delete=models.CASCADE, related_name='+')
+    scope = models.CharField(_('Scope'), max_length=100)
+    key = models.CharField(_('Key'), max_length=255)
+    fingerprint = models.CharField(_('Request Fingerprint'), max_length=64)
+    status_code = models.IntegerField(_('Status Code'), null=True)
+    response = models.JSONField(_('Response'), null=True)
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'scope', 'key'], name='idempotency_key_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_key_created'),
+        ]
+
+    def __str__(self):
+        return f'{self.scope}: {self.key}'
+
+
+class SlowQuery(models.Model):
+    ''' Aggregated executions of one normalized SQL statement over SLOW_QUERY_THRESHOLD_MS. '''
+    fingerprint = models.CharField(_('Fingerprint'), max_length=40, unique=True)
+    database = models.CharField(_('Database'), max_length=100)
+    statement = models.TextField(_('Statement'))
+    source = models.CharField(_('Source'), max_length=255, blank=True)
+    sample_sql = models.TextField(_('Sample SQL'), blank=True)
+    sample_params = models.TextField(_('Sample Parameters'), blank=True)
+    calls = models.BigIntegerField(_('Calls'), default=0)
+    total_ms = models.FloatField(_('Total ms'), default=0)
+    max_ms = models.FloatField(_('Max ms'), default=0)
+    p50_ms = models.FloatField(_('p50 ms'), default=0)
+    p95_ms = models.FloatField(_('p95 ms'), default=0)
+    p99_ms = models.FloatField(_('p99 ms'), default=0)
+    histogram = models.JSONField(_('Histogram'), default=list, blank=True)
+    plan = models.TextField(_('Plan'), blank=True)
+    plan_captured_at = models.DateTimeField(_('Plan Captured At'), null=True, blank=True)
+    first_seen = models.DateTimeField(_('First Seen'), default=timezone.now)
+    last_seen = models.DateTimeField(_('Last Seen'), default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = _('Slow queries')
+
+    def __str__(self):
+        return f'{self.fingerprint[:12]}: {self.statement[:80]}'
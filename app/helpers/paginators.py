@@ -0,0 +1,38 @@
+'''
+Paginators for very large tables.
+'''
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model, using='default'):
+    ''' Return the planner's row estimate for a table and its partitions. '''
+    table = model._meta.db_table
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            '''
+            SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint
+            FROM pg_class c
+            WHERE c.oid = to_regclass(%s)
+               OR c.oid IN (SELECT inhrelid FROM pg_inherits
+                            WHERE inhparent = to_regclass(%s))
+            ''',
+            [table, table],
+        )
+        return cursor.fetchone()[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    ''' Use the planner's estimate instead of COUNT(*) for unfiltered pages of large tables. '''
+    threshold = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not getattr(queryset, 'query', None) or queryset.query.where:
+            return super().count
+        estimate = estimated_row_count(queryset.model, queryset.db)
+        if estimate < self.threshold:
+            return super().count
+        return estimate
@@ -0,0 +1,300 @@
+'''
+On-demand profiling of single requests.
+
+A staff member copies a signed token from the admin profiles page and sends
+it as the ``X-Profile`` header or the ``_profile`` query parameter. The
+request then runs under cProfile with every SQL statement recorded together
+with its timing and the application frames that issued it. The result is
+written to PROFILE_ROOT as ``<id>.json`` (call tree, hotspots and SQL) and
+``<id>.prof`` (raw pstats, for snakeviz or ``python -m pstats``).
+
+Requests without a token only pay for one header lookup. A worker profiles
+one request at a time: from Python 3.12 cProfile hooks every thread of the
+process, so a profile then also covers the worker's other requests (saved as
+``all_threads``), and a second profiled request is served unprofiled.
+'''
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.utils import timezone
+
+HEADER = 'HTTP_X_PROFILE'
+QUERY_PARAM = '_profile'
+SALT = 'helpers.profiling'
+PROFILE_ID = re.compile(r'^\d{14}-[0-9a-f]{8}$')
+
+# Call tree nodes under this share of the request time are folded away.
+TREE_MIN_FRACTION = 0.005
+TREE_MAX_DEPTH = 40
+TREE_MAX_NODES = 2000
+HOTSPOTS = 40
+STACK_DEPTH = 8
+PARAMS_MAX_LENGTH = 300
+
+# Whether cProfile sees every thread (sys.monitoring) or only the caller's.
+ALL_THREADS = sys.version_info >= (3, 12)
+_profiling = threading.Lock()
+
+
+def make_token(user):
+    ''' A token that profiles ``user``'s requests until PROFILE_TOKEN_MAX_AGE passes. '''
+    return signing.TimestampSigner(salt=SALT).sign(str(user.pk))
+
+
+def token_user_id(token):
+    ''' The id of the active staff user ``token`` was issued to, or None. '''
+    try:
+        user_id = signing.TimestampSigner(salt=SALT).unsign(
+            token, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    exists = get_user_model().objects.filter(
+        pk=user_id, is_staff=True, is_active=True).exists()
+    return user_id if exists else None
+
+
+def request_token(request):
+    token = request.META.get(HEADER)
+    if token is None and f'{QUERY_PARAM}=' in request.META.get('QUERY_STRING', ''):
+        token = request.GET.get(QUERY_PARAM)
+    return token
+
+
+class QueryRecorder:
+    ''' ``execute_wrapper`` that keeps each statement's SQL, duration and origin. '''
+    app_root = str(settings.BASE_DIR)
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries.append({
+                'database': self.alias,
+                'sql': sql,
+                'params': repr(params)[:PARAMS_MAX_LENGTH],
+                'many': many,
+                'ms': round(duration * 1000, 3),
+                'stack': self.stack(),
+            })
+
+    def stack(self):
+        ''' Application frames that led to the query, ending at its innermost caller. '''
+        # Source lines are not needed, and reading them would dominate the profile.
+        frames = traceback.StackSummary.extract(
+            traceback.walk_stack(None), lookup_lines=False)[::-1][:-2]
+        for index, frame in enumerate(frames):
+            if frame.name == 'profile_request' and frame.filename == __file__:
+                frames = frames[index + 1:]
+                break
+        frames = [frame for frame in frames
+                  if f'{os.sep}django{os.sep}db{os.sep}' not in frame.filename]
+        chosen = [frame for frame in frames if self.is_app(frame.filename)][-STACK_DEPTH:]
+        if frames and frames[-1] not in chosen:
+            chosen.append(frames[-1])
+        return [f'{source_label(frame.filename)}:{frame.lineno} in {frame.name}'
+                for frame in chosen]
+
+    def is_app(self, filename):
+        return (filename.startswith(self.app_root) and 'site-packages' not in filename
+                and not filename.endswith(f'helpers{os.sep}middleware.py'))
+
+
+def source_label(filename):
+    if filename.startswith(str(settings.BASE_DIR)):
+        return os.path.relpath(filename, settings.BASE_DIR)
+    return filename.split(f'site-packages{os.sep}')[-1]
+
+
+def function_label(func):
+    filename, lineno, name = func
+    if filename == '~':
+        return name
+    return f'{source_label(filename)}:{lineno}({name})'
+
+
+def call_tree(stats, total):
+    '''
+    Nest pstats caller edges into a top-down tree of cumulative times.
+
+    pstats only knows totals per caller/callee pair, so a function's callees
+    are shared out in proportion to the time spent in it along each path.
+    '''
+    callees = defaultdict(dict)
+    roots = []
+    for func, (_, calls, _, cumulative, callers) in stats.items():
+        if not callers:
+            roots.append((func, calls, cumulative))
+        for caller, (_, edge_calls, _, edge_cumulative) in callers.items():
+            callees[caller][func] = (edge_calls, edge_cumulative)
+
+    if stats:
+        # Recursion (nested middleware wrappers, for one) gives the entry point callers too.
+        entry = max(stats, key=lambda func: stats[func][3])
+        if all(func != entry for func, _, _ in roots):
+            roots.append((entry, stats[entry][1], stats[entry][3]))
+
+    cutoff = total * TREE_MIN_FRACTION
+    budget = [TREE_MAX_NODES]
+
+    def callees_of(func, share, path, spliced):
+        ''' ``(callee, calls, seconds)`` edges, with recursive calls folded into the caller. '''
+        found = defaultdict(lambda: [0, 0.0])
+        for child, (edge_calls, edge_cumulative) in callees[func].items():
+            seconds = edge_cumulative * share
+            if seconds < cutoff:
+                continue
+            if child in path:
+                if child not in spliced:
+                    child_share = seconds / stats[child][3] if stats[child][3] else 0
+                    for grandchild, calls, grand_seconds in callees_of(
+                            child, min(child_share, 1), path, spliced | {child}):
+                        found[grandchild][0] += calls
+                        found[grandchild][1] += grand_seconds
+            else:
+                found[child][0] += edge_calls
+                found[child][1] += seconds
+        return [(child, calls, seconds) for child, (calls, seconds) in found.items()]
+
+    def node(func, calls, cumulative, path):
+        budget[0] -= 1
+        children = []
+        func_cumulative = stats[func][3]
+        share = min(cumulative / func_cumulative, 1) if func_cumulative else 0
+        if len(path) < TREE_MAX_DEPTH:
+            edges = sorted(callees_of(func, share, path, {func}), key=lambda edge: -edge[2])
+            for child, child_calls, child_cumulative in edges:
+                if budget[0] <= 0:
+                    break
+                children.append(node(child, child_calls, child_cumulative, path | {child}))
+        return {'function': function_label(func), 'calls': calls,
+                'ms': round(cumulative * 1000, 3), 'children': children}
+
+    return [node(func, calls, cumulative, {func})
+            for func, calls, cumulative in sorted(roots, key=lambda root: -root[2])
+            if cumulative >= cutoff]
+
+
+def hotspots(profiler):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('cumulative').print_stats(HOTSPOTS)
+    return stream.getvalue()
+
+
+def profile_root():
+    return Path(settings.PROFILE_ROOT)
+
+
+def save(profile, profiler):
+    root = profile_root()
+    root.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(root / f'{profile["id"]}.prof')
+    tmp = root / f'.{profile["id"]}.json'
+    tmp.write_text(json.dumps(profile, cls=DjangoJSONEncoder))
+    os.replace(tmp, root / f'{profile["id"]}.json')
+    prune(root)
+
+
+def prune(root):
+    ''' Keep the newest PROFILE_KEEP profiles. '''
+    saved = sorted(root.glob('*.json'), reverse=True)
+    for path in saved[settings.PROFILE_KEEP:]:
+        path.unlink(missing_ok=True)
+        path.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def list_profiles():
+    ''' Saved profiles, newest first, without their call trees. '''
+    profiles = []
+    for path in sorted(profile_root().glob('*.json'), reverse=True):
+        try:
+            profile = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        profile.pop('tree', None)
+        profile.pop('hotspots', None)
+        profile['query_count'] = len(profile.pop('queries', []))
+        profiles.append(profile)
+    return profiles
+
+
+def profile_path(profile_id, suffix):
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = profile_root() / f'{profile_id}{suffix}'
+    return path if path.exists() else None
+
+
+def load(profile_id):
+    path = profile_path(profile_id, '.json')
+    return json.loads(path.read_text()) if path else None
+
+
+def profile_request(request, get_response, user_id):
+    ''' Run ``get_response`` under cProfile and SQL recording, then save the profile. '''
+    if not _profiling.acquire(blocking=False):
+        return get_response(request)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool holds the process-wide hook.
+        _profiling.release()
+        return get_response(request)
+
+    now = timezone.now()
+    profile_id = f'{now:%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}'
+    recorders = [QueryRecorder(alias) for alias in connections]
+    start = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for recorder in recorders:
+                stack.enter_context(connections[recorder.alias].execute_wrapper(recorder))
+            response = get_response(request)
+    finally:
+        profiler.disable()
+        _profiling.release()
+    duration = time.perf_counter() - start
+
+    queries = [query for recorder in recorders for query in recorder.queries]
+    profiler.create_stats()
+    save({
+        'id': profile_id,
+        'created_at': now,
+        'user_id': user_id,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status_code': response.status_code,
+        'ms': round(duration * 1000, 3),
+        'sql_ms': round(sum(query['ms'] for query in queries), 3),
+        'streaming': response.streaming,
+        'all_threads': ALL_THREADS,
+        'tree': call_tree(profiler.stats, duration),
+        'hotspots': hotspots(profiler),
+        'queries': queries,
+    }, profiler)
+    response['X-Profile-Id'] = profile_id
+    return response
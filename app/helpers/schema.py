@@ -0,0 +1,89 @@
+'''
+Prebuilt OpenAPI schema.
+
+Generating the schema introspects every view and serializer, so it is done
+once per deploy: the ``build_schema`` command writes both formats to
+SCHEMA_ROOT as ``openapi-<version>.<format>`` next to a ``manifest.json``
+naming the current version. Workers read the files once. If no artifact
+exists the schema is generated once per process instead of once per request.
+'''
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    'yaml': 'application/vnd.oai.openapi',
+    'json': 'application/vnd.oai.openapi+json',
+}
+MANIFEST = 'manifest.json'
+
+
+@dataclass(frozen=True)
+class SchemaArtifact:
+    version: str
+    yaml: bytes
+    json: bytes
+
+
+def build_schema():
+    ''' Generate the public schema and render it as YAML and JSON. '''
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+    rendered_json = OpenApiJsonRenderer().render(schema, renderer_context={})
+    rendered_yaml = OpenApiYamlRenderer().render(schema, renderer_context={})
+    version = hashlib.sha256(rendered_json).hexdigest()[:16]
+    return SchemaArtifact(version, rendered_yaml, rendered_json)
+
+
+def write_artifact(artifact, root):
+    ''' Write the artifact, switching the manifest over only once both files exist. '''
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    files = {}
+    for fmt in CONTENT_TYPES:
+        name = f'openapi-{artifact.version}.{fmt}'
+        (root / name).write_bytes(getattr(artifact, fmt))
+        files[fmt] = name
+    temp = root / f'.{MANIFEST}.{os.getpid()}'
+    temp.write_text(json.dumps({'version': artifact.version, 'files': files}))
+    os.replace(temp, root / MANIFEST)
+
+
+def read_artifact(root):
+    ''' Return the artifact named by the manifest in ``root`` or None. '''
+    root = Path(root)
+    try:
+        manifest = json.loads((root / MANIFEST).read_text())
+        contents = {fmt: (root / name).read_bytes()
+                    for fmt, name in manifest['files'].items()}
+        return SchemaArtifact(manifest['version'], contents['yaml'], contents['json'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+_lock = threading.Lock()
+_artifact = None
+
+
+def current_artifact():
+    ''' The schema this process serves, loaded or generated on first use. '''
+    global _artifact
+    if _artifact is None:
+        with _lock:
+            if _artifact is None:
+                _artifact = read_artifact(settings.SCHEMA_ROOT)
+                if _artifact is None:
+                    logger.warning('No schema artifact in %s; run build_schema. '
+                                   'Generating the schema in process.', settings.SCHEMA_ROOT)
+                    _artifact = build_schema()
+    return _artifact
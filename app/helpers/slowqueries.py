@@ -0,0 +1,251 @@
+'''
+Sampling of slow SQL statements.
+
+Every connection gets an ``execute_wrapper`` that times its statements.
+Statements over SLOW_QUERY_THRESHOLD_MS that touch a table of one of the
+SLOW_QUERY_APPS are normalized into a fingerprint and counted in a
+per-process latency histogram. After a request, at most every
+SLOW_QUERY_FLUSH_INTERVAL seconds, the histograms are merged into the
+``SlowQuery`` table.
+
+A fingerprint without a plan, or whose plan is older than
+SLOW_QUERY_EXPLAIN_INTERVAL, gets one captured from the latest sample:
+``EXPLAIN (ANALYZE, BUFFERS)`` for plain SELECTs, a bare ``EXPLAIN`` for
+anything that would write or lock. Each flush captures at most one plan and
+the shared cache keeps workers from explaining the same fingerprint twice.
+'''
+import hashlib
+import logging
+import re
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.utils import timezone
+
+from helpers.models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in milliseconds, of the latency histogram buckets; the last is open.
+BUCKETS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+PARAMS_MAX_LENGTH = 1000
+EXPLAIN_LOCK = 'slowquery:explain:{}'
+
+STRINGS = re.compile(r"'(?:[^']|'')*'")
+NUMBERS = re.compile(r'(?<![\w".])-?\d+(?:\.\d+)?\b')
+PLACEHOLDER_LISTS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+VALUES_LISTS = re.compile(r'(VALUES\s*\([^)]*\))(?:\s*,\s*\([^)]*\))+', re.IGNORECASE)
+# Row-locking clauses and SELECT ... INTO, which creates a table.
+WRITES_OR_LOCKS = re.compile(
+    r'\bFOR\s+(?:NO\s+KEY\s+)?UPDATE\b|\bFOR\s+(?:KEY\s+)?SHARE\b|\bINTO\b', re.IGNORECASE)
+SAVEPOINTS = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.IGNORECASE)
+WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    ''' ``(hash, statement)`` for ``sql`` with literals and placeholder lists collapsed. '''
+    statement = STRINGS.sub('?', sql)
+    statement = NUMBERS.sub('?', statement)
+    statement = statement.replace('%s', '?')
+    statement = PLACEHOLDER_LISTS.sub('(...)', statement)
+    statement = VALUES_LISTS.sub(r'\1, ...', statement)
+    statement = WHITESPACE.sub(' ', statement).strip()
+    return hashlib.sha1(statement.encode()).hexdigest(), statement
+
+
+def percentile(histogram, fraction, max_ms):
+    ''' Upper bound of the bucket holding the ``fraction`` quantile. '''
+    total = sum(histogram)
+    if not total:
+        return 0
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if seen >= fraction * total:
+            return min(BUCKETS[index], max_ms) if index < len(BUCKETS) else max_ms
+    return max_ms
+
+
+@dataclass
+class Sample:
+    database: str
+    statement: str
+    source: str
+    sql: str = ''
+    params: object = None
+    calls: int = 0
+    total_ms: float = 0
+    max_ms: float = 0
+    histogram: list = field(default_factory=lambda: [0] * (len(BUCKETS) + 1))
+
+    def add(self, ms, sql, params):
+        self.calls += 1
+        self.total_ms += ms
+        self.histogram[bisect_left(BUCKETS, ms)] += 1
+        if ms >= self.max_ms:
+            self.max_ms = ms
+            self.sql, self.params = sql, params
+
+
+class Sampler:
+    ''' Per-process aggregation of slow statements. '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.samples = {}
+        self.flushed_at = time.monotonic()
+        self._tables = None
+
+    @property
+    def tables(self):
+        if self._tables is None:
+            tables = sorted({f'"{model._meta.db_table}"'
+                             for label in settings.SLOW_QUERY_APPS
+                             for model in apps.get_app_config(label).get_models()})
+            self._tables = re.compile('|'.join(map(re.escape, tables)))
+        return self._tables
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(self.local, 'paused', False):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            if ms >= settings.SLOW_QUERY_THRESHOLD_MS and not many:
+                self.record(context['connection'].alias, sql, params, ms)
+
+    def record(self, alias, sql, params, ms):
+        if SAVEPOINTS.match(sql) or not self.tables.search(sql):
+            return
+        key, statement = fingerprint(sql)
+        with self.lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                sample = self.samples[key] = Sample(alias, statement, source())
+            sample.add(ms, sql, params)
+
+    def install(self, connection):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def due(self):
+        return (self.samples
+                and time.monotonic() - self.flushed_at >= settings.SLOW_QUERY_FLUSH_INTERVAL)
+
+    def take(self):
+        with self.lock:
+            samples, self.samples = self.samples, {}
+            self.flushed_at = time.monotonic()
+        return samples
+
+    def flush(self):
+        ''' Merge the collected samples into ``SlowQuery`` and capture one due plan. '''
+        samples = self.take()
+        if not samples:
+            return
+        self.local.paused = True
+        try:
+            due = self.merge(samples)
+            for key in due:
+                if cache.add(EXPLAIN_LOCK.format(key), 1, settings.SLOW_QUERY_EXPLAIN_INTERVAL):
+                    capture_plan(key, samples[key])
+                    break
+        except Exception:
+            logger.exception('Could not record slow queries')
+        finally:
+            self.local.paused = False
+
+    @staticmethod
+    def merge(samples):
+        ''' Add ``samples`` to their rows; return the fingerprints that need a plan, slowest first. '''
+        now = timezone.now()
+        stale = now - timedelta(seconds=settings.SLOW_QUERY_EXPLAIN_INTERVAL)
+        with transaction.atomic():
+            SlowQuery.objects.bulk_create([
+                SlowQuery(fingerprint=key, database=sample.database,
+                          statement=sample.statement, source=sample.source)
+                for key, sample in samples.items()
+            ], ignore_conflicts=True)
+            rows = list(SlowQuery.objects.select_for_update()
+                        .filter(fingerprint__in=samples).order_by('fingerprint'))
+            for row in rows:
+                sample = samples[row.fingerprint]
+                histogram = row.histogram or [0] * len(sample.histogram)
+                row.histogram = [old + new for old, new in zip(histogram, sample.histogram)]
+                row.calls += sample.calls
+                row.total_ms += sample.total_ms
+                row.max_ms = max(row.max_ms, sample.max_ms)
+                row.p50_ms = percentile(row.histogram, 0.5, row.max_ms)
+                row.p95_ms = percentile(row.histogram, 0.95, row.max_ms)
+                row.p99_ms = percentile(row.histogram, 0.99, row.max_ms)
+                row.sample_sql = sample.sql
+                row.sample_params = repr(sample.params)[:PARAMS_MAX_LENGTH]
+                row.source = row.source or sample.source
+                row.last_seen = now
+            SlowQuery.objects.bulk_update(rows, [
+                'histogram', 'calls', 'total_ms', 'max_ms', 'p50_ms', 'p95_ms', 'p99_ms',
+                'sample_sql', 'sample_params', 'source', 'last_seen'])
+        due = [row for row in rows
+               if row.plan_captured_at is None or row.plan_captured_at < stale]
+        return [row.fingerprint for row in sorted(due, key=lambda row: -samples[row.fingerprint].max_ms)]
+
+
+def source():
+    ''' The innermost frame of application code that issued the statement. '''
+    frames = traceback.StackSummary.extract(traceback.walk_stack(None), lookup_lines=False)
+    app_root = str(settings.BASE_DIR)
+    for frame in frames:
+        if not frame.filename.startswith(app_root) or 'site-packages' in frame.filename:
+            continue
+        path = frame.filename[len(app_root) + 1:]
+        if (path.split('/', 1)[0] in settings.SLOW_QUERY_APPS
+                and not path.endswith(('middleware.py', 'profiling.py'))):
+            return f'{path}:{frame.lineno} in {frame.name}'[:255]
+    return ''
+
+
+def explain_sql(sql):
+    ''' EXPLAIN options that never run a write or take a row lock. '''
+    read_only = sql.lstrip().upper().startswith('SELECT') and not WRITES_OR_LOCKS.search(sql)
+    return f'EXPLAIN (ANALYZE, BUFFERS) {sql}' if read_only else f'EXPLAIN {sql}'
+
+
+def capture_plan(key, sample):
+    connection = connections[sample.database]
+    try:
+        with transaction.atomic(using=sample.database):
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL statement_timeout = %s',
+                               [settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS])
+                cursor.execute(explain_sql(sample.sql), sample.params)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+    except Exception as e:
+        plan = f'Could not capture the plan: {e.__class__.__name__}: {e}'
+    SlowQuery.objects.filter(fingerprint=key).update(
+        plan=plan, plan_captured_at=timezone.now())
+
+
+sampler = Sampler()
+
+
+def install(sender, connection, **kwargs):
+    ''' ``connection_created`` receiver. '''
+    if settings.SLOW_QUERY_THRESHOLD_MS > 0 and connection.vendor == 'postgresql':
+        sampler.install(connection)
+
+
+def flush_if_due(sender, **kwargs):
+    ''' ``request_finished`` receiver; never flushes inside a transaction. '''
+    if sampler.due() and not any(connections[alias].in_atomic_block for alias in connections):
+        sampler.flush()
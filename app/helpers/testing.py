@@ -0,0 +1,85 @@
+'''
+Test helpers for keeping per-endpoint SQL query counts in check.
+'''
+import os
+import sys
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+LOCMEM_CACHES = {
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'default': {'BACKEND': 'helpers.cache.TwoTierCache', 'LOCATION': 'shared'},
+}
+
+
+class QueryBudgetMixin:
+    '''
+    Assert that a call stays within a query budget and that its query count
+    does not grow with the size of the fixture.
+
+    Every measured call is recorded with its query count and total SQL time;
+    set QUERY_BUDGET_REPORT=1 to print them after each test class.
+    '''
+    query_budget_database = DEFAULT_DB_ALIAS
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.query_records = []
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.environ.get('QUERY_BUDGET_REPORT'):
+            for label, count, seconds in cls.query_records:
+                sys.stderr.write(f'\n  {label:<60} {count:>3} queries {seconds * 1000:8.2f} ms')
+            sys.stderr.write('\n')
+        super().tearDownClass()
+
+    def measure(self, label, func, *args, **kwargs):
+        ''' Call ``func`` and return ``(result, captured_queries)``. '''
+        with CaptureQueriesContext(connections[self.query_budget_database]) as context:
+            result = func(*args, **kwargs)
+            # Streaming responses run their queries while being consumed.
+            if getattr(result, 'streaming', False):
+                b''.join(result.streaming_content)
+        queries = context.captured_queries
+        seconds = sum(float(query['time']) for query in queries)
+        self.query_records.append((f'{self.id().rsplit(".", 1)[-1]} [{label}]', len(queries), seconds))
+        return result, queries
+
+    def assertQueryBudget(self, budget, func, *args, label='call', **kwargs):
+        ''' Fail, listing the SQL, if ``func`` runs more than ``budget`` queries. '''
+        result, queries = self.measure(label, func, *args, **kwargs)
+        if len(queries) > budget:
+            self.fail(f'{label}: {len(queries)} queries, budget is {budget}\n'
+                      f'{self.format_queries(queries)}')
+        return result
+
+    def assertFlatQueries(self, budget, func, fixtures):
+        '''
+        Prepare each fixture in turn and call ``func`` after each one.
+
+        ``fixtures`` maps a label to a callable that grows the data set. Every
+        call must stay within ``budget`` and run the same number of queries.
+        '''
+        measured = []
+        for label, prepare in fixtures.items():
+            prepare()
+            result, queries = self.measure(label, func)
+            measured.append((label, queries))
+            if len(queries) > budget:
+                self.fail(f'{label}: {len(queries)} queries, budget is {budget}\n'
+                          f'{self.format_queries(queries)}')
+
+        counts = {label: len(queries) for label, queries in measured}
+        if len(set(counts.values())) > 1:
+            label, queries = max(measured, key=lambda item: len(item[1]))
+            self.fail(f'Query count grows with the fixture: {counts}\n'
+                      f'{label}:\n{self.format_queries(queries)}')
+        return result
+
+    @staticmethod
+    def format_queries(queries):
+        return '\n'.join(f'{number:>4}. ({query["time"]}s) {query["sql"]}'
+                         for number, query in enumerate(queries, start=1))
@@ -1,3 +1,373 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from customer.models import User
+from helpers import health, jobs, profiling, slowqueries, throttling
+from helpers.html import derive_html, html_excerpt, sanitize_html
+from helpers.cache import Tier, TwoTierCache
+from helpers.db import long_running, long_statements
+from helpers.models import Job
+from helpers.testing import LOCMEM_CACHES, QueryBudgetMixin
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class HealthQueryTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        health._cached.update(checks=None, expires=0)
+        health._migrated = False
+
+    def test_healthz(self):
+        response = self.assertQueryBudget(0, self.client.get, '/healthz')
+        self.assertEqual(response.status_code, 200)
+
+    def test_readyz(self):
+        response = self.assertQueryBudget(3, self.client.get, '/readyz', label='cold')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertQueryBudget(0, self.client.get, '/readyz', label='warm')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SCHEMA_LIVE=False)
+class SchemaQueryTests(QueryBudgetMixin, TestCase):
+    def test_schema(self):
+        self.client.get('/api/schema/')
+        response = self.assertQueryBudget(0, self.client.get, '/api/schema/')
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryBudgetMixinTests(QueryBudgetMixin, TestCase):
+    def test_flat_queries_catch_n_plus_one(self):
+        def load_each():
+            return [User.objects.get(pk=pk) for pk in User.objects.values_list('pk', flat=True)]
+
+        def add_user(number):
+            User.objects.create_user(email=f'user{number}@example.com', password='x')
+
+        with self.assertRaises(self.failureException) as raised:
+            self.assertFlatQueries(10, load_each, {
+                'users=1': lambda: add_user(1),
+                'users=3': lambda: (add_user(2), add_user(3)),
+            })
+        message = str(raised.exception)
+        self.assertIn('grows with the fixture', message)
+        self.assertIn('   4. ', message)
+        self.assertIn('FROM "customer_user"', message)
+
+    def test_budget_lists_the_queries(self):
+        with self.assertRaises(self.failureException) as raised:
+            self.assertQueryBudget(0, User.objects.count, label='count')
+        self.assertIn('count: 1 queries, budget is 0', str(raised.exception))
+        self.assertIn('COUNT(*)', str(raised.exception))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        # A second worker: same L2, its own L1 and log position.
+        self.other = TwoTierCache('shared', {})
+        self.other.tier = Tier(1024 * 1024)
+        self.other.get('warm-up')
+
+    def synced(self, backend):
+        backend.tier.checked -= backend.sync_interval
+        return backend
+
+    def test_reads_are_served_from_memory(self):
+        cache.set('key', {'a': 1})
+        caches['shared'].set(cache.make_key('key'), 'changed behind its back')
+        value = cache.get('key')
+        self.assertEqual(value, {'a': 1})
+        value['a'] = 2
+        self.assertEqual(cache.get('key'), {'a': 1})
+
+    def test_writes_reach_other_workers_after_sync(self):
+        resyncs = cache.stats()['resyncs']
+        self.other.set('key', 'old')
+        self.assertEqual(cache.get('key'), 'old')
+        self.other.set('key', 'new')
+        self.assertEqual(cache.get('key'), 'old')
+        self.assertEqual(self.synced(cache).get('key'), 'new')
+
+        self.other.delete('key')
+        self.assertIsNone(self.synced(cache).get('key'))
+        self.assertEqual(cache.stats()['resyncs'], resyncs)
+
+    def test_lost_log_clears_memory(self):
+        self.other.set('key', 'old')
+        self.assertEqual(self.synced(cache).get('key'), 'old')
+        caches['shared'].clear()
+        caches['shared'].set(cache.make_key('key'), 'new')
+        self.assertEqual(self.synced(cache).get('key'), 'new')
+
+    def test_get_or_set_computes_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_set('slow', compute)))
+                   for _ in range(2)]
+        threads.append(threading.Thread(
+            target=lambda: results.append(self.other.get_or_set('slow', compute))))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 3)
+        self.assertEqual(len(calls), 1)
+
+    def test_stats(self):
+        before = cache.stats()
+        cache.set('key', 1)
+        cache.get('key')
+        cache.get('missing')
+        self.other.set('other', 1)
+        cache.get('other')
+        stats = cache.stats()
+        self.assertEqual(stats['l1']['hits'] - before['l1']['hits'], 1)
+        self.assertEqual(stats['l2_hits'] - before['l2_hits'], 1)
+        self.assertEqual(stats['misses'] - before['misses'], 1)
+        self.assertEqual(stats['l1']['entries'], 2)
+
+
+class SanitizerTests(SimpleTestCase):
+    def test_drops_scripts_and_styles_with_their_content(self):
+        self.assertEqual(
+            sanitize_html('<p>Hi<script>alert(1)</script><style>p{}</style>'
+                          '<SCRIPT src="x.js"></SCRIPT><svg><script>alert(2)</script></svg></p>'),
+            '<p>Hi</p>')
+
+    def test_strips_event_handlers_and_unknown_attributes(self):
+        self.assertEqual(
+            sanitize_html('<img src="a.png" onerror="alert(1)" ONLOAD=x style="x">'
+                          '<b onclick="alert(1)" class="x">bold</b>'),
+            '<img src="a.png"><b>bold</b>')
+
+    def test_strips_javascript_urls(self):
+        for href in ('javascript:alert(1)', 'JaVaScRiPt:alert(1)', ' java\tscript:alert(1)',
+                     '&#106;avascript:alert(1)', '&#x6A;&#x61;vascript&colon;alert(1)',
+                     'data:text/html,<script>alert(1)</script>', 'vbscript:x'):
+            with self.subTest(href=href):
+                self.assertEqual(sanitize_html(f'<a href="{href}">x</a>'), '<a>x</a>')
+
+    def test_keeps_safe_urls_and_escapes_values(self):
+        self.assertEqual(
+            sanitize_html('<a href="https://example.com/?a=1&amp;b=&quot;2&quot;" title=\'"x"\'>'
+                          'go</a><a href="/relative">r</a><a href="mailto:a@b.c">m</a>'),
+            '<a href="https://example.com/?a=1&amp;b=&quot;2&quot;" title="&quot;x&quot;">go</a>'
+            '<a href="/relative">r</a><a href="mailto:a@b.c">m</a>')
+
+    def test_escapes_text_and_balances_tags(self):
+        self.assertEqual(sanitize_html('&lt;script&gt;x<div><b>1<i>2</b>3'),
+                         '&lt;script&gt;x<b>1<i>2</i></b>3')
+
+    def test_excerpt_is_plain_text(self):
+        sanitized, excerpt = derive_html(
+            '<h1>Title</h1><p>First&nbsp;line<br>second <b>bold</b></p>'
+            '<script>alert(1)</script><ul><li>one</li><li>two</li></ul>')
+        self.assertEqual(sanitized, '<h1>Title</h1><p>First\xa0line<br>second <b>bold</b></p>'
+                                    '<ul><li>one</li><li>two</li></ul>')
+        self.assertEqual(excerpt, 'Title First line second bold one two')
+        self.assertEqual(html_excerpt('<p>' + 'word ' * 10 + '</p>', 12), 'word word w…')
+        self.assertEqual(html_excerpt(None), '')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ThrottleTests(SimpleTestCase):
+    def setUp(self):
+        caches[throttling.THROTTLE_CACHE].clear()
+        self.now = 600.0
+        self.view = SimpleNamespace(throttle_scope='login')
+        rates = mock.patch.object(throttling.SlidingWindowThrottle, 'THROTTLE_RATES',
+                                  {'login_ip': '3/min', 'login_email': '2/min'})
+        rates.start()
+        self.addCleanup(rates.stop)
+
+    def throttle(self, cls=throttling.ScopedIPThrottle):
+        throttle = cls()
+        throttle.timer = lambda: self.now
+        return throttle
+
+    def allowed(self, request=None, cls=throttling.ScopedIPThrottle):
+        request = request or RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        return self.throttle(cls).allow_request(request, self.view)
+
+    def test_window_fills_up(self):
+        self.assertEqual([self.allowed() for _ in range(4)], [True, True, True, False])
+        self.assertTrue(self.allowed(RequestFactory().get('/', REMOTE_ADDR='10.0.0.2')))
+
+    def test_previous_window_weighs_by_its_overlap(self):
+        for _ in range(4):
+            self.allowed()
+        # Half the previous window still overlaps: 4 * 0.5 + current hits.
+        self.now += 90
+        self.assertEqual([self.allowed(), self.allowed()], [True, False])
+        # A window later the first four hits have expired; 2 * 0.5 + current hits.
+        self.now += 60
+        self.assertEqual([self.allowed() for _ in range(3)], [True, True, False])
+
+    def test_wait_until_the_rate_leaves_room(self):
+        throttle = self.throttle()
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        for _ in range(4):
+            throttle.allow_request(request, self.view)
+        self.assertEqual(throttle.wait(), 90)
+        self.now += 90
+        self.assertTrue(self.allowed())
+
+    def test_email_scope_ignores_case_and_missing_emails(self):
+        def attempt(email):
+            return self.allowed(SimpleNamespace(data={'email': email}),
+                                cls=throttling.ScopedEmailThrottle)
+
+        self.assertEqual([attempt('A@b.c'), attempt(' a@B.c'), attempt('a@b.c')],
+                         [True, True, False])
+        self.assertTrue(attempt(None))
+        self.assertTrue(self.throttle().allow_request(
+            RequestFactory().get('/'), SimpleNamespace()))
+
+
+class SlowQueryHelperTests(SimpleTestCase):
+    def test_fingerprint_collapses_literals_and_lists(self):
+        key, statement = slowqueries.fingerprint(
+            'SELECT "t"."id" FROM "t"\n  WHERE "t"."name" = \'it\'\'s\' AND "t"."id" IN (%s, %s, %s)'
+            ' AND "t2"."col1" > -1.5 LIMIT 21')
+        self.assertEqual(statement, 'SELECT "t"."id" FROM "t" WHERE "t"."name" = ? AND "t"."id" IN (...)'
+                                    ' AND "t2"."col1" > ? LIMIT ?')
+        self.assertNotEqual(slowqueries.fingerprint('SELECT "t"."id" FROM "t" LIMIT 21')[0], key)
+        self.assertEqual(
+            slowqueries.fingerprint('SELECT "t"."id" FROM "t" WHERE "t"."name" = \'x\' '
+                                    'AND "t"."id" IN (%s, %s) AND "t2"."col1" > 7 LIMIT 1')[0],
+            key)
+        self.assertEqual(
+            slowqueries.fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)')[1],
+            'INSERT INTO "t" ("a", "b") VALUES (...), ...')
+
+    def test_percentile(self):
+        histogram = [0] * (len(slowqueries.BUCKETS) + 1)
+        self.assertEqual(slowqueries.percentile(histogram, 0.5, 0), 0)
+        histogram[0], histogram[3], histogram[-1] = 90, 9, 1
+        self.assertEqual(slowqueries.percentile(histogram, 0.5, 40000), 5)
+        self.assertEqual(slowqueries.percentile(histogram, 0.95, 40000), 50)
+        self.assertEqual(slowqueries.percentile(histogram, 0.99, 40000), 50)
+        self.assertEqual(slowqueries.percentile(histogram, 1, 40000), 40000)
+        # A bucket bound above the slowest call seen reports that call instead.
+        self.assertEqual(slowqueries.percentile([0, 0, 0, 4] + histogram[4:-1] + [0], 0.5, 31),
+                         31)
+
+    def test_explain_sql_only_analyzes_plain_selects(self):
+        analyzed = 'EXPLAIN (ANALYZE, BUFFERS) '
+        for sql, analyze in (
+                ('  select * from "t"', True),
+                ('SELECT * FROM "t" FOR UPDATE', False),
+                ('SELECT * FROM "t" for share', False),
+                ('SELECT * FROM "t" FOR NO KEY UPDATE SKIP LOCKED', False),
+                ('SELECT * FROM "t" FOR KEY\nSHARE', False),
+                ('SELECT * INTO "copy" FROM "t"', False),
+                ('UPDATE "t" SET "a" = 1', False),
+                ('WITH d AS (DELETE FROM "t" RETURNING *) SELECT * FROM d', False),
+                ('INSERT INTO "t" SELECT * FROM "u"', False)):
+            with self.subTest(sql=sql):
+                self.assertEqual(slowqueries.explain_sql(sql).startswith(analyzed), analyze)
+                self.assertTrue(slowqueries.explain_sql(sql).endswith(sql))
+
+
+class ProfilingTests(SimpleTestCase):
+    def test_busy_worker_serves_unprofiled(self):
+        request = RequestFactory().get('/legerity/products/')
+        with profiling._profiling:
+            response = profiling.profile_request(request, lambda request: HttpResponse(), 1)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(profiling._profiling.locked())
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        self.calls = []
+
+        def flaky(fail=True):
+            self.calls.append(fail)
+            if fail:
+                raise RuntimeError('boom')
+
+        jobs.job('helpers.tests.flaky', max_attempts=2)(flaky)
+        self.addCleanup(jobs.registry.pop, 'helpers.tests.flaky')
+
+    def claim(self):
+        claimed = jobs.claim('test-worker')
+        self.assertEqual(len(claimed), 1)
+        return claimed[0]
+
+    def test_success_deletes_the_job(self):
+        jobs.enqueue('helpers.tests.flaky', {'fail': False})
+        self.assertTrue(jobs.run(self.claim()))
+        self.assertFalse(Job.objects.exists())
+
+    def test_failures_back_off_then_fail(self):
+        queued = jobs.enqueue('helpers.tests.flaky')
+        with self.assertLogs('helpers.jobs', 'ERROR'):
+            self.assertFalse(jobs.run(self.claim()))
+        retry = Job.objects.get(pk=queued.pk)
+        self.assertEqual((retry.status, retry.attempts, retry.locked_by),
+                         (Job.Status.queued, 1, ''))
+        self.assertGreater(retry.run_at, timezone.now())
+        self.assertIn('boom', retry.last_error)
+        self.assertEqual(jobs.claim('test-worker'), [])
+
+        Job.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        with self.assertLogs('helpers.jobs', 'ERROR'):
+            self.assertFalse(jobs.run(self.claim()))
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, Job.Status.failed)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_backoff_grows_with_jitter_up_to_the_cap(self):
+        for attempts, low, high in ((1, 2.5, 5), (3, 10, 20), (30, 1800, 3600)):
+            delay = jobs.backoff(attempts).total_seconds()
+            self.assertTrue(low <= delay <= high, (attempts, delay))
+
+    def test_requeue_stale(self):
+        stale = jobs.enqueue('helpers.tests.flaky')
+        fresh = jobs.enqueue('helpers.tests.flaky')
+        jobs.claim('dead-worker', limit=2)
+        Job.objects.filter(pk=stale.pk).update(
+            locked_at=timezone.now() - jobs.STALE_AFTER - timedelta(seconds=1))
+
+        jobs.requeue_stale_jobs()
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, stale.locked_by), (Job.Status.queued, ''))
+        self.assertEqual((fresh.status, fresh.locked_by), (Job.Status.running, 'dead-worker'))
+        self.assertEqual(jobs.registry['helpers.requeue_stale_jobs'].every, jobs.REQUEUE_EVERY)
+
+
+class LongStatementTests(TestCase):
+    def timeout(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW statement_timeout')
+            return cursor.fetchone()[0]
+
+    @override_settings(REQUEST_STATEMENT_TIMEOUT=30000, LONG_STATEMENT_TIMEOUT=600000)
+    def test_lifts_the_limit_until_the_rows_are_done(self):
+        default = self.timeout()
+        rows = long_running(iter([1, 2]))
+        self.assertEqual(next(rows), 1)
+        self.assertEqual(self.timeout(), '10min')
+        rows.close()
+        self.assertEqual(self.timeout(), default)
+
+    def test_noop_without_a_request_limit(self):
+        with self.assertNumQueries(0), long_statements():
+            pass
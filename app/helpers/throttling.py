@@ -0,0 +1,107 @@
+'''
+Sliding-window rate limits kept in the shared cache.
+
+Each check increments the counter for the current fixed window and reads
+the previous window's count; the request rate is estimated by weighting the
+previous window by how much of it still overlaps the sliding window. On
+Redis both operations go out as one pipeline, so a check costs a single
+round-trip no matter how many workers or nodes share the limit.
+'''
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import SimpleRateThrottle
+
+THROTTLE_CACHE = 'shared'
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    ''' Base class; rates are looked up as ``<view.throttle_scope>_<suffix>``. '''
+    suffix = None
+
+    def __init__(self):
+        # The rate depends on the view, so it is resolved in allow_request.
+        self.cache = caches[THROTTLE_CACHE]
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return True
+        self.scope = f'{scope}_{self.suffix}'
+        self.rate = self.THROTTLE_RATES.get(self.scope)
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        window = int(now // self.duration)
+        self.elapsed = now - window * self.duration
+        self.current, self.previous = self.hit(
+            f'{self.key}:{window}', f'{self.key}:{window - 1}')
+
+        weight = 1 - self.elapsed / self.duration
+        return self.previous * weight + self.current <= self.num_requests
+
+    def hit(self, current_key, previous_key):
+        ''' Increment the current window and return ``(current, previous)`` counts. '''
+        timeout = 2 * self.duration
+        if isinstance(self.cache, RedisCache):
+            current_key = self.cache.make_and_validate_key(current_key)
+            previous_key = self.cache.make_and_validate_key(previous_key)
+            client = self.cache._cache.get_client(current_key, write=True)
+            pipe = client.pipeline()
+            pipe.incr(current_key)
+            pipe.expire(current_key, timeout)
+            pipe.get(previous_key)
+            current, _, previous = pipe.execute()
+            return current, int(previous or 0)
+
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            current = 1 if self.cache.add(current_key, 1, timeout) else self.cache.incr(current_key)
+        return current, self.cache.get(previous_key, 0)
+
+    def wait(self):
+        ''' Seconds until the estimated rate leaves room for one more request. '''
+        room = self.num_requests - 1
+        if self.current <= room and self.previous:
+            needed = 1 - (room - self.current) / self.previous
+            return max(self.duration * needed - self.elapsed, 0)
+        # The current window alone is full: wait for it to slide far enough.
+        needed = max(1 - room / self.current, 0) if self.current else 0
+        return self.duration - self.elapsed + self.duration * needed
+
+
+class ScopedIPThrottle(SlidingWindowThrottle):
+    ''' Limit each client IP address. '''
+    suffix = 'ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class ScopedUserThrottle(SlidingWindowThrottle):
+    ''' Limit each authenticated user, falling back to the client IP address. '''
+    suffix = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class ScopedEmailThrottle(SlidingWindowThrottle):
+    ''' Limit attempts against one account, whatever addresses they come from. '''
+    suffix = 'email'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': email.strip().lower()}
@@ -1,3 +1,124 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView, SpectacularSwaggerView
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from helpers import profiling
+from helpers.schema import CONTENT_TYPES, current_artifact
+
+# Unversioned URLs are revalidated soon after a deploy; versioned ones never change.
+SCHEMA_MAX_AGE = 300
+VERSIONED_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def not_modified(request, etag):
+    return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+
+class SchemaView(SpectacularAPIView):
+    ''' Serve the prebuilt schema, or generate it live when SCHEMA_LIVE is set. '''
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if settings.SCHEMA_LIVE:
+            return super().get(request, *args, **kwargs)
+
+        artifact = current_artifact()
+        version = kwargs.get('version')
+        if version is not None and version != artifact.version:
+            return redirect('api-schema-version', version=artifact.version)
+
+        fmt = self.perform_content_negotiation(request, force=True)[0].format
+        etag = quote_etag(f'{artifact.version}-{fmt}')
+        if not_modified(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(getattr(artifact, fmt), content_type=CONTENT_TYPES[fmt])
+            response['Content-Disposition'] = f'inline; filename="schema-{artifact.version}.{fmt}"'
+        response['ETag'] = etag
+        response['Vary'] = 'Accept'
+        if version is None:
+            patch_cache_control(response, public=True, max_age=SCHEMA_MAX_AGE)
+        else:
+            patch_cache_control(response, public=True, max_age=VERSIONED_MAX_AGE, immutable=True)
+        return response
+
+
+class VersionedSchemaView(SchemaView):
+    @extend_schema(exclude=True)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class SchemaDocsView(SpectacularSwaggerView):
+    ''' Swagger UI pointed at the immutable, versioned schema URL. '''
+
+    @extend_schema(exclude=True)
+    def get(self, request, *args, **kwargs):
+        if settings.SCHEMA_LIVE:
+            return super().get(request, *args, **kwargs)
+
+        artifact = current_artifact()
+        etag = quote_etag(artifact.version)
+        if not_modified(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            self.url = reverse('api-schema-version', kwargs={'version': artifact.version})
+            response = super().get(request, *args, **kwargs)
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=SCHEMA_MAX_AGE)
+        return response
+
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        summary="Cache Stats",
+        description="Hit ratios and invalidation counters of the two-tier cache in the worker that serves the request.",
+        responses={200: dict}
+    )
+    def get(self, request):
+        return Response(cache.stats())
+
+
+def profile_list(request):
+    ''' Saved request profiles and a fresh profiling token for the current user. '''
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': profiling.list_profiles(),
+        'token': profiling.make_token(request.user),
+        'token_max_age': settings.PROFILE_TOKEN_MAX_AGE // 60,
+    }
+    return TemplateResponse(request, 'admin/helpers/profiles.html', context)
+
+
+def profile_detail(request, profile_id):
+    profile = profiling.load(profile_id)
+    if profile is None:
+        raise Http404('No such profile.')
+    context = {
+        **admin.site.each_context(request),
+        'title': f'{profile["method"]} {profile["path"]}',
+        'profile': profile,
+    }
+    return TemplateResponse(request, 'admin/helpers/profile.html', context)
+
+
+def profile_download(request, profile_id):
+    ''' The raw pstats dump, for snakeviz or ``python -m pstats``. '''
+    path = profiling.profile_path(profile_id, '.prof')
+    if path is None:
+        raise Http404('No such profile.')
+    return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
@@ -1,25 +1,160 @@
-from django.contrib import admin
+import io
+
+from django import forms
+from django.contrib import admin, messages
 from django.contrib.auth.models import Group
-from legerity.models import About, Review, Product, Cart, CartItem, Order, OrderProduct
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from helpers.db import long_statements
+from helpers.paginators import EstimatedCountPaginator
+from legerity.catalog import FORMATS, ProductImporter, detect_format
+from legerity.exports import export_orders
+from legerity.models import About, Review, Product, Cart, CartItem, GiftBox, GiftBoxItem, Order, OrderGiftBox, OrderProduct
 # Register your models here.
 admin.site.site_header = 'Admin'
 
 admin.site.register(About)
 admin.site.register(Review)
-admin.site.register(Product)
-admin.site.register(Cart)
-admin.site.register(CartItem)
-# admin.site.register(GiftBox)
-# admin.site.register(GiftBoxItem)
+
+
+class ProductImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV or JSONL, one product per row, keyed by sku.')
+    format = forms.ChoiceField(
+        choices=[('', 'Detect from file name'), *((f, f.upper()) for f in FORMATS)],
+        required=False)
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ('id', 'sku', 'category', 'price', 'stock', 'sales_number')
+    list_filter = ('category',)
+    search_fields = ('sku__exact', 'category', 'info_excerpt')
+    ordering = ('id',)
+    change_list_template = 'admin/legerity/product/change_list.html'
+
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_view),
+                 name='legerity_product_import'),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        ''' Upload front end for the import_products command. '''
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+
+        form = ProductImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            fmt = form.cleaned_data['format'] or detect_format(upload.name)
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+            with long_statements():
+                result = ProductImporter().run(stream, fmt)
+            for number, error in result.errors[:20]:
+                self.message_user(request, f'Line {number}: {error}', messages.WARNING)
+            self.message_user(request, f'Import finished: {result}.', messages.SUCCESS)
+            return redirect('admin:legerity_product_changelist')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import products',
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/legerity/product/import.html', context)
+
+
+@admin.register(Cart)
+class CartAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    search_fields = ('user__email',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(CartItem)
+class CartItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'cart', 'product', 'quantity')
+    list_select_related = ('cart__user', 'product')
+    raw_id_fields = ('cart',)
+    autocomplete_fields = ('product',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class GiftBoxItemInline(admin.TabularInline):
+    model = GiftBoxItem
+    extra = 0
+    autocomplete_fields = ('product',)
+
+
+@admin.register(GiftBox)
+class GiftBoxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'name', 'price', 'available')
+    list_select_related = ('user',)
+    readonly_fields = ('price', 'available')
+    raw_id_fields = ('user',)
+    search_fields = ('name', 'user__email')
+    inlines = (GiftBoxItemInline,)
+
+
+class OrderProductInline(admin.TabularInline):
+    model = OrderProduct
+    extra = 0
+    fields = ('product', 'name', 'category', 'unit_price', 'quantity')
+    readonly_fields = ('name', 'category', 'unit_price')
+    raw_id_fields = ('product',)
+
+
+class OrderGiftBoxInline(admin.TabularInline):
+    model = OrderGiftBox
+    extra = 0
+    fields = ('gift_box', 'name', 'unit_price', 'quantity')
+    readonly_fields = ('name', 'unit_price')
+    raw_id_fields = ('gift_box',)
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'total_price', 'status', 'created_at')
     list_filter = ('status',)
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    date_hierarchy = 'created_at'
+    inlines = (OrderProductInline, OrderGiftBoxInline)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('export_csv', 'export_jsonl')
+
+    def get_formset_kwargs(self, request, obj, inline, prefix):
+        kwargs = super().get_formset_kwargs(request, obj, inline, prefix)
+        if obj is not None and obj.pk is not None:
+            # Read the lines and gift boxes from the order's month partition only.
+            kwargs['queryset'] = kwargs['queryset'].filter(created_at=obj.created_at)
+        return kwargs
+
+    @admin.action(description='Export selected orders as CSV')
+    def export_csv(self, request, queryset):
+        return export_orders(queryset, 'csv')
+
+    @admin.action(description='Export selected orders as JSONL')
+    def export_jsonl(self, request, queryset):
+        return export_orders(queryset, 'jsonl')
 
 
-admin.site.register(OrderProduct)
-# admin.site.register(OrderGiftBox)
+@admin.register(OrderProduct)
+class OrderProductAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'product_id', 'name', 'unit_price', 'quantity')
+    list_select_related = ('order__user',)
+    readonly_fields = ('name', 'category', 'unit_price')
+    raw_id_fields = ('order',)
+    autocomplete_fields = ('product',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 admin.site.unregister(Group)
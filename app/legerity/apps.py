@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LegerityConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'legerity'
+
+    def ready(self):
+        # Connect the storefront cache invalidation receivers.
+        from legerity import signals  # noqa: F401
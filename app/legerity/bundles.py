@@ -0,0 +1,49 @@
+'''
+Denormalized gift box price and availability.
+
+A box's price is the sum of its component prices and its availability the
+number of whole boxes the components' stock can fill; a box with a deleted
+product is unavailable. Both are recomputed in one UPDATE whenever the
+products or items behind them change, inside the transaction that changed
+them.
+'''
+from django.db.models import Case, F, IntegerField, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from legerity.models import GiftBox, GiftBoxItem
+
+
+def component_totals():
+    items = GiftBoxItem.objects.filter(gift_box=OuterRef('pk')).order_by().values('gift_box')
+    price = items.annotate(total=Sum(F('product__price') * F('quantity'))).values('total')
+    available = items.annotate(boxes=Min(Case(
+        When(product__isnull=True, then=Value(0)),
+        default=Greatest(F('product__stock'), Value(0)) / F('quantity'),
+        output_field=IntegerField(),
+    ))).values('boxes')
+    return Subquery(price), Subquery(available)
+
+
+def refresh_bundles(product_ids=None, gift_box_ids=None):
+    '''
+    Recompute the boxes containing ``product_ids`` or listed in ``gift_box_ids``;
+    every box when neither is given. Returns the number of boxes updated.
+    '''
+    boxes = GiftBox.objects.all()
+    if product_ids is not None or gift_box_ids is not None:
+        selected = Q(pk__in=[])
+        if product_ids is not None:
+            selected |= Q(id__in=GiftBoxItem.objects.filter(
+                product_id__in=product_ids).values('gift_box_id'))
+        if gift_box_ids is not None:
+            selected |= Q(id__in=gift_box_ids)
+        boxes = boxes.filter(selected)
+    price, available = component_totals()
+    return boxes.update(price=Coalesce(price, Value(0)),
+                        available=Coalesce(available, Value(0)))
+
+
+def refresh_orphaned():
+    ''' Recompute boxes that lost a product; item rows are nulled without signals. '''
+    return refresh_bundles(gift_box_ids=GiftBoxItem.objects.filter(
+        product__isnull=True).values('gift_box_id'))
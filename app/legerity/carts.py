@@ -0,0 +1,60 @@
+'''
+Cart versions for conditional requests.
+
+Triggers (migration 0019) bump ``Cart.version`` in the same statement that
+changes the cart's items or gift boxes, or the price, picture, category or
+excerpt of a product in it, or the name or price of a gift box in it. The
+cart list returns the version as its ETag and answers a matching
+If-None-Match with 304 after one lookup; mutations accept If-Match.
+'''
+from functools import wraps
+
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from legerity.models import Cart
+
+
+def etag(cart):
+    # The id keeps a recreated cart, whose version starts over, from matching.
+    return quote_etag(f'cart-{cart.id}-{cart.version}')
+
+
+def not_modified(request, cart):
+    return etag(cart) in parse_etags(request.headers.get('If-None-Match', ''))
+
+
+def precondition(method):
+    '''
+    Run a cart mutation only while the cart is at the If-Match version.
+
+    Requests without If-Match run as before. With it, the cart row is locked
+    from the comparison until the mutation commits, and a successful response
+    carries the cart's new ETag.
+    '''
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        header = request.headers.get('If-Match')
+        if header is None:
+            return method(view, request, *args, **kwargs)
+
+        with transaction.atomic():
+            cart = (Cart.objects.select_for_update().only('id', 'version')
+                    .filter(user=request.user).first())
+            etags = parse_etags(header)
+            if cart is None or not ('*' in etags or etag(cart) in etags):
+                response = Response({'error': 'The cart has changed'},
+                                    status=status.HTTP_412_PRECONDITION_FAILED)
+                if cart is not None:
+                    response['ETag'] = etag(cart)
+                return response
+
+            response = method(view, request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                cart.refresh_from_db(fields=['version'])
+                response['ETag'] = etag(cart)
+            return response
+
+    return wrapper
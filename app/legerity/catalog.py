@@ -0,0 +1,199 @@
+'''
+Streaming product catalog import.
+'''
+import csv
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from legerity import snapshots
+from legerity.bundles import refresh_bundles
+from legerity.models import Product
+from legerity.storefront import bump
+
+FORMATS = ('csv', 'jsonl')
+
+REQUIRED_FIELDS = ('sku', 'category', 'price', 'stock', 'info')
+OPTIONAL_FIELDS = ('sales_number',)
+# Optional fields are only overwritten by rows that supply them.
+UPDATE_FIELDS = ('category', 'price', 'stock', 'info', 'info_html', 'info_excerpt')
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    errors: list = field(default_factory=list)
+
+    def __str__(self):
+        return (f'{self.created} created, {self.updated} updated, '
+                f'{len(self.errors)} rejected')
+
+
+def detect_format(filename):
+    suffix = Path(filename).suffix.lstrip('.').lower()
+    return 'jsonl' if suffix in ('jsonl', 'ndjson', 'json') else 'csv'
+
+
+def read_rows(stream, fmt):
+    ''' Yield ``(line_number, row)`` pairs from a text stream without loading it whole. '''
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, e
+
+
+class ProductImporter:
+    ''' Validate rows against the Product fields and upsert them by SKU in batches. '''
+
+    def __init__(self, batch_size=1000, workers=4, image_root=None):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.image_root = Path(image_root or settings.MEDIA_ROOT)
+        self.fields = {name: Product._meta.get_field(name)
+                       for name in REQUIRED_FIELDS + OPTIONAL_FIELDS}
+
+    def run(self, stream, fmt='csv'):
+        result = ImportResult()
+        rows = read_rows(stream, fmt)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while batch := list(islice(rows, self.batch_size)):
+                self.import_batch(batch, pool, result)
+        # bulk_create sends no post_save, so invalidate the caches here.
+        refresh_bundles()
+        bump('products', 'about')
+        snapshots.invalidate()
+        return result
+
+    def import_batch(self, batch, pool, result):
+        products = {}
+        for number, row in batch:
+            try:
+                product, image, update_fields = self.build(row)
+            except ValidationError as e:
+                result.errors.append((number, '; '.join(e.messages)))
+                continue
+            # Later rows for the same SKU win, as they would row by row.
+            products[product.sku] = (number, product, image, update_fields)
+
+        existing = set(Product.objects.filter(
+            sku__in=products).values_list('sku', flat=True))
+        images = {
+            sku: pool.submit(self.store_image, image)
+            for sku, (_, _, image, _) in products.items() if image
+        }
+
+        # One upsert per set of columns to overwrite.
+        groups = {}
+        for sku, (number, product, image, update_fields) in products.items():
+            if image:
+                try:
+                    product.image = images[sku].result()
+                except (OSError, ValueError, SuspiciousFileOperation) as e:
+                    result.errors.append((number, f'image: {e}'))
+                    continue
+                update_fields += ('image',)
+            elif sku not in existing:
+                result.errors.append((number, 'image is required for new products'))
+                continue
+            groups.setdefault(update_fields, []).append(product)
+            if sku in existing:
+                result.updated += 1
+            else:
+                result.created += 1
+
+        for update_fields, group in groups.items():
+            Product.objects.bulk_create(
+                group,
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=update_fields,
+            )
+
+    def build(self, row):
+        '''
+        Return an unsaved Product, its image reference and the fields an
+        upsert may overwrite, or raise ValidationError.
+        '''
+        if isinstance(row, Exception):
+            raise ValidationError(f'invalid JSON: {row}')
+        if not isinstance(row, dict):
+            raise ValidationError('expected an object')
+
+        values = {}
+        for name, model_field in self.fields.items():
+            raw = row.get(name)
+            if raw in (None, '') and name in OPTIONAL_FIELDS:
+                continue
+            if isinstance(raw, str):
+                raw = raw.strip()
+            try:
+                values[name] = model_field.clean(raw, None)
+            except ValidationError as e:
+                raise ValidationError([f'{name}: {message}' for message in e.messages])
+
+        product = Product(**values)
+        product.refresh_derived_html()
+        supplied = tuple(name for name in OPTIONAL_FIELDS if name in values)
+        return product, (row.get('image') or '').strip(), UPDATE_FIELDS + supplied
+
+    def resolve_image(self, reference):
+        '''
+        Return ``(storage_name, None)`` for stored media or ``(None, path)`` for
+        local files, which must resolve inside ``image_root``.
+        '''
+        if reference.startswith(settings.MEDIA_URL):
+            return unquote(reference[len(settings.MEDIA_URL):]), None
+
+        parsed = urlparse(reference)
+        if parsed.scheme == 'file':
+            path = Path(unquote(parsed.path))
+        elif parsed.scheme:
+            raise ValueError(f'unsupported image URL {reference!r}')
+        else:
+            path = Path(reference)
+        root = self.image_root.resolve()
+        path = (root / path).resolve()
+        if not path.is_relative_to(root):
+            raise ValueError(f'{reference!r} is outside {root}')
+        return None, path
+
+    def store_image(self, reference):
+        ''' Verify the image and copy it into storage under a content-addressed name. '''
+        name, path = self.resolve_image(reference)
+        if name is not None:
+            if not default_storage.exists(name):
+                raise ValueError(f'{reference!r} does not exist')
+            return name
+
+        with open(path, 'rb') as fh:
+            with Image.open(fh) as image:
+                image.verify()
+            fh.seek(0)
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: fh.read(1 << 20), b''):
+                digest.update(chunk)
+            name = f'products/{digest.hexdigest()[:32]}{os.path.splitext(path)[1].lower()}'
+            if not default_storage.exists(name):
+                fh.seek(0)
+                name = default_storage.save(name, File(fh))
+        return name
@@ -0,0 +1,97 @@
+'''
+Streaming exports of orders and their lines.
+'''
+import csv
+import json
+from datetime import timedelta
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from helpers.dates import local_midnight
+from helpers.db import long_running
+from legerity.partitions import prefetch_order_rows
+
+CHUNK_SIZE = 2000
+
+ORDER_COLUMNS = ['order_id', 'created_at', 'status', 'user_email', 'total_price',
+                 'address', 'zip_code', 'phone_number']
+LINE_COLUMNS = ['product_id', 'name', 'category', 'unit_price', 'quantity']
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class Echo:
+    ''' File-like object whose ``write`` returns the value for streaming. '''
+
+    def write(self, value):
+        return value
+
+
+def export_queryset(queryset):
+    ''' Orders with users and lines loaded chunk by chunk from a server-side cursor. '''
+    orders = queryset.select_related('user').order_by('id').iterator(chunk_size=CHUNK_SIZE)
+    while chunk := list(islice(orders, CHUNK_SIZE)):
+        prefetch_order_rows(chunk, 'products')
+        yield from chunk
+
+
+def order_row(order):
+    return [order.id, order.created_at.isoformat(), order.status, order.user.email,
+            order.total_price, order.address, order.zip_code, order.phone_number]
+
+
+def line_row(line):
+    return [line.product_id, line.name, line.category, line.unit_price, line.quantity]
+
+
+def iter_csv(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(ORDER_COLUMNS + LINE_COLUMNS)
+    for order in export_queryset(queryset):
+        head = order_row(order)
+        lines = order.products.all() or [None]
+        for line in lines:
+            tail = line_row(line) if line else [None] * len(LINE_COLUMNS)
+            yield writer.writerow(head + tail)
+
+
+def iter_jsonl(queryset):
+    for order in export_queryset(queryset):
+        record = dict(zip(ORDER_COLUMNS, order_row(order)))
+        record['lines'] = [dict(zip(LINE_COLUMNS, line_row(line)))
+                           for line in order.products.all()]
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+def export_orders(queryset, output='csv'):
+    ''' Stream ``queryset`` as CSV (one row per line) or JSONL (one object per order). '''
+    rows = iter_csv(queryset) if output == 'csv' else iter_jsonl(queryset)
+    filename = f'orders-{timezone.localtime():%Y%m%d-%H%M%S}.{output}'
+    return StreamingHttpResponse(
+        long_running(rows),
+        content_type=CONTENT_TYPES[output],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            # Let nginx pass chunks through instead of spooling the export.
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+
+def filter_orders(queryset, status=None, start=None, end=None):
+    ''' Apply the optional status and local date range filters. '''
+    if status:
+        queryset = queryset.filter(status=status)
+    # Compare against local midnights so the created_at index can be used.
+    if start:
+        queryset = queryset.filter(created_at__gte=local_midnight(start))
+    if end:
+        queryset = queryset.filter(
+            created_at__lt=local_midnight(end + timedelta(days=1)))
+    return queryset
@@ -0,0 +1,36 @@
+'''
+Background jobs for the legerity app.
+'''
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils.dateparse import parse_datetime
+
+from helpers.jobs import job
+from legerity.models import Order, Product
+from legerity.partitions import create_partition, missing_partitions
+from legerity.reports import record_order_sales
+
+
+@job('legerity.order_placed')
+def order_placed(order_id, created_at=None):
+    ''' Update sales counters and rollups for a newly placed order. '''
+    orders = Order.objects.filter(id=order_id)
+    # created_at confines the lookups to the order's month partition; jobs
+    # queued by older releases only carry the id.
+    if created_at is not None:
+        orders = orders.filter(created_at=parse_datetime(created_at))
+    order = orders.get()
+    lines = list(order.products.filter(created_at=order.created_at))
+    for line in lines:
+        if line.product_id is not None:
+            Product.objects.filter(id=line.product_id).update(
+                sales_number=F('sales_number') + line.quantity)
+    record_order_sales(order, lines)
+
+
+@job('legerity.create_order_partitions', every=timedelta(days=1))
+def create_order_partitions(ahead=3):
+    ''' Keep monthly order partitions ``ahead`` months beyond the current one. '''
+    for table, month in list(missing_partitions(ahead)):
+        create_partition(table, *month)
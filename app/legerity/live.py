@@ -0,0 +1,324 @@
+'''
+Live product price and stock changes, over server-sent events or long polls.
+
+Triggers on legerity_product NOTIFY the ``legerity_products`` channel when
+products are added or deleted or change price or stock (migration 0018), so
+saves, checkout's stock decrement and catalog imports are all published, and
+only once they commit. Each ASGI process keeps one LISTEN connection in a
+background thread and fans the changes out on its event loop; a watcher is
+a queue and an open socket, without a thread or any queries of its own.
+
+    GET /legerity/live/products/?ids=1,2                server-sent events
+    GET /legerity/live/products/poll/?ids=1,2&cursor=   long poll, JSON
+
+Leaving out ``ids`` follows every product. Every change carries a cursor:
+SSE clients resume with Last-Event-ID, long-poll clients send back the last
+cursor they got. A cursor the process cannot resume from (issued by another
+process, lost to a restart, a listener reconnect or a full queue) gets a
+``reset``, after which the client reloads the products it shows. To keep
+that rare, scripts/run_live.sh runs one process per container and the proxy
+pins each client to a container.
+'''
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'legerity_products'
+PREFIX = '/legerity/live/'
+# Seconds a quiet LISTEN connection waits before checking it is still alive.
+KEEPALIVE = 60
+RECONNECT_DELAY = 1
+RECONNECT_DELAY_MAX = 30
+RETRY_MS = 3000
+RESET = object()
+
+
+class Watcher:
+    ''' One client: the products it follows and the changes waiting for it. '''
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.queue = asyncio.Queue(settings.LIVE_QUEUE_SIZE)
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # A client this far behind has to reload anyway.
+            self.drain()
+            self.queue.put_nowait(RESET)
+
+    def drain(self):
+        items = []
+        while not self.queue.empty():
+            items.append(self.queue.get_nowait())
+        return items
+
+
+class Hub:
+    ''' The process's watchers and recent changes; only touched on the event loop. '''
+
+    def __init__(self):
+        self.process = uuid.uuid4().hex[:8]
+        self.loop = None
+        self.listener = None
+        self.watchers = set()
+        self.everything = set()
+        self.by_id = defaultdict(set)
+        self.backlog = deque()
+        self.seq = 0
+        # Cursors before this cannot be resumed: changes were missed before it.
+        self.floor = 0
+
+    def start(self):
+        ''' Bind to the running loop and start the listener, once per process. '''
+        if self.listener is None:
+            self.loop = asyncio.get_running_loop()
+            self.backlog = deque(maxlen=settings.LIVE_BACKLOG)
+            self.listener = Listener(self)
+            self.listener.start()
+
+    def cursor(self, seq=None):
+        return f'{self.process}.{self.seq if seq is None else seq}'
+
+    def watch(self, ids):
+        watcher = Watcher(ids)
+        self.watchers.add(watcher)
+        if ids is None:
+            self.everything.add(watcher)
+        for product_id in ids or ():
+            self.by_id[product_id].add(watcher)
+        return watcher
+
+    def unwatch(self, watcher):
+        self.watchers.discard(watcher)
+        self.everything.discard(watcher)
+        for product_id in watcher.ids or ():
+            watchers = self.by_id[product_id]
+            watchers.discard(watcher)
+            if not watchers:
+                del self.by_id[product_id]
+
+    def since(self, cursor, ids):
+        ''' ``(seq, change)`` pairs after ``cursor`` for ``ids``, or None if it cannot be resumed. '''
+        process, _, seq = cursor.partition('.')
+        if process != self.process or not seq.isdigit():
+            return None
+        seq = int(seq)
+        oldest = self.backlog[0][0] if self.backlog else self.seq + 1
+        if seq < self.floor or seq > self.seq or seq < oldest - 1:
+            return None
+        return [(number, change) for number, change in self.backlog
+                if number > seq and (ids is None or change['id'] in ids)]
+
+    def publish(self, changes):
+        ''' Hand ``changes`` over from the listener thread. '''
+        self.loop.call_soon_threadsafe(self.deliver, changes)
+
+    def reset(self):
+        ''' Tell every watcher, from the listener thread, that changes were missed. '''
+        self.loop.call_soon_threadsafe(self.deliver_reset)
+
+    def deliver(self, changes):
+        for change in changes:
+            self.seq += 1
+            self.backlog.append((self.seq, change))
+            for watcher in (*self.everything, *self.by_id.get(change['id'], ())):
+                watcher.put((self.seq, change))
+
+    def deliver_reset(self):
+        # A cursor of its own, so clients that saw the reset can resume after it.
+        self.seq += 1
+        self.floor = self.seq
+        self.backlog.clear()
+        for watcher in self.watchers:
+            watcher.drain()
+            watcher.put(RESET)
+
+
+class Listener(threading.Thread):
+    ''' The process's one LISTEN connection; passes notifications to the hub. '''
+
+    def __init__(self, hub):
+        super().__init__(name='live-listener', daemon=True)
+        self.hub = hub
+        self.delay = RECONNECT_DELAY
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except Exception:
+                logger.exception('Lost the %s listener connection', CHANNEL)
+            # Whatever was published while reconnecting is gone.
+            self.hub.reset()
+            time.sleep(self.delay)
+            self.delay = min(self.delay * 2, RECONNECT_DELAY_MAX)
+
+    def listen(self):
+        wrapper = connections['default']
+        connection = wrapper.get_new_connection(wrapper.get_connection_params())
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            self.delay = RECONNECT_DELAY
+            while True:
+                if not select.select([connection], [], [], KEEPALIVE)[0]:
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                connection.poll()
+                changes = []
+                while connection.notifies:
+                    changes.extend(json.loads(connection.notifies.pop(0).payload))
+                if changes:
+                    self.hub.publish(changes)
+        finally:
+            connection.close()
+
+
+hub = Hub()
+
+
+def parse_ids(value):
+    ''' The product ids in comma-separated ``value``; None follows every product. '''
+    if not value:
+        return None
+    try:
+        ids = frozenset(int(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError('ids must be comma-separated product ids') from None
+    if len(ids) > settings.LIVE_MAX_IDS:
+        raise ValueError(f'At most {settings.LIVE_MAX_IDS} products can be watched')
+    return ids
+
+
+def headers(content_type, *extra):
+    headers = [(b'content-type', content_type), (b'cache-control', b'no-store'), *extra]
+    if settings.CORS_ALLOW_ALL_ORIGINS:
+        headers.append((b'access-control-allow-origin', b'*'))
+    return headers
+
+
+async def respond(send, status, body, *extra):
+    content = json.dumps(body).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': headers(b'application/json', *extra)})
+    await send({'type': 'http.response.body', 'body': content})
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def next_items(watcher, disconnect, timeout):
+    ''' Whatever is queued for ``watcher`` within ``timeout``; None once the client left. '''
+    get = asyncio.ensure_future(watcher.queue.get())
+    done, _ = await asyncio.wait((get, disconnect), timeout=timeout,
+                                 return_when=asyncio.FIRST_COMPLETED)
+    if get not in done:
+        get.cancel()
+        return None if disconnect in done else []
+    return [get.result(), *watcher.drain()]
+
+
+def event(seq, change):
+    return f'id: {hub.cursor(seq)}\nevent: product\ndata: {json.dumps(change)}\n\n'
+
+
+def reset_event():
+    return f'id: {hub.cursor()}\nevent: reset\ndata: {{}}\n\n'
+
+
+async def stream(scope, receive, send, ids):
+    ''' Server-sent events until the client disconnects. '''
+    last_event_id = dict(scope['headers']).get(b'last-event-id', b'').decode('latin-1')
+    watcher = hub.watch(ids)
+    disconnect = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        backlog = hub.since(last_event_id, ids) if last_event_id else []
+        chunks = [f'retry: {RETRY_MS}\n\n']
+        chunks += [reset_event()] if backlog is None else [event(*item) for item in backlog]
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': headers(b'text/event-stream; charset=utf-8',
+                                       (b'x-accel-buffering', b'no'))})
+        await send({'type': 'http.response.body', 'body': ''.join(chunks).encode(),
+                    'more_body': True})
+        while True:
+            items = await next_items(watcher, disconnect, settings.LIVE_HEARTBEAT)
+            if items is None:
+                return
+            if RESET in items:
+                chunks = [reset_event()]
+            else:
+                chunks = [event(*item) for item in items] or [': ping\n\n']
+            await send({'type': 'http.response.body', 'body': ''.join(chunks).encode(),
+                        'more_body': True})
+    finally:
+        disconnect.cancel()
+        hub.unwatch(watcher)
+
+
+async def poll(receive, send, ids, cursor):
+    ''' Changes after ``cursor``, waiting up to LIVE_POLL_TIMEOUT for the first one. '''
+    watcher = hub.watch(ids)
+    disconnect = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        items = hub.since(cursor, ids) if cursor else []
+        if items == []:
+            items = await next_items(watcher, disconnect, settings.LIVE_POLL_TIMEOUT)
+            if items is None:
+                return
+        if items is None or RESET in items:
+            body = {'cursor': hub.cursor(), 'reset': True, 'changes': []}
+        else:
+            body = {'cursor': hub.cursor(), 'reset': False,
+                    'changes': [change for _, change in items]}
+        await respond(send, 200, body)
+    finally:
+        disconnect.cancel()
+        hub.unwatch(watcher)
+
+
+async def application(scope, receive, send):
+    ''' ASGI app for the paths under PREFIX; app.asgi routes them here. '''
+    path = scope['path'][len(PREFIX):]
+    if path not in ('products/', 'products/poll/'):
+        return await respond(send, 404, {'error': 'Not found'})
+    if scope['method'] != 'GET':
+        return await respond(send, 405, {'error': 'Method not allowed'}, (b'allow', b'GET'))
+    query = parse_qs(scope['query_string'].decode('latin-1'))
+    try:
+        ids = parse_ids(query.get('ids', [''])[-1])
+    except ValueError as e:
+        return await respond(send, 400, {'error': str(e)})
+
+    hub.start()
+    if path == 'products/':
+        await stream(scope, receive, send, ids)
+    else:
+        await poll(receive, send, ids, query.get('cursor', [''])[-1])
+
+
+async def lifespan(scope, receive, send):
+    ''' Start listening with the server rather than on the first watcher. '''
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            hub.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
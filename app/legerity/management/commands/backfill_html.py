@@ -0,0 +1,43 @@
+'''
+Django command to backfill sanitized HTML and excerpts for rich text fields.
+'''
+from django.core.management.base import BaseCommand
+
+from legerity.models import Product, Review
+from legerity.storefront import bump
+
+
+class Command(BaseCommand):
+    ''' Django command to recompute derived HTML columns in batches. '''
+
+    models = (Product, Review)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        ''' Entrypoint for command. '''
+        batch_size = options['batch_size']
+        for model in self.models:
+            updated = self.backfill(model, batch_size)
+            self.stdout.write(f'{model.__name__}: {updated} rows updated.')
+        # bulk_update sends no post_save, so invalidate the storefront here.
+        bump('products', 'reviews')
+
+        self.stdout.write(self.style.SUCCESS('Backfill complete!'))
+
+    def backfill(self, model, batch_size):
+        ''' Walk the table by primary key, writing only rows that changed. '''
+        derived = [f'{field}_{suffix}' for field in model.html_fields
+                   for suffix in ('html', 'excerpt')]
+        queryset = model.objects.only('pk', *model.html_fields, *derived)
+        last_pk, updated = 0, 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                return updated
+            changed = [obj for obj in batch if obj.refresh_derived_html()]
+            if changed:
+                model.objects.bulk_update(changed, derived)
+                updated += len(changed)
+            last_pk = batch[-1].pk
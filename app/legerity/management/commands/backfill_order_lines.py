@@ -0,0 +1,41 @@
+'''
+Django command to backfill product snapshots on order lines placed before checkout recorded them.
+'''
+from django.core.management.base import BaseCommand
+
+from legerity.models import OrderProduct
+
+
+class Command(BaseCommand):
+    '''
+    Django command to copy name, category and unit price onto old order lines.
+
+    Historical prices were never stored, so lines take the product's current
+    price. Lines whose product has been deleted keep an empty snapshot.
+    '''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ''' Entrypoint for command. '''
+        batch_size = options['batch_size']
+        queryset = (OrderProduct.objects
+                    .filter(unit_price__isnull=True, product__isnull=False)
+                    .select_related('product')
+                    .only('id', 'product__category', 'product__price'))
+        last_pk, updated = 0, 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            for line in batch:
+                line.name = line.product.display_name
+                line.category = line.product.category
+                line.unit_price = line.product.price
+            OrderProduct.objects.bulk_update(batch, ['name', 'category', 'unit_price'])
+            updated += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f'{updated} lines updated...')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfill complete! {updated} lines updated.'))
@@ -0,0 +1,99 @@
+'''
+Django command to compare the DRF list serializers with their fast paths.
+'''
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from customer.models import User
+from legerity.models import Cart, CartItem, Product, Review
+from legerity.serializers import (CartItemListFastSerializer, CartItemListSerializer,
+                                  ProductListFastSerializer, ProductListSerializer,
+                                  ReviewListFastSerializer, ReviewListSerializer)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    '''
+    Django command to time list serialization on generated rows.
+
+    The rows are created in a transaction that is rolled back afterwards.
+    Each path is timed end to end and for its query alone, best of
+    ``--repeat`` runs, and the outputs are checked to be identical.
+    '''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        ''' Entrypoint for command. '''
+        self.repeat = max(options['repeat'], 1)
+        try:
+            with transaction.atomic():
+                cart = self.generate(options['rows'])
+                self.stdout.write(f'{"serializer":<12} {"path":<5} {"total ms":>9} '
+                                  f'{"query ms":>9} {"per row us":>11}')
+                for name, serializer_class, fast_serializer_class, queryset in (
+                    ('products', ProductListSerializer, ProductListFastSerializer,
+                     Product.objects.defer('info', 'info_html').order_by('id')),
+                    ('reviews', ReviewListSerializer, ReviewListFastSerializer,
+                     Review.objects.defer('comment', 'comment_html').order_by('id')),
+                    ('cart items', CartItemListSerializer, CartItemListFastSerializer,
+                     CartItem.objects.filter(cart=cart).select_related('product')
+                     .defer('product__info', 'product__info_html').order_by('id')),
+                ):
+                    self.compare(name, serializer_class, fast_serializer_class, queryset)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def generate(self, rows):
+        start = Product.objects.count()
+        products = Product.objects.bulk_create([
+            Product(sku=f'BENCH-{number}', category=Product.Category.oil, price=Decimal('9.50'),
+                    stock=1000, image='products/oil.png', info='<p>Oil</p>',
+                    info_html='<p>Oil</p>', info_excerpt='Oil')
+            for number in range(start, start + rows)
+        ])
+        Review.objects.bulk_create([
+            Review(fullname=f'Reviewer {number}', image='reviews/r.png', comment='<p>Great</p>',
+                   comment_html='<p>Great</p>', comment_excerpt='Great')
+            for number in range(rows)
+        ])
+        user = User.objects.create(email=f'bench-{time.time_ns()}@example.com')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=2) for product in products
+        ])
+        return cart
+
+    def best(self, func):
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000, result
+
+    def compare(self, name, serializer_class, fast_serializer_class, queryset):
+        columns, _ = fast_serializer_class.compile()
+        total, expected = self.best(lambda: serializer_class(queryset.all(), many=True).data)
+        query, _ = self.best(lambda: list(queryset.all()))
+        fast_total, data = self.best(lambda: fast_serializer_class(queryset.all()).data)
+        fast_query, rows = self.best(lambda: list(queryset.values_list(*columns)))
+
+        for path, total_ms, query_ms in (('drf', total, query), ('fast', fast_total, fast_query)):
+            per_row = total_ms * 1000 / max(len(rows), 1)
+            self.stdout.write(f'{name:<12} {path:<5} {total_ms:>9.2f} {query_ms:>9.2f} '
+                              f'{per_row:>11.2f}')
+        if data != list(expected):
+            self.stdout.write(self.style.ERROR(f'{name}: outputs differ!'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: identical output, {total / fast_total:.1f}x faster.'))
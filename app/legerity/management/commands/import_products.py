@@ -0,0 +1,43 @@
+'''
+Django command to import or update products from a CSV or JSONL file.
+'''
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from legerity.catalog import FORMATS, ProductImporter, detect_format
+
+
+class Command(BaseCommand):
+    ''' Django command to bulk upsert the product catalog by SKU. '''
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file with one product per row.')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format (default: guessed from the file extension).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Parallel image processing workers.')
+        parser.add_argument('--image-root',
+                            help='Directory local image paths are resolved against and '
+                                 'must stay inside (default: the input file directory).')
+
+    def handle(self, *args, **options):
+        ''' Entrypoint for command. '''
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        image_root = options['image_root'] or Path(path).resolve().parent
+        importer = ProductImporter(
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            image_root=image_root,
+        )
+        try:
+            with open(path, newline='', encoding='utf-8') as stream:
+                result = importer.run(stream, fmt)
+        except OSError as e:
+            raise CommandError(e)
+
+        for number, error in result.errors:
+            self.stderr.write(f'Line {number}: {error}')
+        self.stdout.write(self.style.SUCCESS(f'Import finished: {result}.'))
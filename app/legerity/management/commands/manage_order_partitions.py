@@ -0,0 +1,59 @@
+'''
+Django command to create upcoming order partitions and retire old ones.
+'''
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from legerity.partitions import (TABLES, add_months, create_partition, detach_partition,
+                                 list_partitions, missing_partitions, partition_name)
+
+
+class Command(BaseCommand):
+    '''
+    Django command to keep monthly partitions of orders and their lines ahead
+    of time and detach months older than the retention window.
+    '''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3,
+                            help='Months after the current one to create (default: 3).')
+        parser.add_argument('--retain-months', type=int,
+                            help='Detach months that ended more than this many months ago.')
+        parser.add_argument('--archive-schema', default='archive',
+                            help='Schema detached partitions are moved to (default: archive).')
+        parser.add_argument('--drop', action='store_true',
+                            help='Drop detached partitions instead of archiving them.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        ''' Entrypoint for command. '''
+        today = timezone.localdate()
+        current = (today.year, today.month)
+
+        for table, month in list(missing_partitions(options['ahead'])):
+            self.stdout.write(f'Creating {partition_name(table, *month)}')
+            if not options['dry_run']:
+                try:
+                    with transaction.atomic():
+                        create_partition(table, *month)
+                except DatabaseError as e:
+                    raise CommandError(
+                        f'Could not create {partition_name(table, *month)} '
+                        f'({str(e).strip()}). Move rows for that month out of '
+                        'the default partition first.')
+
+        if options['retain_months'] is not None:
+            cutoff = add_months(*current, -options['retain_months'])
+            for table in TABLES:
+                for month, name in sorted(list_partitions(table).items()):
+                    if month >= cutoff:
+                        continue
+                    action = 'Dropping' if options['drop'] else f'Archiving to {options["archive_schema"]}:'
+                    self.stdout.write(f'{action} {name}')
+                    if not options['dry_run']:
+                        with transaction.atomic():
+                            detach_partition(table, name, options['archive_schema'],
+                                             options['drop'])
+
+        self.stdout.write(self.style.SUCCESS('Order partitions up to date.'))
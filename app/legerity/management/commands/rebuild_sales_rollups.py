@@ -0,0 +1,44 @@
+'''
+Django command to rebuild the daily sales rollups from order history.
+'''
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from legerity.models import Order
+from legerity.reports import rebuild_sales
+
+
+class Command(BaseCommand):
+    ''' Django command to backfill sales rollups a few days at a time. '''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat,
+                            help='First local date to rebuild (default: first order).')
+        parser.add_argument('--end', type=date.fromisoformat,
+                            help='Last local date to rebuild (default: yesterday).')
+        parser.add_argument('--chunk-days', type=int, default=7)
+
+    def handle(self, *args, **options):
+        ''' Entrypoint for command. '''
+        start = options['start']
+        if start is None:
+            first = Order.objects.aggregate(first=Min('created_at'))['first']
+            if first is None:
+                self.stdout.write('No orders to roll up.')
+                return
+            start = timezone.localdate(first)
+        end = options['end'] or timezone.localdate() - timedelta(days=1)
+        if start > end:
+            raise CommandError('--start must not be after --end.')
+
+        chunk = timedelta(days=max(options['chunk_days'], 1))
+        while start <= end:
+            chunk_end = min(start + chunk - timedelta(days=1), end)
+            rebuild_sales(start, chunk_end)
+            self.stdout.write(f'Rebuilt {start} to {chunk_end}.')
+            start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS('Sales rollups rebuilt!'))
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.7 on 2026-10-19 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legerity', '0009_alter_order_address_alter_order_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='info_excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Info Excerpt'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='info_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Info (sanitized)'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='comment_excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Comment Excerpt'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='comment_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Comment (sanitized)'),
+        ),
+    ]
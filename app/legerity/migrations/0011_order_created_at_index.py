@@ -0,0 +1,21 @@
+# Generated by Django 5.0.7 on 2026-10-19 16:22
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('legerity', '0010_product_info_html_review_comment_html'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='created_at_index'),
+        ),
+    ]
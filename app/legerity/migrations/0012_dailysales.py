@@ -0,0 +1,30 @@
+# Generated by Django 5.0.7 on 2026-10-19 16:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legerity', '0011_order_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('category', models.CharField(choices=[('Mask', 'Mask'), ('Balm', 'Balm'), ('Cream', 'Cream'), ('Oil', 'Oil'), ('Shampoo', 'Shampoo')], max_length=100, verbose_name='Category')),
+                ('units', models.IntegerField(default=0, verbose_name='Units')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Revenue')),
+                ('orders', models.IntegerField(default=0, verbose_name='Orders')),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='legerity.product', verbose_name='Product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('date', 'category', 'product'), name='daily_sales_unique'),
+        ),
+    ]
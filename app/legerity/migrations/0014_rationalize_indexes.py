@@ -0,0 +1,109 @@
+# Generated by Django 5.0.7 on 2026-10-19 16:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+def drop_field_index(alter_field, *indexes):
+    ''' Apply ``alter_field`` to the state but drop its indexes concurrently. '''
+    return migrations.SeparateDatabaseAndState(
+        state_operations=[alter_field],
+        database_operations=[
+            migrations.RunSQL(
+                f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"',
+                reverse_sql=f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON {definition}',
+            )
+            for name, definition in indexes
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('legerity', '0013_product_sku'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='cartitem',
+            index=models.Index(fields=['cart', 'product'], name='cart_product'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='user_history'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='cart',
+            name='user-cart',
+        ),
+        RemoveIndexConcurrently(
+            model_name='cartitem',
+            name='cart',
+        ),
+        RemoveIndexConcurrently(
+            model_name='order',
+            name='user_index',
+        ),
+        drop_field_index(
+            migrations.AlterField(
+                model_name='cartitem',
+                name='cart',
+                field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='cart_items', to='legerity.cart', verbose_name='Cart'),
+            ),
+            ('legerity_cartitem_cart_id_0f27e63c', '"legerity_cartitem" ("cart_id")'),
+        ),
+        drop_field_index(
+            migrations.AlterField(
+                model_name='order',
+                name='user',
+                field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User'),
+            ),
+            ('legerity_order_user_id_578c220c', '"legerity_order" ("user_id")'),
+        ),
+        drop_field_index(
+            migrations.AlterField(
+                model_name='orderproduct',
+                name='order',
+                field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='products', to='legerity.order', verbose_name='Order'),
+            ),
+            ('legerity_orderproduct_order_id_4460bbab', '"legerity_orderproduct" ("order_id")'),
+        ),
+        drop_field_index(
+            migrations.AlterField(
+                model_name='product',
+                name='category',
+                field=models.CharField(choices=[('Mask', 'Mask'), ('Balm', 'Balm'), ('Cream', 'Cream'), ('Oil', 'Oil'), ('Shampoo', 'Shampoo')], max_length=100, verbose_name='Category'),
+            ),
+            ('legerity_product_category_5c3f4fc8', '"legerity_product" ("category")'),
+            ('legerity_product_category_5c3f4fc8_like', '"legerity_product" ("category" varchar_pattern_ops)'),
+        ),
+        drop_field_index(
+            migrations.AlterField(
+                model_name='product',
+                name='price',
+                field=models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Price'),
+            ),
+            ('legerity_product_price_1e9e2546', '"legerity_product" ("price")'),
+        ),
+        drop_field_index(
+            migrations.AlterField(
+                model_name='product',
+                name='sales_number',
+                field=models.IntegerField(default=0, verbose_name='Sales Number'),
+            ),
+            ('legerity_product_sales_number_f6fc2a7e', '"legerity_product" ("sales_number")'),
+        ),
+        drop_field_index(
+            migrations.AlterField(
+                model_name='product',
+                name='stock',
+                field=models.IntegerField(verbose_name='Stock'),
+            ),
+            ('legerity_product_stock_c857cf55', '"legerity_product" ("stock")'),
+        ),
+    ]
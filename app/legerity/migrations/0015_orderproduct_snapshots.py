@@ -0,0 +1,28 @@
+# Generated by Django 5.0.7 on 2026-10-19 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legerity', '0014_rationalize_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderproduct',
+            name='category',
+            field=models.CharField(blank=True, choices=[('Mask', 'Mask'), ('Balm', 'Balm'), ('Cream', 'Cream'), ('Oil', 'Oil'), ('Shampoo', 'Shampoo')], default='', max_length=100, verbose_name='Category'),
+        ),
+        migrations.AddField(
+            model_name='orderproduct',
+            name='name',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='Name'),
+        ),
+        migrations.AddField(
+            model_name='orderproduct',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Unit Price'),
+        ),
+    ]
@@ -0,0 +1,159 @@
+# Generated by Django 5.0.7 on 2026-10-19 16:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import migrations, models
+
+ORDERS = 'legerity_order'
+LINES = 'legerity_orderproduct'
+MONTHS_AHEAD = 3
+
+
+def month_start(year, month):
+    return datetime(year, month, 1, tzinfo=ZoneInfo(settings.TIME_ZONE))
+
+
+def next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def rebuild(cursor, table, primary_key, months=None):
+    '''
+    Recreate ``table`` with the same columns, indexes and foreign keys, range
+    partitioned by month of created_at when ``months`` is given.
+    '''
+    cursor.execute(
+        'SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s',
+        [table, f'{table}_pkey'])
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        '''SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+           WHERE conrelid = %s::regclass AND contype = 'f' ''', [table])
+    foreign_keys = cursor.fetchall()
+
+    old = f'{table}_old'
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+    cursor.execute(f'ALTER TABLE "{old}" RENAME CONSTRAINT "{table}_pkey" TO "{old}_pkey"')
+    for name, _ in foreign_keys:
+        cursor.execute(f'ALTER TABLE "{old}" DROP CONSTRAINT "{name}"')
+
+    partition_by = ' PARTITION BY RANGE (created_at)' if months is not None else ''
+    cursor.execute(
+        f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING IDENTITY)'
+        f'{partition_by}')
+    cursor.execute(
+        f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY ({primary_key})')
+
+    if months is not None:
+        for year, month in months:
+            cursor.execute(
+                f'CREATE TABLE "{table}_y{year}m{month:02d}" PARTITION OF "{table}" '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [month_start(year, month), month_start(*next_month(year, month))])
+        cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+    cursor.execute(f'INSERT INTO "{table}" OVERRIDING SYSTEM VALUE SELECT * FROM "{old}"')
+    cursor.execute(f'DROP TABLE "{old}"')
+
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    sequence = cursor.fetchone()[0]
+    cursor.execute(f'ALTER SEQUENCE {sequence} RENAME TO "{table}_id_seq"')
+    cursor.execute(
+        f'''SELECT setval('"{table}_id_seq"', COALESCE(MAX(id), 0) + 1, false) FROM "{table}"''')
+
+    for definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+
+def covered_months(cursor):
+    ''' Every month from the oldest order to MONTHS_AHEAD months after this one. '''
+    cursor.execute(f'SELECT MIN(created_at) FROM "{ORDERS}"')
+    oldest = cursor.fetchone()[0]
+    now = datetime.now(ZoneInfo(settings.TIME_ZONE))
+    if oldest is None:
+        oldest = now
+    oldest = oldest.astimezone(ZoneInfo(settings.TIME_ZONE))
+
+    year, month = oldest.year, oldest.month
+    last = (now.year, now.month)
+    for _ in range(MONTHS_AHEAD):
+        last = next_month(*last)
+    months = []
+    while (year, month) <= last:
+        months.append((year, month))
+        year, month = next_month(year, month)
+    return months
+
+
+def partition(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{ORDERS}", "{LINES}" IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE "{LINES}" ADD COLUMN created_at timestamp with time zone')
+        cursor.execute(
+            f'UPDATE "{LINES}" op SET created_at = o.created_at '
+            f'FROM "{ORDERS}" o WHERE o.id = op.order_id')
+        # Lines of already deleted orders cannot be placed in a partition.
+        cursor.execute(f'DELETE FROM "{LINES}" WHERE created_at IS NULL')
+        cursor.execute(f'ALTER TABLE "{LINES}" ALTER COLUMN created_at SET NOT NULL')
+        cursor.execute(
+            '''SELECT conname FROM pg_constraint
+               WHERE conrelid = %s::regclass AND confrelid = %s::regclass''', [LINES, ORDERS])
+        for (name,) in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE "{LINES}" DROP CONSTRAINT "{name}"')
+
+        months = covered_months(cursor)
+        rebuild(cursor, ORDERS, 'id, created_at', months)
+        rebuild(cursor, LINES, 'id, created_at', months)
+
+
+def unpartition(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{ORDERS}", "{LINES}" IN ACCESS EXCLUSIVE MODE')
+        rebuild(cursor, ORDERS, 'id')
+        rebuild(cursor, LINES, 'id')
+        cursor.execute(f'ALTER TABLE "{LINES}" DROP COLUMN created_at')
+        cursor.execute(
+            f'ALTER TABLE "{LINES}" ADD CONSTRAINT "{LINES}_order_id_fk_{ORDERS}_id" '
+            f'FOREIGN KEY (order_id) REFERENCES "{ORDERS}" (id) DEFERRABLE INITIALLY DEFERRED')
+
+
+class Migration(migrations.Migration):
+    '''
+    Move orders and their lines into monthly range partitions on created_at.
+
+    The tables are copied under an exclusive lock, so run this in a
+    maintenance window. Primary keys become (id, created_at), as Postgres
+    requires the partition key in every unique constraint; ids stay unique
+    through their sequence.
+    '''
+
+    dependencies = [
+        ('legerity', '0015_orderproduct_snapshots'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='orderproduct',
+                    name='created_at',
+                    field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Created At'),
+                    preserve_default=False,
+                ),
+                migrations.AlterField(
+                    model_name='orderproduct',
+                    name='order',
+                    field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='products', to='legerity.order', verbose_name='Order'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(partition, unpartition),
+            ],
+        ),
+    ]
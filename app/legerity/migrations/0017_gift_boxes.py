@@ -0,0 +1,97 @@
+# Generated by Django 5.0.7 on 2026-10-19 16:55
+
+import re
+from importlib import import_module
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+ORDERS = 'legerity_order'
+GIFT_BOXES = 'legerity_ordergiftbox'
+
+
+def partition(apps, schema_editor):
+    ''' Partition ordered gift boxes by the same months as their orders. '''
+    rebuild = import_module('legerity.migrations.0016_partition_orders').rebuild
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            '''SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+               WHERE i.inhparent = %s::regclass''', [ORDERS])
+        months = sorted(
+            (int(match[1]), int(match[2])) for (name,) in cursor.fetchall()
+            if (match := re.search(r'_y(\d{4})m(\d{2})$', name)))
+        rebuild(cursor, GIFT_BOXES, 'id, created_at', months)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legerity', '0016_partition_orders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GiftBox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Name')),
+                ('price', models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Price')),
+                ('available', models.IntegerField(default=0, editable=False, verbose_name='Available')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CartGiftBox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('cart', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='cart_gift_boxes', to='legerity.cart', verbose_name='Cart')),
+                ('gift_box', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='legerity.giftbox', verbose_name='Gift Box')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GiftBoxItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('gift_box', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='legerity.giftbox', verbose_name='Gift Box')),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='legerity.product', verbose_name='Product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderGiftBox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Name')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Unit Price')),
+                ('created_at', models.DateTimeField(editable=False, verbose_name='Created At')),
+                ('gift_box', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='legerity.giftbox', verbose_name='Gift Box')),
+                ('order', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='giftboxes', to='legerity.order', verbose_name='Order')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='giftbox',
+            index=models.Index(fields=['user', 'name'], name='user_gift_box'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartgiftbox',
+            constraint=models.UniqueConstraint(fields=('cart', 'gift_box'), name='cart_gift_box_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='giftboxitem',
+            constraint=models.UniqueConstraint(fields=('gift_box', 'product'), name='gift_box_product_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='giftboxitem',
+            constraint=models.CheckConstraint(check=models.Q(('quantity__gt', 0)), name='gift_box_item_quantity_positive'),
+        ),
+        migrations.AddIndex(
+            model_name='ordergiftbox',
+            index=models.Index(fields=['order'], name='order_gift_box_index'),
+        ),
+        # Dropping the table on reverse drops its partitions too.
+        migrations.RunPython(partition, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+'''
+Publish product price and stock changes on the ``legerity_products`` channel.
+
+Statement-level triggers with transition tables send one NOTIFY per hundred
+changed rows, so a checkout's bulk stock decrement or a catalog import costs
+a handful of notifications rather than one per row. Postgres delivers them
+on commit only, and drops them when the transaction rolls back.
+'''
+from django.db import migrations
+
+FUNCTION = '''
+CREATE FUNCTION legerity_product_notify() RETURNS trigger AS $$
+DECLARE
+    payload text;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        FOR payload IN
+            SELECT json_agg(json_build_object('id', id, 'deleted', true))::text
+            FROM (SELECT id, (row_number() OVER (ORDER BY id) - 1) / 100 AS page
+                  FROM old_rows) changed
+            GROUP BY page
+        LOOP
+            PERFORM pg_notify('legerity_products', payload);
+        END LOOP;
+    ELSIF TG_OP = 'INSERT' THEN
+        FOR payload IN
+            SELECT json_agg(json_build_object('id', id, 'price', price::text, 'stock', stock))::text
+            FROM (SELECT id, price, stock, (row_number() OVER (ORDER BY id) - 1) / 100 AS page
+                  FROM new_rows) changed
+            GROUP BY page
+        LOOP
+            PERFORM pg_notify('legerity_products', payload);
+        END LOOP;
+    ELSE
+        FOR payload IN
+            SELECT json_agg(json_build_object('id', id, 'price', price::text, 'stock', stock))::text
+            FROM (SELECT n.id, n.price, n.stock, (row_number() OVER (ORDER BY n.id) - 1) / 100 AS page
+                  FROM new_rows n JOIN old_rows o ON o.id = n.id
+                  WHERE n.price IS DISTINCT FROM o.price OR n.stock IS DISTINCT FROM o.stock) changed
+            GROUP BY page
+        LOOP
+            PERFORM pg_notify('legerity_products', payload);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER legerity_product_notify_insert AFTER INSERT ON legerity_product
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION legerity_product_notify();
+CREATE TRIGGER legerity_product_notify_update AFTER UPDATE ON legerity_product
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION legerity_product_notify();
+CREATE TRIGGER legerity_product_notify_delete AFTER DELETE ON legerity_product
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION legerity_product_notify();
+'''
+
+REVERSE = '''
+DROP TRIGGER legerity_product_notify_insert ON legerity_product;
+DROP TRIGGER legerity_product_notify_update ON legerity_product;
+DROP TRIGGER legerity_product_notify_delete ON legerity_product;
+DROP FUNCTION legerity_product_notify();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legerity', '0017_gift_boxes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FUNCTION, REVERSE),
+    ]
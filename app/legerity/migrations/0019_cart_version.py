@@ -0,0 +1,94 @@
+# Generated by Django 5.0.7 on 2026-10-19 17:06
+
+from django.db import migrations, models
+
+# Bump the version of carts whose items or gift boxes were written, once per
+# statement, in the same transaction as the write.
+CART_ROWS = '''
+CREATE FUNCTION legerity_cart_rows_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE legerity_cart SET version = version + 1
+        WHERE id IN (SELECT cart_id FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE legerity_cart SET version = version + 1
+        WHERE id IN (SELECT cart_id FROM old_rows);
+    ELSE
+        UPDATE legerity_cart SET version = version + 1
+        WHERE id IN (SELECT cart_id FROM new_rows UNION SELECT cart_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+''' + ''.join(f'''
+CREATE TRIGGER {table}_cart_{op} AFTER {op.upper()} ON {table}
+    REFERENCING {references}
+    FOR EACH STATEMENT EXECUTE FUNCTION legerity_cart_rows_changed();
+''' for table in ('legerity_cartitem', 'legerity_cartgiftbox') for op, references in (
+    ('insert', 'NEW TABLE AS new_rows'),
+    ('update', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    ('delete', 'OLD TABLE AS old_rows'),
+))
+
+# Bump the carts showing a product or gift box whose displayed columns changed.
+SHOWN_ROWS = '''
+CREATE FUNCTION legerity_cart_product_changed() RETURNS trigger AS $$
+BEGIN
+    UPDATE legerity_cart SET version = version + 1 WHERE id IN (
+        SELECT i.cart_id
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN legerity_cartitem i ON i.product_id = n.id
+        WHERE (n.price, n.image, n.category, n.info_excerpt)
+              IS DISTINCT FROM (o.price, o.image, o.category, o.info_excerpt));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION legerity_cart_gift_box_changed() RETURNS trigger AS $$
+BEGIN
+    UPDATE legerity_cart SET version = version + 1 WHERE id IN (
+        SELECT c.cart_id
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN legerity_cartgiftbox c ON c.gift_box_id = n.id
+        WHERE (n.name, n.price) IS DISTINCT FROM (o.name, o.price));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER legerity_product_cart AFTER UPDATE ON legerity_product
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION legerity_cart_product_changed();
+CREATE TRIGGER legerity_giftbox_cart AFTER UPDATE ON legerity_giftbox
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION legerity_cart_gift_box_changed();
+'''
+
+REVERSE = ''.join(
+    f'DROP TRIGGER {table}_cart_{op} ON {table};\n'
+    for table in ('legerity_cartitem', 'legerity_cartgiftbox')
+    for op in ('insert', 'update', 'delete')
+) + '''
+DROP TRIGGER legerity_product_cart ON legerity_product;
+DROP TRIGGER legerity_giftbox_cart ON legerity_giftbox;
+DROP FUNCTION legerity_cart_rows_changed();
+DROP FUNCTION legerity_cart_product_changed();
+DROP FUNCTION legerity_cart_gift_box_changed();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legerity', '0018_product_change_notify'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='version',
+            field=models.PositiveBigIntegerField(default=1, editable=False, verbose_name='Version'),
+        ),
+        migrations.RunSQL(CART_ROWS + SHOWN_ROWS, REVERSE),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.7 on 2026-10-19 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('legerity', '0019_cart_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrders',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('category', models.CharField(blank=True, choices=[('Mask', 'Mask'), ('Balm', 'Balm'), ('Cream', 'Cream'), ('Oil', 'Oil'), ('Shampoo', 'Shampoo')], max_length=100, verbose_name='Category')),
+                ('orders', models.IntegerField(default=0, verbose_name='Orders')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyorders',
+            constraint=models.UniqueConstraint(fields=('date', 'category'), name='daily_orders_unique'),
+        ),
+    ]
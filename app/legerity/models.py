@@ -4,6 +4,8 @@ from django.core.validators import RegexValidator
 from django.utils.translation import gettext_lazy as _
 from tinymce.models import HTMLField
 
+from helpers.html import derive_html
+
 # Create your models here.
 
 
@@ -23,6 +25,34 @@ class SingletonModel(models.Model):
         return obj
 
 
+class SanitizedHTMLModel(models.Model):
+    ''' Store a sanitized copy and a plain-text excerpt of each HTML field. '''
+    html_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def refresh_derived_html(self):
+        ''' Recompute derived columns, returning the names that changed. '''
+        changed = []
+        for field in self.html_fields:
+            html, excerpt = derive_html(getattr(self, field))
+            for name, value in ((f'{field}_html', html), (f'{field}_excerpt', excerpt)):
+                if getattr(self, name) != value:
+                    setattr(self, name, value)
+                    changed.append(name)
+        return changed
+
+    def save(self, *args, **kwargs):
+        self.refresh_derived_html()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            derived = [f'{field}_{suffix}' for field in self.html_fields
+                       if field in update_fields for suffix in ('html', 'excerpt')]
+            kwargs['update_fields'] = {*update_fields, *derived}
+        return super().save(*args, **kwargs)
+
+
 class About(SingletonModel):
     number_of_personals = models.IntegerField(_('Number of Personals'))
     satisfaction_percent = models.IntegerField(_('Satisfaction Percent'))
@@ -33,10 +63,16 @@ class About(SingletonModel):
         return 'About'
 
 
-class Review(models.Model):
+class Review(SanitizedHTMLModel):
+    html_fields = ('comment',)
+
     fullname = models.CharField(_('Fullname'), max_length=100)
     image = models.ImageField(_('Reviewer Image'), upload_to='reviews')
     comment = HTMLField(_('Comment'))
+    comment_html = models.TextField(
+        _('Comment (sanitized)'), blank=True, editable=False)
+    comment_excerpt = models.CharField(
+        _('Comment Excerpt'), max_length=255, blank=True, editable=False)
 
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
 
@@ -44,7 +80,9 @@ class Review(models.Model):
         return f'Review by {self.fullname}'
 
 
-class Product(models.Model):
+class Product(SanitizedHTMLModel):
+    html_fields = ('info',)
+
     class Category(models.TextChoices):
         mask = 'Mask', _('Mask')
         balm = 'Balm', _('Balm')
@@ -52,15 +90,21 @@ class Product(models.Model):
         oil = 'Oil', _('Oil')
         shampoo = 'Shampoo', _('Shampoo')
 
+    sku = models.CharField(_('SKU'), max_length=64,
+                           unique=True, null=True, blank=True)
     info = HTMLField(_('Info'))
+    info_html = models.TextField(
+        _('Info (sanitized)'), blank=True, editable=False)
+    info_excerpt = models.CharField(
+        _('Info Excerpt'), max_length=255, blank=True, editable=False)
     price = models.DecimalField(
-        _('Price'), max_digits=10, decimal_places=2, db_index=True)
-    stock = models.IntegerField(_('Stock'), db_index=True)
+        _('Price'), max_digits=10, decimal_places=2)
+    stock = models.IntegerField(_('Stock'))
     image = models.ImageField(_('Product Image'), upload_to='products')
     category = models.CharField(
-        _('Category'), max_length=100, choices=Category.choices, db_index=True)
+        _('Category'), max_length=100, choices=Category.choices)
     sales_number = models.IntegerField(
-        _('Sales Number'), db_index=True, default=0)
+        _('Sales Number'), default=0)
 
     class Meta:
         indexes = [
@@ -73,15 +117,20 @@ class Product(models.Model):
     def __str__(self):
         return f'{self.category}: {self.price}'
 
+    @property
+    def display_name(self):
+        return self.display_name_for(self.category)
+
+    @staticmethod
+    def display_name_for(category):
+        return f'Legerity Beauty Hair {category}'
+
 
 class Cart(models.Model):
     user = models.OneToOneField(
-        'customer.User', verbose_name=_('User'), on_delete=models.CASCADE, db_index=True)
-
-    class Meta:
-        indexes = [
-            models.Index(fields=['user'], name='user-cart'),
-        ]
+        'customer.User', verbose_name=_('User'), on_delete=models.CASCADE)
+    # Bumped by database triggers whenever what the cart shows changes.
+    version = models.PositiveBigIntegerField(_('Version'), default=1, editable=False)
 
     def __str__(self):
         return f'{self.user}'
@@ -89,49 +138,85 @@ class Cart(models.Model):
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, verbose_name=_(
-        'Cart'), on_delete=models.CASCADE, db_index=True, related_name='cart_items')
+        'Cart'), on_delete=models.CASCADE, db_index=False, related_name='cart_items')
     product = models.ForeignKey(Product, verbose_name=_(
         'Product'), on_delete=models.SET_NULL, null=True)
     quantity = models.IntegerField(_('Quantity'))
 
     class Meta:
         indexes = [
-            models.Index(fields=['cart'], name='cart'),
+            models.Index(fields=['cart', 'product'], name='cart_product'),
         ]
 
     def __str__(self):
         return f'{self.cart}: {self.product}-{self.quantity}'
 
 
-# class GiftBox(models.Model):
-#     user = models.ForeignKey('customer.User', verbose_name=_(
-#         'User'), on_delete=models.CASCADE, db_index=True)
-#     name = models.CharField(_('Name'), max_length=100, db_index=True)
+class GiftBox(models.Model):
+    '''
+    A bundle of products ordered as one item.
 
-#     class Meta:
-#         indexes = [
-#             models.Index(fields=['user'], name='user-gift-box'),
-#             models.Index(fields=['user', 'name'], name='user&name')
-#         ]
+    Price and availability are kept up to date from the component products
+    by ``legerity.bundles.refresh_bundles``, so reads never resolve items.
+    '''
+    user = models.ForeignKey('customer.User', verbose_name=_(
+        'User'), on_delete=models.CASCADE, db_index=False)
+    name = models.CharField(_('Name'), max_length=100)
+    # Sum of the component prices, and how many boxes the current stock can fill.
+    price = models.DecimalField(
+        _('Price'), max_digits=10, decimal_places=2, default=0, editable=False)
+    available = models.IntegerField(_('Available'), default=0, editable=False)
 
-#     def __str__(self):
-#         return f'{self.user}: {self.name}'
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name'], name='user_gift_box'),
+        ]
 
+    def __str__(self):
+        return f'{self.user}: {self.name}'
 
-# class GiftBoxItem(models.Model):
-#     gift_box = models.ForeignKey(GiftBox, verbose_name=_(
-#         'Gift Box'), on_delete=models.CASCADE, db_index=True)
-#     product = models.ForeignKey(Product, verbose_name=_('Product'),
-#                                 on_delete=models.SET_NULL, null=True)
-#     quantity = models.IntegerField(_('Quantity'))
 
-#     class Meta:
-#         indexes = [
-#             models.Index(fields=['gift_box'], name='gift_box'),
-#         ]
+class GiftBoxItem(models.Model):
+    gift_box = models.ForeignKey(GiftBox, verbose_name=_(
+        'Gift Box'), on_delete=models.CASCADE, db_index=False, related_name='items')
+    product = models.ForeignKey(Product, verbose_name=_('Product'),
+                                on_delete=models.SET_NULL, null=True)
+    quantity = models.IntegerField(_('Quantity'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['gift_box', 'product'], name='gift_box_product_unique'),
+            models.CheckConstraint(
+                check=models.Q(quantity__gt=0), name='gift_box_item_quantity_positive'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The box it was loaded from, so moving the item refreshes both boxes.
+        instance.loaded_gift_box_id = instance.__dict__.get('gift_box_id')
+        return instance
+
+    def __str__(self):
+        return f'{self.gift_box} - {self.product}'
+
+
+class CartGiftBox(models.Model):
+    cart = models.ForeignKey(Cart, verbose_name=_(
+        'Cart'), on_delete=models.CASCADE, db_index=False, related_name='cart_gift_boxes')
+    gift_box = models.ForeignKey(GiftBox, verbose_name=_(
+        'Gift Box'), on_delete=models.CASCADE, related_name='+')
+    quantity = models.IntegerField(_('Quantity'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cart', 'gift_box'], name='cart_gift_box_unique'),
+        ]
 
-#     def __str__(self):
-#         return f'{self.gift_box} - {self.product}'
+    def __str__(self):
+        return f'{self.cart}: {self.gift_box}-{self.quantity}'
 
 
 class Order(models.Model):
@@ -144,7 +229,7 @@ class Order(models.Model):
         regex=r'^(\+[0-9]{1,3})?[0-9]{9,15}$', message="Phone number must be entered in the format: '+999999999'. Up to 15 digits allowed.")
 
     user = models.ForeignKey('customer.User', verbose_name=_(
-        'User'), on_delete=models.CASCADE)
+        'User'), on_delete=models.CASCADE, db_index=False)
     total_price = models.DecimalField(
         _('Total Price'), max_digits=10, decimal_places=2)
     status = models.CharField(_('Status'),
@@ -157,9 +242,10 @@ class Order(models.Model):
 
     class Meta:
         indexes = [
-            models.Index(fields=['user'], name='user_index'),
+            models.Index(fields=['user', '-created_at'], name='user_history'),
             models.Index(fields=['phone_number'], name='phone_index'),
-            models.Index(fields=['status'], name='status_index')
+            models.Index(fields=['status'], name='status_index'),
+            models.Index(fields=['created_at'], name='created_at_index'),
         ]
 
     def __str__(self):
@@ -167,25 +253,111 @@ class Order(models.Model):
 
 
 class OrderProduct(models.Model):
+    # Orders and lines are partitioned by month of created_at (see
+    # legerity/partitions.py), so the database cannot enforce this key.
     order = models.ForeignKey(
-        Order, verbose_name=_('Order'), related_name='products', on_delete=models.CASCADE)
+        Order, verbose_name=_('Order'), related_name='products', on_delete=models.CASCADE,
+        db_index=False, db_constraint=False)
     product = models.ForeignKey(Product, verbose_name=_(
         'Product'), on_delete=models.SET_NULL, null=True)
     quantity = models.IntegerField(_('Quantity'))
 
+    # Copied from the product at checkout so order reads never join the catalog.
+    name = models.CharField(_('Name'), max_length=255, blank=True, default='')
+    category = models.CharField(
+        _('Category'), max_length=100, choices=Product.Category.choices, blank=True, default='')
+    unit_price = models.DecimalField(
+        _('Unit Price'), max_digits=10, decimal_places=2, null=True, blank=True)
+    # Always the order's created_at, which keeps lines in their order's partition.
+    created_at = models.DateTimeField(_('Created At'), editable=False)
+
     class Meta:
         indexes = [
             models.Index(fields=['order'], name='order_index')
         ]
 
     def __str__(self):
-        return f'{self.order} - {self.product}'
+        return f'{self.order} - {self.name or self.product_id}'
+
+    def save(self, *args, **kwargs):
+        if self.created_at is None:
+            self.created_at = self.order.created_at
+        super().save(*args, **kwargs)
+
+    @property
+    def subtotal_price(self):
+        if self.unit_price is None:
+            return None
+        return self.unit_price * self.quantity
 
 
-# class OrderGiftBox(models.Model):
-#     order = models.ForeignKey(
-#         Order, related_name='giftboxes', on_delete=models.CASCADE)
-#     gift_box = models.ForeignKey(GiftBox, on_delete=models.SET_NULL, null=True)
+class OrderGiftBox(models.Model):
+    ''' A gift box as ordered; its products are expanded into the order's lines. '''
+    # Partitioned with the order tables, like OrderProduct.
+    order = models.ForeignKey(
+        Order, verbose_name=_('Order'), related_name='giftboxes', on_delete=models.CASCADE,
+        db_index=False, db_constraint=False)
+    gift_box = models.ForeignKey(GiftBox, verbose_name=_('Gift Box'),
+                                 on_delete=models.SET_NULL, null=True)
+    name = models.CharField(_('Name'), max_length=100)
+    quantity = models.IntegerField(_('Quantity'))
+    unit_price = models.DecimalField(_('Unit Price'), max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(_('Created At'), editable=False)
 
-#     def __str__(self):
-#         return f'{self.order} - {self.gift_box}'
+    class Meta:
+        indexes = [
+            models.Index(fields=['order'], name='order_gift_box_index')
+        ]
+
+    def __str__(self):
+        return f'{self.order} - {self.name}'
+
+    def save(self, *args, **kwargs):
+        if self.created_at is None:
+            self.created_at = self.order.created_at
+        super().save(*args, **kwargs)
+
+    @property
+    def subtotal_price(self):
+        return self.unit_price * self.quantity
+
+
+class DailySales(models.Model):
+    ''' Per day, category and product sales totals maintained from new orders. '''
+    date = models.DateField(_('Date'))
+    category = models.CharField(
+        _('Category'), max_length=100, choices=Product.Category.choices)
+    product = models.ForeignKey(Product, verbose_name=_('Product'), related_name='+',
+                                on_delete=models.DO_NOTHING, db_constraint=False)
+    units = models.IntegerField(_('Units'), default=0)
+    revenue = models.DecimalField(
+        _('Revenue'), max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField(_('Orders'), default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'category', 'product'], name='daily_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.category} #{self.product_id}: {self.units}'
+
+
+class DailyOrders(models.Model):
+    '''
+    Per day and category count of distinct orders; the row with a blank
+    category counts every order of the day.
+    '''
+    date = models.DateField(_('Date'))
+    category = models.CharField(
+        _('Category'), max_length=100, blank=True, choices=Product.Category.choices)
+    orders = models.IntegerField(_('Orders'), default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='daily_orders_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.category or "all"}: {self.orders}'
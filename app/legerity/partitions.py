@@ -0,0 +1,102 @@
+'''
+Monthly range partitions of the order tables.
+
+Orders, their lines and their gift boxes are partitioned on created_at by
+local calendar month, in partitions named ``<table>_y<YYYY>m<MM>``; rows
+outside every month land in ``<table>_default``. Lines and gift boxes carry
+their order's created_at, so an order and its rows always share the same
+month.
+'''
+import re
+from datetime import datetime
+
+from django.db import connection
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
+
+from legerity.models import Order, OrderGiftBox, OrderProduct
+
+TABLES = (Order._meta.db_table, OrderProduct._meta.db_table, OrderGiftBox._meta.db_table)
+NAME_RE = re.compile(r'_y(\d{4})m(\d{2})$')
+
+
+def prefetch_order_rows(orders, *lookups):
+    '''
+    Prefetch ``lookups`` (``products``, ``giftboxes``) of ``orders``.
+
+    The rows are bounded by the orders' created_at, so only the partitions of
+    those months are read instead of probing every month by order_id.
+    '''
+    if not orders:
+        return
+    bounds = (min(order.created_at for order in orders),
+              max(order.created_at for order in orders))
+    prefetch_related_objects(orders, *(
+        Prefetch(lookup, queryset=Order._meta.get_field(lookup).related_model.objects
+                 .filter(created_at__range=bounds).order_by('id'))
+        for lookup in lookups
+    ))
+
+
+def month_start(year, month):
+    return timezone.make_aware(datetime(year, month, 1))
+
+
+def add_months(year, month, count):
+    index = year * 12 + month - 1 + count
+    return index // 12, index % 12 + 1
+
+
+def partition_name(table, year, month):
+    return f'{table}_y{year}m{month:02d}'
+
+
+def list_partitions(table):
+    ''' Return ``{(year, month): name}`` for the monthly partitions of ``table``. '''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            '''SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+               WHERE i.inhparent = %s::regclass''', [table])
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = NAME_RE.search(name)
+        if match:
+            partitions[int(match[1]), int(match[2])] = name
+    return partitions
+
+
+def create_partition(table, year, month):
+    '''
+    Create the partition of ``table`` for one month.
+
+    Postgres checks the default partition for rows in the new range, so
+    create months ahead of time while the default partition is empty.
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{partition_name(table, year, month)}" '
+            f'PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)',
+            [month_start(year, month), month_start(*add_months(year, month, 1))])
+
+
+def detach_partition(table, name, archive_schema=None, drop=False):
+    ''' Detach a partition, then move it to ``archive_schema`` or drop it. '''
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+        if drop:
+            cursor.execute(f'DROP TABLE "{name}"')
+        elif archive_schema:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"')
+            cursor.execute(f'ALTER TABLE "{name}" SET SCHEMA "{archive_schema}"')
+
+
+def missing_partitions(ahead):
+    ''' Yield ``(table, (year, month))`` for months up to ``ahead`` from now without a partition. '''
+    today = timezone.localdate()
+    for table in TABLES:
+        existing = list_partitions(table)
+        for offset in range(ahead + 1):
+            month = add_months(today.year, today.month, offset)
+            if month not in existing:
+                yield table, month
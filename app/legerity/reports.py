@@ -0,0 +1,167 @@
+'''
+Incrementally maintained sales rollups and the queries that read them.
+'''
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from helpers.dates import local_day_range
+from helpers.models import Job
+from legerity.models import DailyOrders, DailySales, Order, OrderProduct
+
+UPSERT_SQL = '''
+    INSERT INTO {table} (date, category, product_id, units, revenue, orders)
+    VALUES {values}
+    ON CONFLICT (date, category, product_id) DO UPDATE SET
+        units = {table}.units + EXCLUDED.units,
+        revenue = {table}.revenue + EXCLUDED.revenue,
+        orders = {table}.orders + EXCLUDED.orders
+'''
+
+REBUILD_SQL = '''
+    INSERT INTO {rollups} (date, category, product_id, units, revenue, orders)
+    SELECT (o.created_at AT TIME ZONE %s)::date, op.category, op.product_id,
+           SUM(op.quantity), SUM(op.quantity * op.unit_price), COUNT(DISTINCT o.id)
+    FROM {lines} op
+    JOIN {orders} o ON o.id = op.order_id AND o.created_at = op.created_at
+    WHERE op.created_at >= %s AND op.created_at < %s
+      AND op.product_id IS NOT NULL AND op.unit_price IS NOT NULL
+      AND {not_pending}
+    GROUP BY 1, 2, 3
+    ON CONFLICT (date, category, product_id) DO UPDATE SET
+        units = EXCLUDED.units,
+        revenue = EXCLUDED.revenue,
+        orders = EXCLUDED.orders
+'''
+
+ORDERS_UPSERT_SQL = '''
+    INSERT INTO {table} (date, category, orders)
+    VALUES {values}
+    ON CONFLICT (date, category) DO UPDATE SET
+        orders = {table}.orders + EXCLUDED.orders
+'''
+
+# Distinct orders per day and category, plus a blank-category row per day.
+ORDERS_REBUILD_SQL = '''
+    INSERT INTO {rollups} (date, category, orders)
+    SELECT day, CASE WHEN GROUPING(category) = 1 THEN '' ELSE category END,
+           COUNT(DISTINCT order_id)
+    FROM (
+        SELECT (o.created_at AT TIME ZONE %s)::date AS day, op.category, o.id AS order_id
+        FROM {lines} op
+        JOIN {orders} o ON o.id = op.order_id AND o.created_at = op.created_at
+        WHERE op.created_at >= %s AND op.created_at < %s
+          AND op.product_id IS NOT NULL AND op.unit_price IS NOT NULL
+          AND {not_pending}
+    ) sold
+    GROUP BY GROUPING SETS ((day, category), (day))
+    ON CONFLICT (date, category) DO UPDATE SET
+        orders = EXCLUDED.orders
+'''
+
+# Orders whose order_placed job has yet to commit add themselves to the rollups.
+NOT_PENDING_SQL = '''NOT EXISTS (
+    SELECT 1 FROM {jobs} j
+    WHERE j.name = 'legerity.order_placed' AND j.status IN (%s, %s)
+      AND (j.payload ->> 'order_id')::bigint = o.id)'''
+
+GROUPINGS = {
+    'day': ('date',),
+    'category': ('category',),
+    'product': ('product_id', 'category'),
+}
+
+
+def record_order_sales(order, lines):
+    ''' Add the lines of a newly placed order to the daily rollups. '''
+    day = timezone.localdate(order.created_at)
+    totals = defaultdict(lambda: [0, 0])
+    for line in lines:
+        if line.product_id is None or line.unit_price is None:
+            continue
+        key = (line.category, line.product_id)
+        totals[key][0] += line.quantity
+        totals[key][1] += line.subtotal_price
+
+    if not totals:
+        return
+
+    values, params = [], []
+    for (category, product_id), (units, revenue) in totals.items():
+        values.append('(%s, %s, %s, %s, %s, 1)')
+        params.extend([day, category, product_id, units, revenue])
+
+    categories = [''] + sorted({category for category, _ in totals})
+    orders_sql = ORDERS_UPSERT_SQL.format(
+        table=DailyOrders._meta.db_table, values=', '.join(['(%s, %s, 1)'] * len(categories)))
+    orders_params = [value for category in categories for value in (day, category)]
+
+    sql = UPSERT_SQL.format(
+        table=DailySales._meta.db_table, values=', '.join(values))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        cursor.execute(orders_sql, orders_params)
+
+
+def rebuild_sales(start, end):
+    '''
+    Recompute the rollups for the local dates ``start`` to ``end`` inclusive.
+
+    Orders are counted here or by their ``legerity.order_placed`` job, never
+    both: the table lock waits for jobs that already wrote rollups to commit
+    (removing their job row) and holds off the rest, which are skipped here
+    because their job is still queued or running.
+    '''
+    since, until = local_day_range(start, end)
+    tables = {
+        'lines': OrderProduct._meta.db_table,
+        'orders': Order._meta.db_table,
+        'not_pending': NOT_PENDING_SQL.format(jobs=Job._meta.db_table),
+    }
+    sql = REBUILD_SQL.format(rollups=DailySales._meta.db_table, **tables)
+    orders_sql = ORDERS_REBUILD_SQL.format(rollups=DailyOrders._meta.db_table, **tables)
+    params = [settings.TIME_ZONE, since, until, Job.Status.queued, Job.Status.running]
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'LOCK TABLE {DailySales._meta.db_table} IN SHARE ROW EXCLUSIVE MODE')
+            DailySales.objects.filter(date__range=(start, end)).delete()
+            DailyOrders.objects.filter(date__range=(start, end)).delete()
+            cursor.execute(sql, params)
+            cursor.execute(orders_sql, params)
+
+
+def sales_report(start, end, group_by='day'):
+    '''
+    Return rollup totals between two dates, grouped by day, category or product.
+
+    ``orders`` counts distinct orders: per product from the sales rollups, per
+    day or category from ``DailyOrders``, so an order with several products
+    is counted once.
+    '''
+    fields = GROUPINGS[group_by]
+    sales = (
+        DailySales.objects.using(settings.REPORTS_DATABASE)
+        .filter(date__range=(start, end))
+        .values(*fields)
+        .order_by(*fields)
+    )
+    if group_by == 'product':
+        return list(sales.annotate(
+            units=Sum('units'), revenue=Sum('revenue'), orders=Sum('orders')))
+
+    field, = fields
+    orders = DailyOrders.objects.using(settings.REPORTS_DATABASE).filter(date__range=(start, end))
+    if group_by == 'day':
+        orders = orders.filter(category='')
+    else:
+        orders = orders.exclude(category='')
+    counts = dict(orders.values(field).annotate(total=Sum('orders')).values_list(field, 'total'))
+
+    rows = list(sales.annotate(units=Sum('units'), revenue=Sum('revenue')))
+    for row in rows:
+        row['orders'] = counts.get(row[field], 0)
+    return rows
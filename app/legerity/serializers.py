@@ -1,6 +1,14 @@
+from collections import Counter
+
 from rest_framework import serializers
 from django.core.validators import RegexValidator
-from legerity.models import About, Product, Review, CartItem, Cart, Order, OrderProduct
+from django.db import transaction
+from legerity.models import About, Product, Review, CartItem, Cart, CartGiftBox, GiftBox, GiftBoxItem, Order, OrderGiftBox, OrderProduct
+from legerity.bundles import refresh_bundles
+from legerity.exports import CONTENT_TYPES
+from legerity.reports import GROUPINGS
+from helpers import fast_serializers as fast
+from helpers.jobs import enqueue
 from customer.models import User
 
 phone_number_validator = RegexValidator(
@@ -19,13 +27,18 @@ class AboutListSerializer(serializers.ModelSerializer):
                   'number_of_personals', 'satisfaction_percent']
 
     def get_number_of_customers(self, obj):
+        if hasattr(obj, 'customer_count'):
+            return obj.customer_count
         return User.objects.filter(is_staff=False).count()
 
     def get_number_of_products(self, obj):
+        if hasattr(obj, 'product_count'):
+            return obj.product_count
         return Product.objects.count()
 
 
 class ReviewListSerializer(serializers.ModelSerializer):
+    comment = serializers.CharField(source='comment_excerpt', read_only=True)
 
     class Meta:
         model = Review
@@ -34,13 +47,40 @@ class ReviewListSerializer(serializers.ModelSerializer):
 
 class ProductListSerializer(serializers.ModelSerializer):
     name = serializers.SerializerMethodField()
+    info = serializers.CharField(source='info_excerpt', read_only=True)
 
     class Meta:
         model = Product
         fields = ['id', 'name', 'info', 'price', 'image']
 
     def get_name(self, obj):
-        return f'Legerity Beauty Hair {obj.category}'
+        return obj.display_name
+
+
+class ProductListFastSerializer(fast.FastSerializer):
+    ''' ProductListSerializer output for read-only lists. '''
+    name = fast.Computed(Product.display_name_for, 'category')
+    info = fast.Column('info_excerpt')
+
+    class Meta:
+        model = Product
+        fields = ProductListSerializer.Meta.fields
+
+
+class ReviewListFastSerializer(fast.FastSerializer):
+    ''' ReviewListSerializer output for read-only lists. '''
+    comment = fast.Column('comment_excerpt')
+
+    class Meta:
+        model = Review
+        fields = ReviewListSerializer.Meta.fields
+
+
+class ProductDetailSerializer(ProductListSerializer):
+    info = serializers.CharField(source='info_html', read_only=True)
+
+    class Meta(ProductListSerializer.Meta):
+        fields = ['id', 'name', 'info', 'price', 'stock', 'category', 'image']
 
 
 class CartItemCreateSerializer(serializers.ModelSerializer):
@@ -83,37 +123,90 @@ class CartItemListSerializer(serializers.ModelSerializer):
         return obj.product.price * obj.quantity
 
 
+def subtotal(price, quantity):
+    return None if price is None else price * quantity
+
+
+class CartItemListFastSerializer(fast.FastSerializer):
+    ''' CartItemListSerializer output for read-only lists. '''
+    product = fast.Nested(ProductListFastSerializer)
+    subtotal_price = fast.Computed(subtotal, 'product__price', 'quantity')
+
+    class Meta:
+        model = CartItem
+        fields = CartItemListSerializer.Meta.fields
+
+
+class CartGiftBoxCreateSerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CartGiftBoxSerializer(serializers.ModelSerializer):
+    gift_box_id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(source='gift_box.name', read_only=True)
+    unit_price = serializers.DecimalField(
+        source='gift_box.price', max_digits=10, decimal_places=2, read_only=True)
+    subtotal_price = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CartGiftBox
+        fields = ['gift_box_id', 'name', 'unit_price', 'quantity', 'subtotal_price']
+
+    def get_subtotal_price(self, obj):
+        return obj.gift_box.price * obj.quantity
+
+
 class CartListSerializer(serializers.ModelSerializer):
     cart_items = CartItemListSerializer(many=True, read_only=True)
+    gift_boxes = CartGiftBoxSerializer(source='cart_gift_boxes', many=True, read_only=True)
     total_price = serializers.SerializerMethodField()
 
     class Meta:
         model = Cart
-        fields = ['cart_items', 'total_price']
+        fields = ['cart_items', 'gift_boxes', 'total_price']
 
     def get_total_price(self, obj):
         total_price = sum(item.product.price *
                           item.quantity for item in obj.cart_items.all())
+        total_price += sum(box.gift_box.price *
+                           box.quantity for box in obj.cart_gift_boxes.all())
         return total_price
 
 
-# class GiftBoxItemSerializer(serializers.ModelSerializer):
-#     gift_box = serializers.PrimaryKeyRelatedField(
-#         queryset=GiftBox.objects.all(), write_only=True
-#     )
+class GiftBoxItemSerializer(serializers.ModelSerializer):
+    gift_box = serializers.PrimaryKeyRelatedField(
+        queryset=GiftBox.objects.all(), write_only=True
+    )
+    name = serializers.CharField(source='product.display_name', read_only=True, default=None)
+    unit_price = serializers.DecimalField(
+        source='product.price', max_digits=10, decimal_places=2, read_only=True, default=None)
 
-#     class Meta:
-#         model = GiftBoxItem
-#         fields = ['id', 'product', 'gift_box', 'quantity']
+    class Meta:
+        model = GiftBoxItem
+        fields = ['id', 'product', 'gift_box', 'name', 'unit_price', 'quantity']
 
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is not None:
+            # pk rather than the user: schema generation runs with AnonymousUser.
+            fields['gift_box'].queryset = GiftBox.objects.filter(user_id=request.user.pk)
+        return fields
 
-# class GiftBoxSerializer(serializers.ModelSerializer):
-#     items = GiftBoxItemSerializer(
-#         many=True, source='giftboxitem_set', read_only=True)
+    def validate_quantity(self, value):
+        if value < 1:
+            raise serializers.ValidationError('Quantity must be at least 1.')
+
+        return value
 
-#     class Meta:
-#         model = GiftBox
-#         fields = ['id', 'name', 'items']
+
+class GiftBoxSerializer(serializers.ModelSerializer):
+    items = GiftBoxItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = GiftBox
+        fields = ['id', 'name', 'price', 'available', 'items']
+        read_only_fields = ['price', 'available']
 
 
 class OrderProductSerializer(serializers.ModelSerializer):
@@ -122,6 +215,42 @@ class OrderProductSerializer(serializers.ModelSerializer):
         fields = ['product', 'quantity']
 
 
+class OrderLineSerializer(serializers.ModelSerializer):
+    product_id = serializers.IntegerField(read_only=True)
+    subtotal_price = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = OrderProduct
+        fields = ['product_id', 'name', 'category', 'unit_price', 'quantity', 'subtotal_price']
+
+
+class OrderGiftBoxSerializer(serializers.ModelSerializer):
+    gift_box_id = serializers.IntegerField(read_only=True)
+    subtotal_price = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = OrderGiftBox
+        fields = ['gift_box_id', 'name', 'unit_price', 'quantity', 'subtotal_price']
+
+
+class OrderListSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ['id', 'status', 'total_price', 'created_at']
+
+
+class OrderDetailSerializer(serializers.ModelSerializer):
+    lines = OrderLineSerializer(source='products', many=True, read_only=True)
+    gift_boxes = OrderGiftBoxSerializer(source='giftboxes', many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'status', 'total_price', 'address', 'zip_code',
+                  'phone_number', 'created_at', 'lines', 'gift_boxes']
+
+
 class OrderCreateSerializer(serializers.Serializer):
     # fullname = serializers.CharField(required=False)
     # email = serializers.EmailField(required=False)
@@ -133,7 +262,7 @@ class OrderCreateSerializer(serializers.Serializer):
         user = self.context['request'].user
         cart = getattr(user, 'cart', None)
 
-        if not cart or not cart.cart_items.exists():
+        if not cart or not (cart.cart_items.exists() or cart.cart_gift_boxes.exists()):
             raise serializers.ValidationError("Your cart is empty.")
 
         return attrs
@@ -148,27 +277,141 @@ class OrderCreateSerializer(serializers.Serializer):
         zip_code = validated_data['zip_code']
         phone_number = validated_data['phone_number']
 
-        total_price = sum([
-            item.product.price * item.quantity
-            for item in cart.cart_items.all()
-        ])
-
-        order = Order.objects.create(
-            user=user,
-            total_price=total_price,
-            address=address,
-            zip_code=zip_code,
-            phone_number=phone_number,
-        )
-
-        for item in cart.cart_items.all():
-            OrderProduct.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
+        with transaction.atomic():
+            items = list(cart.cart_items.all())
+            boxes = list(cart.cart_gift_boxes.select_related('gift_box')
+                         .prefetch_related('gift_box__items').order_by('id'))
+
+            # Boxes are expanded into the products they contain, so stock is
+            # checked and taken per product whichever way it was ordered.
+            demand = Counter()
+            for item in items:
+                demand[item.product_id] += item.quantity
+            for box in boxes:
+                components = box.gift_box.items.all()
+                if not components or any(component.product_id is None for component in components):
+                    raise serializers.ValidationError(
+                        {'gift_boxes': [f'Gift box {box.gift_box_id} is not available.']})
+                for component in components:
+                    demand[component.product_id] += component.quantity * box.quantity
+
+            # Lock the products, in id order so concurrent checkouts cannot
+            # deadlock, and check and take stock against committed values.
+            products = {product.id: product for product in (
+                Product.objects.select_for_update()
+                .filter(id__in=demand)
+                .only('id', 'price', 'stock', 'category').order_by('id'))}
+
+            # Deleted products leave cart items without one (SET_NULL).
+            if any(product_id not in products for product_id in demand):
+                raise serializers.ValidationError(
+                    {'products': ['Your cart contains products that are no longer available.']})
+
+            short = [product_id for product_id, quantity in demand.items()
+                     if quantity > products[product_id].stock]
+            if short:
+                raise serializers.ValidationError(
+                    {'products': [f'Not enough stock for product {product_id}.'
+                                  for product_id in short]})
+
+            total_price = sum(
+                products[product_id].price * quantity for product_id, quantity in demand.items())
+
+            order = Order.objects.create(
+                user=user,
+                total_price=total_price,
+                address=address,
+                zip_code=zip_code,
+                phone_number=phone_number,
             )
 
-        # Clear cart
-        cart.cart_items.all().delete()
+            lines = [(item.product_id, item.quantity) for item in items]
+            ordered_boxes = []
+            for box in boxes:
+                components = box.gift_box.items.all()
+                lines.extend((component.product_id, component.quantity * box.quantity)
+                             for component in components)
+                ordered_boxes.append(OrderGiftBox(
+                    order=order,
+                    gift_box=box.gift_box,
+                    name=box.gift_box.name,
+                    quantity=box.quantity,
+                    unit_price=sum(products[component.product_id].price * component.quantity
+                                   for component in components),
+                    created_at=order.created_at,
+                ))
+
+            OrderProduct.objects.bulk_create([
+                OrderProduct(
+                    order=order,
+                    product=products[product_id],
+                    quantity=quantity,
+                    name=products[product_id].display_name,
+                    category=products[product_id].category,
+                    unit_price=products[product_id].price,
+                    created_at=order.created_at,
+                ) for product_id, quantity in lines])
+            OrderGiftBox.objects.bulk_create(ordered_boxes)
+            for product_id, quantity in demand.items():
+                products[product_id].stock -= quantity
+            Product.objects.bulk_update(products.values(), ['stock'])
+            refresh_bundles(product_ids=list(products))
+
+            # Counters and rollups are updated by a worker once the order commits.
+            enqueue('legerity.order_placed', {
+                'order_id': order.id, 'created_at': order.created_at.isoformat()})
+
+            # Clear cart
+            cart.cart_items.all().delete()
+            if boxes:
+                cart.cart_gift_boxes.all().delete()
 
         return order
+
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    group_by = serializers.ChoiceField(
+        choices=list(GROUPINGS), default='day')
+
+    def validate(self, attrs):
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError('start must not be after end.')
+
+        return attrs
+
+
+class OrderExportQuerySerializer(serializers.Serializer):
+    status = serializers.ChoiceField(
+        choices=Order.OrderStatus.choices, required=False)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    output = serializers.ChoiceField(choices=list(CONTENT_TYPES), default='csv')
+
+    def validate(self, attrs):
+        if 'start' in attrs and 'end' in attrs and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError('start must not be after end.')
+
+        return attrs
+
+
+class StorefrontQuerySerializer(serializers.Serializer):
+    about = serializers.IntegerField(min_value=0, max_value=1, default=1)
+    reviews = serializers.IntegerField(min_value=0, max_value=50, default=10)
+    products = serializers.IntegerField(min_value=0, max_value=50, default=12)
+
+
+class StorefrontSerializer(serializers.Serializer):
+    about = AboutListSerializer(many=True, required=False)
+    reviews = ReviewListSerializer(many=True, required=False)
+    products = ProductListSerializer(many=True, required=False)
+
+
+class SalesReportRowSerializer(serializers.Serializer):
+    date = serializers.DateField(required=False)
+    category = serializers.CharField(required=False)
+    product_id = serializers.IntegerField(required=False)
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    orders = serializers.IntegerField()
@@ -0,0 +1,51 @@
+'''
+Invalidate cached storefront fragments and product snapshots, and refresh
+gift box totals, when the rows behind them change.
+
+Cache invalidation waits for the commit; otherwise another request could
+cache the old rows again under the new version. Gift box totals are columns,
+so they are updated in the same transaction.
+'''
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from customer.models import User
+from legerity import snapshots
+from legerity.bundles import refresh_bundles, refresh_orphaned
+from legerity.models import About, GiftBoxItem, Product, Review
+from legerity.storefront import bump
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, signal, **kwargs):
+    if signal is post_save:
+        refresh_bundles(product_ids=[instance.id])
+    else:
+        refresh_orphaned()
+    transaction.on_commit(lambda: bump('products', 'about'))
+    transaction.on_commit(snapshots.invalidate)
+
+
+@receiver([post_save, post_delete], sender=GiftBoxItem)
+def gift_box_item_changed(sender, instance, **kwargs):
+    gift_box_ids = {instance.gift_box_id, getattr(instance, 'loaded_gift_box_id', None)}
+    refresh_bundles(gift_box_ids=[pk for pk in gift_box_ids if pk is not None])
+    instance.loaded_gift_box_id = instance.gift_box_id
+
+
+@receiver([post_save, post_delete], sender=Review)
+def review_changed(sender, **kwargs):
+    transaction.on_commit(lambda: bump('reviews'))
+
+
+@receiver([post_save, post_delete], sender=About)
+def about_changed(sender, **kwargs):
+    transaction.on_commit(lambda: bump('about'))
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, update_fields=None, **kwargs):
+    # Logins save last_login only and do not change the customer count.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        transaction.on_commit(lambda: bump('about'))
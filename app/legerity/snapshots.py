@@ -0,0 +1,94 @@
+'''
+Per-worker cache of compact product snapshots for cart validation.
+
+Snapshots are dropped whenever the shared version counter moves; it is
+bumped after Product saves, deletes and catalog imports. Workers read the
+counter at most every PRODUCT_SNAPSHOT_VERSION_CHECK seconds, so another
+worker's change can be missed for that long. Checkouts do not bump it, or
+every order would empty every worker's cache: stock taken by orders shows
+up once a snapshot is PRODUCT_SNAPSHOT_TTL seconds old. Checkout locks and
+re-reads the rows, so a stale snapshot can reject or admit a cart change
+but never an order.
+'''
+import os
+import threading
+import time
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from helpers.lru import LRUCache
+from legerity.models import Product
+
+VERSION_KEY = 'legerity:product-snapshots:version'
+# Read directly: the snapshots are already this worker's copy.
+SHARED_CACHE = 'shared'
+
+
+class ProductSnapshot(NamedTuple):
+    id: int
+    price: Decimal
+    stock: int
+    category: str
+
+
+snapshots = LRUCache(max_bytes=settings.PRODUCT_SNAPSHOT_CACHE_BYTES)
+_lock = threading.Lock()
+_state = {'version': None, 'checked': float('-inf')}
+
+
+def sync_version():
+    ''' Clear the local snapshots if the shared version moved since the last check. '''
+    now = time.monotonic()
+    if now - _state['checked'] < settings.PRODUCT_SNAPSHOT_VERSION_CHECK:
+        return
+    with _lock:
+        if now - _state['checked'] < settings.PRODUCT_SNAPSHOT_VERSION_CHECK:
+            return
+        cache = caches[SHARED_CACHE]
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # First use or evicted: a fresh token clears every worker.
+            version = time.time_ns()
+            cache.add(VERSION_KEY, version, timeout=None)
+            version = cache.get(VERSION_KEY, version)
+        if version != _state['version']:
+            snapshots.clear()
+            _state['version'] = version
+        _state['checked'] = now
+
+
+def invalidate():
+    ''' Drop every worker's snapshots; call after Product changes commit. '''
+    version = time.time_ns()
+    caches[SHARED_CACHE].set(VERSION_KEY, version, timeout=None)
+    with _lock:
+        snapshots.clear()
+        _state.update(version=version, checked=time.monotonic())
+
+
+def get_snapshot(product_id):
+    ''' Return the ProductSnapshot for ``product_id`` or None if there is no such product. '''
+    try:
+        product_id = int(product_id)
+    except (TypeError, ValueError):
+        return None
+
+    sync_version()
+    now = time.monotonic()
+    entry = snapshots.get(product_id)
+    if entry is not None and entry[1] > now:
+        return entry[0]
+    row = (Product.objects.filter(id=product_id)
+           .values_list('id', 'price', 'stock', 'category').first())
+    if row is None:
+        return None
+    snapshot = ProductSnapshot(*row)
+    snapshots.set(product_id, (snapshot, now + settings.PRODUCT_SNAPSHOT_TTL))
+    return snapshot
+
+
+def stats():
+    return {'pid': os.getpid(), 'version': _state['version'], **snapshots.stats()}
@@ -0,0 +1,103 @@
+'''
+Cached fragments for the storefront homepage.
+
+Each section is cached under a key that embeds its current version token;
+``bump`` replaces the token when the underlying rows change (see
+legerity/signals.py), so stale fragments are simply never read again. The
+versions of all sections are fetched in one cache call, which is also all a
+conditional GET needs. Both come from the two-tier default cache, so they are
+usually served from the worker's memory and a bump on another worker is seen
+within CACHE_SYNC_INTERVAL; a missing fragment is rebuilt by one request at a
+time across the fleet.
+'''
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Func, IntegerField, Subquery
+
+from customer.models import User
+from legerity.models import About, Product, Review
+from legerity.serializers import AboutListSerializer, ProductListFastSerializer, ReviewListFastSerializer
+
+SECTIONS = ('about', 'reviews', 'products')
+VERSION_KEY = 'storefront:version:{}'
+
+
+def bump(*sections):
+    ''' Invalidate the cached fragments of ``sections``. '''
+    token = time.time_ns()
+    cache.set_many({VERSION_KEY.format(section): token for section in sections}, timeout=None)
+
+
+def versions(sections):
+    keys = {section: VERSION_KEY.format(section) for section in sections}
+    found = cache.get_many(keys.values())
+    missing = {key: time.time_ns() for key in keys.values() if key not in found}
+    if missing:
+        # First use or evicted: start a fresh token so no old fragment can match.
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return {section: found[key] for section, key in keys.items()}
+
+
+def about_queryset():
+    ''' About with both counts annotated, so the section is a single query. '''
+    def count(queryset):
+        # COUNT as a plain function keeps Django from adding a GROUP BY.
+        return Subquery(queryset.order_by().values(total=Func(F('id'), function='COUNT')),
+                        output_field=IntegerField())
+
+    return About.objects.annotate(
+        customer_count=count(User.objects.filter(is_staff=False)),
+        product_count=count(Product.objects.all()),
+    )
+
+
+class Storefront:
+    ''' Build the composite homepage payload for one request. '''
+
+    def __init__(self, request, limits):
+        self.request = request
+        self.limits = {section: limit for section, limit in limits.items() if limit}
+        self.versions = versions(self.limits)
+        # Image URLs are absolute, so fragments are per host as well.
+        self.prefix = f'storefront:{request.scheme}://{request.get_host()}'
+
+    @property
+    def etag(self):
+        parts = [self.prefix] + [f'{section}:{self.limits[section]}:{self.versions[section]}'
+                                 for section in SECTIONS if section in self.limits]
+        return hashlib.sha256('|'.join(parts).encode()).hexdigest()[:32]
+
+    def fragment_key(self, section):
+        return f'{self.prefix}:{section}:{self.limits[section]}:{self.versions[section]}'
+
+    def data(self):
+        keys = {section: self.fragment_key(section) for section in self.limits}
+        cached = cache.get_many(keys.values())
+        payload = {}
+        for section in SECTIONS:
+            if section not in keys:
+                continue
+            if keys[section] in cached:
+                payload[section] = cached[keys[section]]
+            else:
+                payload[section] = cache.get_or_set(keys[section], getattr(self, f'build_{section}'),
+                                                    timeout=settings.STOREFRONT_CACHE_TTL)
+        return payload
+
+    def serialize(self, serializer_class, queryset):
+        return serializer_class(queryset, many=True, context={'request': self.request}).data
+
+    def build_about(self):
+        return self.serialize(AboutListSerializer, about_queryset()[:self.limits['about']])
+
+    def build_reviews(self):
+        queryset = Review.objects.order_by('-created_at', '-id')[:self.limits['reviews']]
+        return ReviewListFastSerializer(queryset, context={'request': self.request}).data
+
+    def build_products(self):
+        queryset = Product.objects.order_by('id')[:self.limits['products']]
+        return ProductListFastSerializer(queryset, context={'request': self.request}).data
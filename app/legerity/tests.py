@@ -1,3 +1,666 @@
-from django.test import TestCase
+import io
+import os
+import re
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from customer.models import User
+from helpers import jobs
+from helpers.models import Job
+from helpers.testing import LOCMEM_CACHES, QueryBudgetMixin
+from legerity import partitions
+from legerity.jobs import order_placed
+from legerity.bundles import refresh_bundles
+from legerity.catalog import ProductImporter
+from legerity.exports import export_queryset
+from legerity.live import RESET, Hub
+from legerity.models import (About, Cart, CartGiftBox, CartItem, DailyOrders, DailySales, GiftBox,
+                             GiftBoxItem, Order, OrderGiftBox, OrderProduct, Product, Review)
+from legerity.reports import GROUPINGS, rebuild_sales, record_order_sales, sales_report
+from legerity.serializers import (CartItemListFastSerializer, CartItemListSerializer,
+                                  ProductListFastSerializer, ProductListSerializer,
+                                  ReviewListFastSerializer, ReviewListSerializer)
+
+CHECKOUT = {'address': 'Nizami 1', 'zip_code': 'AZ1000', 'phone_number': '+994501234567'}
+
+
+def make_products(count):
+    start = Product.objects.count()
+    return Product.objects.bulk_create([
+        Product(sku=f'SKU-{number}', category=Product.Category.oil, price=Decimal('9.50'),
+                stock=1000, image='products/oil.png', info='<p>Oil</p>',
+                info_html='<p>Oil</p>', info_excerpt='Oil')
+        for number in range(start, start + count)
+    ])
+
+
+def make_reviews(count):
+    Review.objects.bulk_create([
+        Review(fullname=f'Reviewer {number}', image='reviews/r.png', comment='<p>Great</p>',
+               comment_html='<p>Great</p>', comment_excerpt='Great')
+        for number in range(count)
+    ])
+
+
+def make_users(count):
+    start = User.objects.count()
+    User.objects.bulk_create([
+        User(email=f'customer{number}@example.com', fullname=f'Customer {number}')
+        for number in range(start, start + count)
+    ])
+
+
+def make_orders(user, count, lines=1):
+    products = make_products(lines)
+    orders = Order.objects.bulk_create([
+        Order(user=user, total_price=Decimal('9.50') * lines, address='Nizami 1',
+              zip_code='AZ1000', phone_number='+994501234567')
+        for _ in range(count)
+    ])
+    OrderProduct.objects.bulk_create([
+        OrderProduct(order=order, product=product, quantity=1, name=product.display_name,
+                     category=product.category, unit_price=product.price,
+                     created_at=order.created_at)
+        for order in orders for product in products
+    ])
+    return orders
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QueryBudgetTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='x')
+        self.admin = User.objects.create_superuser(email='admin@example.com', password='x')
+
+    def login(self, user):
+        # A fresh instance, so relations cached by earlier requests are not reused.
+        self.client.force_authenticate(User.objects.get(pk=user.pk))
+
+
+class CatalogQueryTests(QueryBudgetTestCase):
+    def test_product_list(self):
+        self.assertFlatQueries(1, lambda: self.client.get('/legerity/products/'), {
+            'products=1': lambda: make_products(1),
+            'products=1000': lambda: make_products(999),
+        })
+
+    def test_product_detail(self):
+        product = make_products(1)[0]
+        response = self.assertQueryBudget(
+            1, self.client.get, f'/legerity/products/{product.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_review_list(self):
+        self.assertFlatQueries(1, lambda: self.client.get('/legerity/reviews/'), {
+            'reviews=1': lambda: make_reviews(1),
+            'reviews=50': lambda: make_reviews(49),
+        })
+
+    def test_about(self):
+        About.objects.create(number_of_personals=5, satisfaction_percent=98)
+        self.assertFlatQueries(1, lambda: self.client.get('/legerity/about/'), {
+            'products=1 customers=1': lambda: (make_products(1), make_users(1)),
+            'products=1000 customers=50': lambda: (make_products(999), make_users(49)),
+        })
+
+    def test_storefront(self):
+        About.objects.create(number_of_personals=5, satisfaction_percent=98)
+        make_reviews(10)
+
+        def cold():
+            cache.clear()
+            return self.client.get('/legerity/storefront/?products=50&reviews=10')
+
+        self.assertFlatQueries(3, cold, {
+            'products=1': lambda: make_products(1),
+            'products=1000': lambda: make_products(999),
+        })
+        response = self.assertQueryBudget(
+            0, self.client.get, '/legerity/storefront/?products=50&reviews=10', label='warm')
+        self.assertQueryBudget(
+            0, self.client.get, '/legerity/storefront/?products=50&reviews=10',
+            HTTP_IF_NONE_MATCH=response['ETag'], label='conditional')
+
+    def test_snapshot_stats(self):
+        self.login(self.admin)
+        response = self.assertQueryBudget(0, self.client.get, '/legerity/products/snapshots/stats/')
+        self.assertEqual(response.status_code, 200)
+
+
+class CartQueryTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cart = Cart.objects.create(user=self.user)
+        self.login(self.user)
+
+    def add_items(self, count):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=1)
+            for product in make_products(count)
+        ])
+
+    def test_cart_list(self):
+        self.assertFlatQueries(3, lambda: self.client.get('/legerity/cart-items/'), {
+            'items=1': lambda: self.add_items(1),
+            'items=50': lambda: self.add_items(49),
+        })
+
+    def test_cart_list_not_modified(self):
+        self.add_items(50)
+        etag = self.client.get('/legerity/cart-items/')['ETag']
+        response = self.assertQueryBudget(
+            1, self.client.get, '/legerity/cart-items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_cart_version(self):
+        product = make_products(1)[0]
+        etag = self.client.get('/legerity/cart-items/')['ETag']
+        response = self.client.post('/legerity/cart-items/', {'product': product.id, 'quantity': 1},
+                                    format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get('/legerity/cart-items/')['ETag'], response['ETag'])
+
+        etag = response['ETag']
+        product.stock -= 1
+        product.save()
+        self.assertEqual(self.client.get('/legerity/cart-items/')['ETag'], etag)
+        product.price += 1
+        product.save()
+        self.assertNotEqual(self.client.get('/legerity/cart-items/')['ETag'], etag)
+
+        item = CartItem.objects.get(cart=self.cart)
+        response = self.client.patch(f'/legerity/cart-items/{item.id}/', {'quantity': 2},
+                                     format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(CartItem.objects.get(pk=item.pk).quantity, 1)
+
+    def test_add_item(self):
+        products = []
+
+        def add():
+            return self.client.post('/legerity/cart-items/',
+                                    {'product': products[-1].id, 'quantity': 1}, format='json')
+
+        def prepare(count):
+            self.add_items(count)
+            products.extend(make_products(1))
+
+        self.assertFlatQueries(4, add, {
+            'items=1': lambda: prepare(1),
+            'items=50': lambda: prepare(49),
+        })
+
+    def test_update_item(self):
+        self.add_items(50)
+        item = CartItem.objects.filter(cart=self.cart).first()
+        response = self.assertQueryBudget(
+            3, self.client.patch, f'/legerity/cart-items/{item.id}/', {'quantity': 2},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_remove_item(self):
+        self.add_items(50)
+        item = CartItem.objects.filter(cart=self.cart).first()
+        response = self.assertQueryBudget(
+            2, self.client.delete, f'/legerity/cart-items/{item.id}/')
+        self.assertEqual(response.status_code, 204)
+
+
+class GiftBoxQueryTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login(self.user)
+
+    def add_boxes(self, count, items=5):
+        for _ in range(count):
+            box = GiftBox.objects.create(user=self.user, name='Box')
+            GiftBoxItem.objects.bulk_create([
+                GiftBoxItem(gift_box=box, product=product, quantity=2)
+                for product in make_products(items)
+            ])
+        refresh_bundles()
+
+    def test_gift_box_list(self):
+        self.assertFlatQueries(2, lambda: self.client.get('/legerity/giftboxes/'), {
+            'boxes=1': lambda: self.add_boxes(1),
+            'boxes=50': lambda: self.add_boxes(49, items=10),
+        })
+
+    def test_add_gift_box_to_cart(self):
+        self.add_boxes(1, items=10)
+        Cart.objects.create(user=self.user)
+        box = GiftBox.objects.get()
+        self.assertEqual(box.price, Decimal('190.00'))
+        self.assertEqual(box.available, 500)
+        response = self.assertQueryBudget(
+            3, self.client.post, f'/legerity/giftboxes/{box.id}/cart/', {'quantity': 2},
+            format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['quantity'], 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GiftBoxBundleTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='x')
+        self.oil, self.balm = make_products(2)
+        Product.objects.filter(pk=self.balm.pk).update(price=Decimal('3.00'), stock=10)
+        Product.objects.filter(pk=self.oil.pk).update(stock=5)
+        self.box = GiftBox.objects.create(user=self.user, name='Box')
+        self.other = GiftBox.objects.create(user=self.user, name='Other')
+        GiftBoxItem.objects.create(gift_box=self.box, product=self.oil, quantity=2)
+        self.item = GiftBoxItem.objects.create(gift_box=self.box, product=self.balm, quantity=3)
+
+    def assertBundle(self, box, price, available):
+        box.refresh_from_db()
+        self.assertEqual((box.price, box.available), (Decimal(price), available))
+
+    def test_price_and_availability(self):
+        self.assertBundle(self.box, '28.00', 2)
+        self.assertBundle(self.other, '0.00', 0)
+
+        product = Product.objects.get(pk=self.balm.pk)
+        product.stock = 2
+        product.save()
+        self.assertBundle(self.box, '28.00', 0)
+
+        Product.objects.get(pk=self.oil.pk).delete()
+        self.assertBundle(self.box, '9.00', 0)
+
+    def test_moving_an_item_refreshes_both_boxes(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(f'/legerity/giftbox-items/{self.item.id}/',
+                                     {'gift_box': self.other.id}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertBundle(self.box, '19.00', 2)
+        self.assertBundle(self.other, '9.00', 3)
+
+
+class CheckoutQueryTests(QueryBudgetTestCase):
+    def fill_cart(self, count):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=2)
+            for product in make_products(count)
+        ])
+        self.login(self.user)
+
+    def checkout(self, **headers):
+        response = self.client.post('/legerity/checkout/', CHECKOUT, format='json', **headers)
+        self.assertEqual(response.status_code, 201, response.content)
+        return response
+
+    def test_checkout(self):
+        self.assertFlatQueries(13, self.checkout, {
+            'items=1': lambda: self.fill_cart(1),
+            'items=50': lambda: self.fill_cart(50),
+        })
+
+    def test_checkout_with_gift_boxes(self):
+        def fill_boxes(count):
+            cart, _ = Cart.objects.get_or_create(user=self.user)
+            for _ in range(count):
+                box = GiftBox.objects.create(user=self.user, name='Box')
+                GiftBoxItem.objects.bulk_create([
+                    GiftBoxItem(gift_box=box, product=product, quantity=1)
+                    for product in make_products(3)
+                ])
+                refresh_bundles(gift_box_ids=[box.id])
+                CartGiftBox.objects.create(cart=cart, gift_box=box, quantity=2)
+            self.fill_cart(1)
+
+        self.assertFlatQueries(16, self.checkout, {
+            'boxes=1': lambda: fill_boxes(1),
+            'boxes=20': lambda: fill_boxes(20),
+        })
+
+    def test_checkout_with_idempotency_key(self):
+        keys = iter(['first', 'second'])
+        self.assertFlatQueries(
+            20, lambda: self.checkout(HTTP_IDEMPOTENCY_KEY=next(keys)), {
+                'items=1': lambda: self.fill_cart(1),
+                'items=50': lambda: self.fill_cart(50),
+            })
+
+    def test_idempotent_checkout_replays_the_first_response(self):
+        self.fill_cart(2)
+        first = self.checkout(HTTP_IDEMPOTENCY_KEY='retry')
+        replayed = self.checkout(HTTP_IDEMPOTENCY_KEY='retry')
+        self.assertEqual(replayed.json(), first.json())
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(Order.objects.count(), 1)
+
+        response = self.client.post('/legerity/checkout/', {**CHECKOUT, 'address': 'Other 2'},
+                                    format='json', HTTP_IDEMPOTENCY_KEY='retry')
+        self.assertEqual(response.status_code, 422, response.content)
+        self.assertIn('error', response.data)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_checkout_does_not_keep_the_key(self):
+        self.login(self.user)
+        response = self.client.post('/legerity/checkout/', CHECKOUT, format='json',
+                                    HTTP_IDEMPOTENCY_KEY='retry')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.fill_cart(1)
+        self.checkout(HTTP_IDEMPOTENCY_KEY='retry')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_checkout_with_deleted_product(self):
+        self.fill_cart(2)
+        Product.objects.filter(id=CartItem.objects.first().product_id).delete()
+        response = self.client.post('/legerity/checkout/', CHECKOUT, format='json')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertIn('products', response.data)
+        self.assertEqual(CartItem.objects.count(), 2)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderQueryTests(QueryBudgetTestCase):
+    def test_order_history(self):
+        self.login(self.user)
+        self.assertFlatQueries(1, lambda: self.client.get('/legerity/orders/'), {
+            'orders=1': lambda: make_orders(self.user, 1),
+            'orders=50': lambda: make_orders(self.user, 49),
+        })
+
+    def test_order_detail(self):
+        self.login(self.user)
+        orders = []
+        self.assertFlatQueries(3, lambda: self.client.get(f'/legerity/orders/{orders[-1].id}/'), {
+            'lines=1': lambda: orders.extend(make_orders(self.user, 1, lines=1)),
+            'lines=50': lambda: orders.extend(make_orders(self.user, 1, lines=50)),
+        })
+
+    def test_order_export(self):
+        self.login(self.admin)
+        for output in ('csv', 'jsonl'):
+            with self.subTest(output=output):
+                self.assertFlatQueries(
+                    2, lambda: self.client.get(f'/legerity/orders/export/?output={output}'), {
+                        f'{output} orders=1': lambda: make_orders(self.user, 1, lines=3),
+                        f'{output} orders=50': lambda: make_orders(self.user, 49, lines=3),
+                    })
+
+    def test_order_export_rejects_start_after_end(self):
+        self.login(self.admin)
+        response = self.client.get('/legerity/orders/export/',
+                                   {'start': '2026-02-01', 'end': '2026-01-31'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', response.json())
+
+    def test_sales_report(self):
+        self.login(self.admin)
+        today = timezone.localdate()
+
+        def add_rollups(count):
+            DailySales.objects.bulk_create([
+                DailySales(date=today, category=product.category, product=product,
+                           units=1, revenue=product.price, orders=1)
+                for product in make_products(count)
+            ])
+
+        for group_by, budget in (('product', 1), ('day', 2), ('category', 2)):
+            with self.subTest(group_by=group_by):
+                DailySales.objects.all().delete()
+                self.assertFlatQueries(
+                    budget, lambda: self.client.get(
+                        '/legerity/reports/sales/', {'start': date(2000, 1, 1), 'end': today,
+                                                     'group_by': group_by}), {
+                        f'{group_by} rows=1': lambda: add_rollups(1),
+                        f'{group_by} rows=50': lambda: add_rollups(49),
+                    })
+
+
+class SalesReportTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email='buyer@example.com', password='x')
+        self.orders = make_orders(user, 2, lines=3)
+        balm = self.orders[0].products.order_by('id').first().product_id
+        OrderProduct.objects.filter(product_id=balm).update(category=Product.Category.balm)
+        self.today = timezone.localdate()
+
+    def report(self, group_by):
+        return [dict(row) for row in sales_report(self.today, self.today, group_by)]
+
+    def test_orders_are_counted_once_per_grouping(self):
+        for order in self.orders:
+            record_order_sales(order, list(order.products.all()))
+
+        day = self.report('day')
+        self.assertEqual([(row['units'], row['orders']) for row in day], [(6, 2)])
+        self.assertEqual(
+            [(row['category'], row['units'], row['orders']) for row in self.report('category')],
+            [('Balm', 2, 2), ('Oil', 4, 2)])
+        self.assertEqual([row['orders'] for row in self.report('product')], [2, 2, 2])
+
+        reports = {group_by: self.report(group_by) for group_by in GROUPINGS}
+        DailySales.objects.all().delete()
+        DailyOrders.objects.all().delete()
+        rebuild_sales(self.today, self.today)
+        for group_by, rows in reports.items():
+            with self.subTest(group_by=group_by):
+                self.assertEqual(self.report(group_by), rows)
+
+
+    def test_rebuild_leaves_orders_with_pending_jobs_to_the_job(self):
+        first, second = self.orders
+        jobs.enqueue('legerity.order_placed', {
+            'order_id': first.id, 'created_at': first.created_at.isoformat()})
+        failed = jobs.enqueue('legerity.order_placed', {'order_id': second.id})
+        Job.objects.filter(pk=failed.pk).update(status=Job.Status.failed)
+
+        rebuild_sales(self.today, self.today)
+        self.assertEqual([(row['units'], row['orders']) for row in self.report('day')], [(3, 1)])
+
+        self.assertTrue(jobs.run(jobs.claim('test-worker')[0]))
+        self.assertEqual([(row['units'], row['orders']) for row in self.report('day')], [(6, 2)])
+        rebuild_sales(self.today, self.today)
+        self.assertEqual([(row['units'], row['orders']) for row in self.report('day')], [(6, 2)])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductImportTests(APITestCase):
+    def import_csv(self, text):
+        return ProductImporter(workers=1).run(io.StringIO(text), 'csv')
+
+    def test_reimport_keeps_unsupplied_sales_number(self):
+        product = make_products(1)[0]
+        Product.objects.filter(pk=product.pk).update(sales_number=5)
+
+        result = self.import_csv(f'sku,category,price,stock,info\n{product.sku},Oil,12.00,7,Oil\n')
+        self.assertEqual(result.updated, 1, result.errors)
+        product.refresh_from_db()
+        self.assertEqual((product.price, product.stock, product.sales_number),
+                         (Decimal('12.00'), 7, 5))
+
+        self.import_csv(f'sku,category,price,stock,info,sales_number\n'
+                        f'{product.sku},Oil,12.00,7,Oil,9\n')
+        product.refresh_from_db()
+        self.assertEqual(product.sales_number, 9)
+
+
+    def test_image_references_stay_inside_the_image_root(self):
+        with tempfile.TemporaryDirectory() as media, tempfile.TemporaryDirectory() as root, \
+                override_settings(MEDIA_ROOT=media):
+            Image.new('RGB', (2, 2)).save(os.path.join(root, 'oil.png'))
+            os.symlink('/etc', os.path.join(root, 'etc'))
+            references = [f'{settings.MEDIA_URL}../x.png', '/etc/hostname',
+                          'file:///etc/hostname', '../x.png', 'etc/hostname', 'oil.png']
+            rows = ''.join(f'SKU-{number},Oil,9.50,1,Oil,{reference}\n'
+                           for number, reference in enumerate(references))
+            result = ProductImporter(workers=1, image_root=root).run(
+                io.StringIO('sku,category,price,stock,info,image\n' + rows), 'csv')
+
+            self.assertEqual(result.created, 1)
+            self.assertEqual([number for number, _ in result.errors], [2, 3, 4, 5, 6])
+            self.assertTrue(all(error.startswith('image: ') for _, error in result.errors))
+            image = Product.objects.get().image.name
+            self.assertTrue(os.path.exists(os.path.join(media, image)), image)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderPartitionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='x')
+        self.today = timezone.localdate()
+
+    def partition_of(self, model, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text FROM "{model._meta.db_table}" '
+                           'WHERE id = %s', [pk])
+            return cursor.fetchone()[0]
+
+    def scanned_partitions(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        return set(re.findall(r' on (legerity_\w+?_(?:y\d{4}m\d{2}|default))\b', plan))
+
+    def assertRowsReadFromMonth(self, fetch):
+        month = (self.today.year, self.today.month)
+        with CaptureQueriesContext(connection) as queries:
+            fetch()
+        checked = set()
+        for table in (OrderProduct._meta.db_table, OrderGiftBox._meta.db_table):
+            for query in queries:
+                if f'FROM "{table}"' in query['sql']:
+                    checked.add(table)
+                    self.assertEqual(self.scanned_partitions(query['sql']),
+                                     {partitions.partition_name(table, *month)}, query['sql'])
+        return checked
+
+    def test_order_rows_are_read_from_their_month_only(self):
+        order = make_orders(self.user, 1, lines=2)[0]
+        self.client.force_authenticate(self.user)
+        self.assertEqual(
+            self.assertRowsReadFromMonth(lambda: self.client.get(f'/legerity/orders/{order.id}/')),
+            set(partitions.TABLES[1:]))
+        self.assertEqual(
+            self.assertRowsReadFromMonth(lambda: list(export_queryset(Order.objects.all()))),
+            {OrderProduct._meta.db_table})
+
+        self.assertRowsReadFromMonth(
+            lambda: order_placed(order.id, order.created_at.isoformat()))
+        self.assertEqual(sum(product.sales_number for product in Product.objects.all()), 2)
+
+        self.client.force_login(User.objects.create_superuser(email='admin@example.com', password='x'))
+        self.assertEqual(self.assertRowsReadFromMonth(
+            lambda: self.client.get(f'/admin/legerity/order/{order.id}/change/')),
+            set(partitions.TABLES[1:]))
+
+    def test_command_creates_upcoming_months(self):
+        months = [partitions.add_months(self.today.year, self.today.month, offset)
+                  for offset in (4, 5)]
+        self.assertEqual(set(partitions.missing_partitions(5)),
+                         {(table, month) for table in partitions.TABLES for month in months})
+
+        call_command('manage_order_partitions', ahead=5, stdout=io.StringIO())
+        self.assertEqual(list(partitions.missing_partitions(5)), [])
+        for table in partitions.TABLES:
+            self.assertLessEqual(set(months), set(partitions.list_partitions(table)))
+
+    def test_rows_land_in_their_month_or_the_default_partition(self):
+        order = make_orders(self.user, 1)[0]
+        line = order.products.get()
+        month = (self.today.year, self.today.month)
+        self.assertEqual(self.partition_of(Order, order.pk),
+                         partitions.partition_name(Order._meta.db_table, *month))
+        self.assertEqual(self.partition_of(OrderProduct, line.pk),
+                         partitions.partition_name(OrderProduct._meta.db_table, *month))
+
+        old = timezone.make_aware(datetime(2001, 1, 15))
+        Order.objects.filter(pk=order.pk).update(created_at=old)
+        OrderProduct.objects.filter(pk=line.pk).update(created_at=old)
+        self.assertEqual(self.partition_of(Order, order.pk), 'legerity_order_default')
+        self.assertEqual(self.partition_of(OrderProduct, line.pk),
+                         'legerity_orderproduct_default')
+
+        # Postgres refuses a partition whose month has rows in the default partition.
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            partitions.create_partition(Order._meta.db_table, 2001, 1)
+
+    def test_command_retires_old_months(self):
+        table = Order._meta.db_table
+        old = partitions.add_months(self.today.year, self.today.month, -13)
+        for drop in (False, True):
+            with self.subTest(drop=drop):
+                partitions.create_partition(table, *old)
+                call_command('manage_order_partitions', retain_months=12, drop=drop,
+                             archive_schema='archive_test', stdout=io.StringIO())
+                self.assertNotIn(old, partitions.list_partitions(table))
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT to_regclass(%s)',
+                                   [f'archive_test.{partitions.partition_name(table, *old)}'])
+                    archived = cursor.fetchone()[0] is not None
+                self.assertEqual(archived, not drop)
+                if archived:
+                    with connection.cursor() as cursor:
+                        cursor.execute('DROP SCHEMA archive_test CASCADE')
+
+
+class FastSerializerParityTests(APITestCase):
+    def assertParity(self, serializer_class, fast_serializer_class, queryset, request=None):
+        context = {'request': request} if request else {}
+        expected = serializer_class(queryset, many=True, context=context).data
+        self.assertEqual(fast_serializer_class(queryset, context=context).data, expected)
+
+    def test_parity(self):
+        products = make_products(3)
+        Product.objects.filter(pk=products[0].pk).update(price=Decimal('12.5'), image='')
+        make_reviews(3)
+        cart = Cart.objects.create(user=User.objects.create_user(email='p@example.com', password='x'))
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=number + 1)
+                                      for number, product in enumerate(products)])
+        request = APIRequestFactory().get('/')
+        for fast_request in (None, request):
+            with self.subTest(request=fast_request):
+                self.assertParity(ProductListSerializer, ProductListFastSerializer,
+                                  Product.objects.order_by('id'), fast_request)
+                self.assertParity(ReviewListSerializer, ReviewListFastSerializer,
+                                  Review.objects.order_by('id'), fast_request)
+                self.assertParity(CartItemListSerializer, CartItemListFastSerializer,
+                                  CartItem.objects.order_by('id'), fast_request)
+
+
+@override_settings(LIVE_QUEUE_SIZE=3)
+class LiveFeedTests(SimpleTestCase):
+    def test_changes_reach_the_watchers_of_their_product(self):
+        hub = Hub()
+        some, every = hub.watch(frozenset({1})), hub.watch(None)
+        hub.deliver([{'id': 1, 'stock': 5}, {'id': 2, 'stock': 6}])
+        self.assertEqual([change['id'] for _, change in some.drain()], [1])
+        self.assertEqual([change['id'] for _, change in every.drain()], [1, 2])
+        hub.unwatch(some)
+        self.assertEqual(dict(hub.by_id), {})
+
+    def test_resume_from_cursor(self):
+        hub = Hub()
+        hub.deliver([{'id': 1}, {'id': 2}])
+        cursor = hub.cursor()
+        hub.deliver([{'id': 1}, {'id': 2}])
+        self.assertEqual(hub.since(cursor, frozenset({2})), [(4, {'id': 2})])
+        self.assertIsNone(hub.since('another.2', None))
+
+    def test_missed_changes_reset(self):
+        hub = Hub()
+        watcher = hub.watch(None)
+        hub.deliver([{'id': number} for number in range(4)])
+        self.assertEqual(watcher.drain(), [RESET])
+        cursor = hub.cursor()
+        hub.deliver_reset()
+        self.assertIsNone(hub.since(cursor, None))
+        self.assertEqual(hub.since(hub.cursor(), None), [])
@@ -4,15 +4,24 @@ from legerity import views
 
 router = DefaultRouter()
 router.register(r'cart-items', views.CartItemViewSet, basename='cart-item')
-# router.register(r'giftboxes', views.GiftBoxViewSet, basename='giftboxes')
-# router.register(r'giftbox-items', views.GiftBoxItemViewSet,
-# basename='giftbox-items')
+router.register(r'giftboxes', views.GiftBoxViewSet, basename='giftboxes')
+router.register(r'giftbox-items', views.GiftBoxItemViewSet,
+                basename='giftbox-items')
 
 urlpatterns = [
+    path('storefront/', views.StorefrontView.as_view(), name='storefront'),
     path('about/', views.AboutListView.as_view(), name='about'),
     path('reviews/', views.ReviewListView.as_view(), name='reviews'),
     path('products/', views.ProductListView.as_view(), name='products'),
+    path('products/<int:pk>/', views.ProductDetailView.as_view(),
+         name='product-detail'),
+    path('products/snapshots/stats/', views.ProductSnapshotStatsView.as_view(),
+         name='product-snapshot-stats'),
     path('checkout/', views.OrderView.as_view(), name='checkout'),
+    path('orders/', views.OrderHistoryView.as_view(), name='order-history'),
+    path('orders/<int:pk>/', views.OrderDetailView.as_view(), name='order-detail'),
+    path('orders/export/', views.OrderExportView.as_view(), name='order-export'),
+    path('reports/sales/', views.SalesReportView.as_view(), name='sales-report'),
 ]
 
 urlpatterns += router.urls
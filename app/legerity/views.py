@@ -1,36 +1,84 @@
 from rest_framework import generics, viewsets, status
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView
+from django.db.models import Prefetch
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
 
 from drf_spectacular.utils import extend_schema, extend_schema_view
 
-from legerity.models import About, Review, Product, Cart, CartItem
-from legerity.serializers import AboutListSerializer, ReviewListSerializer, ProductListSerializer, CartItemCreateSerializer, CartItemListSerializer, CartItemUpdateSerializer, CartListSerializer, OrderCreateSerializer
+from legerity.models import Review, Product, Cart, CartGiftBox, CartItem, GiftBox, GiftBoxItem, Order
+from legerity.serializers import AboutListSerializer, ReviewListSerializer, ReviewListFastSerializer, ProductListSerializer, ProductListFastSerializer, ProductDetailSerializer, CartItemCreateSerializer, CartItemListSerializer, CartItemListFastSerializer, CartItemUpdateSerializer, CartListSerializer, CartGiftBoxCreateSerializer, CartGiftBoxSerializer, GiftBoxSerializer, GiftBoxItemSerializer, OrderCreateSerializer, SalesReportQuerySerializer, SalesReportRowSerializer, OrderExportQuerySerializer, StorefrontQuerySerializer, StorefrontSerializer, OrderListSerializer, OrderDetailSerializer
+from legerity import carts
+from legerity.exports import export_orders, filter_orders
+from legerity.partitions import prefetch_order_rows
+from legerity.reports import sales_report
+from legerity.snapshots import get_snapshot, stats as snapshot_stats
+from legerity.storefront import Storefront, about_queryset
 
-from django.db import transaction
+from helpers.fast_serializers import FastListMixin
+from helpers.idempotency import idempotent
+from helpers.throttling import ScopedIPThrottle, ScopedUserThrottle
 
 
 class AboutListView(generics.ListAPIView):
-    queryset = About.objects.all()
+    queryset = about_queryset()
     serializer_class = AboutListSerializer
 
 
-class ReviewListView(generics.ListAPIView):
+class ReviewListView(FastListMixin, generics.ListAPIView):
     queryset = Review.objects.all()
     serializer_class = ReviewListSerializer
+    fast_serializer_class = ReviewListFastSerializer
 
 
-class ProductListView(generics.ListAPIView):
+class ProductListView(FastListMixin, generics.ListAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductListSerializer
+    fast_serializer_class = ProductListFastSerializer
+
+
+class StorefrontView(APIView):
+    authentication_classes = []
+
+    @extend_schema(
+        summary="Storefront",
+        description="About, reviews and products for the homepage in one response. "
+                    "Each query parameter limits its section; 0 leaves it out. "
+                    "Send the returned ETag as If-None-Match to get 304 when nothing changed.",
+        parameters=[StorefrontQuerySerializer],
+        responses={200: StorefrontSerializer, 304: None}
+    )
+    def get(self, request):
+        query = StorefrontQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        storefront = Storefront(request, query.validated_data)
+        etag = quote_etag(storefront.etag)
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(storefront.data(), status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+class ProductDetailView(generics.RetrieveAPIView):
+    queryset = Product.objects.defer('info', 'info_excerpt')
+    serializer_class = ProductDetailSerializer
 
 
 @extend_schema_view(
     list=extend_schema(
         summary="Get Cart Items",
-        description="Retrieve all items in the authenticated user's cart.",
-        responses={200: CartItemListSerializer(many=True)}
+        description="Retrieve all items in the authenticated user's cart. "
+                    "Send the returned ETag as If-None-Match to get 304 when nothing changed, "
+                    "or as If-Match on a cart change to apply it only to that version of the cart.",
+        responses={200: CartListSerializer, 304: None}
     ),
     create=extend_schema(
         summary="Add Product to Cart",
@@ -63,9 +111,25 @@ class CartItemViewSet(viewsets.ViewSet):
     def list(self, request):
         ''' Retrieve all products  in the user's cart. '''
         cart = self.get_cart(request)
-        serializer = CartListSerializer(cart)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-
+        if carts.not_modified(request, cart):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            # CartListSerializer's output, with the items read as plain rows.
+            items = CartItemListFastSerializer(CartItem.objects.filter(cart=cart).order_by('id')).data
+            boxes = CartGiftBoxSerializer(
+                CartGiftBox.objects.filter(cart=cart).select_related('gift_box').order_by('id'),
+                many=True).data
+            total_price = sum(item['subtotal_price'] for item in items
+                              if item['subtotal_price'] is not None)
+            total_price += sum(box['subtotal_price'] for box in boxes)
+            response = Response({'cart_items': items, 'gift_boxes': boxes,
+                                 'total_price': total_price}, status=status.HTTP_200_OK)
+        response['ETag'] = carts.etag(cart)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @idempotent('cart-items')
+    @carts.precondition
     def create(self, request):
         ''' Handle adding  a product to the cart (only new items, no quantity update). '''
         cart = self.get_cart(request)
@@ -79,20 +143,29 @@ class CartItemViewSet(viewsets.ViewSet):
             return Response({'quantity': 'This field is required'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            return Response({'quantity': 'A valid integer is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        product = get_snapshot(product_id)
+        if product is None:
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
 
+        if quantity > product.stock:
+            return Response({'error': 'Not enough stock'}, status=status.HTTP_400_BAD_REQUEST)
+
         # Check if item already exists in the cart
-        if CartItem.objects.filter(cart=cart, product=product).exists():
+        if CartItem.objects.filter(cart=cart, product_id=product.id).exists():
             return Response({'error': 'Product already in cart. Use PATCH to update quantity'}, status=status.HTTP_400_BAD_REQUEST)
 
         cart_item = CartItem.objects.create(
-            cart=cart, product=product, quantity=quantity)
+            cart=cart, product_id=product.id, quantity=quantity)
         serializer = CartItemCreateSerializer(cart_item)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @idempotent('cart-items')
+    @carts.precondition
     def partial_update(self, request, pk=None):
         ''' Update the quantity of an existing cart item (PATCH request). '''
         try:
@@ -104,7 +177,8 @@ class CartItemViewSet(viewsets.ViewSet):
         if new_quantity is None:
             return Response({'error': 'Quantity is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if new_quantity > cart_item.product.stock:
+        product = get_snapshot(cart_item.product_id)
+        if product is None or new_quantity > product.stock:
             return Response({'error': 'Not enough stock'}, status=status.HTTP_400_BAD_REQUEST)
 
         cart_item.quantity = new_quantity
@@ -112,6 +186,8 @@ class CartItemViewSet(viewsets.ViewSet):
         serializer = CartItemUpdateSerializer(cart_item)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @idempotent('cart-items')
+    @carts.precondition
     def destroy(self, request, pk=None):
         ''' Remove an item from the cart (DELETE request). '''
         try:
@@ -122,42 +198,168 @@ class CartItemViewSet(viewsets.ViewSet):
             return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
-# class GiftBoxViewSet(viewsets.ModelViewSet):
-#     permission_classes = [IsAuthenticated]
-#     serializer_class = GiftBoxSerializer
-
-#     def get_queryset(self):
-#         return GiftBox.objects.filter(user=self.request.user)
-
-#     def perform_create(self, serializer):
-#         serializer.save(user=self.request.user)
+class GiftBoxViewSet(viewsets.ModelViewSet):
+    ''' The user's gift boxes with their items, read in two queries. '''
+    permission_classes = [IsAuthenticated]
+    serializer_class = GiftBoxSerializer
+
+    def get_queryset(self):
+        boxes = GiftBox.objects.filter(user=self.request.user).order_by('id')
+        if self.action == 'cart':
+            return boxes
+        items = GiftBoxItem.objects.select_related('product').only(
+            'id', 'gift_box_id', 'quantity', 'product__id', 'product__price',
+            'product__category').order_by('id')
+        return boxes.prefetch_related(Prefetch('items', queryset=items))
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @extend_schema(
+        summary="Add Gift Box to Cart",
+        description="Put the gift box in the cart, or set its quantity if it is already there.",
+        request=CartGiftBoxCreateSerializer,
+        responses={200: CartGiftBoxSerializer, 400: {"error": "Not enough stock"}}
+    )
+    @action(detail=True, methods=['post'])
+    @carts.precondition
+    def cart(self, request, pk=None):
+        gift_box = self.get_object()
+        serializer = CartGiftBoxCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        quantity = serializer.validated_data['quantity']
 
+        # Availability is kept on the box, so the items need not be read.
+        if quantity > gift_box.available:
+            return Response({'error': 'Not enough stock'}, status=status.HTTP_400_BAD_REQUEST)
 
-# class GiftBoxItemViewSet(viewsets.ModelViewSet):
-#     permission_classes = [IsAuthenticated]
-#     serializer_class = GiftBoxItemSerializer
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        # One upsert instead of update_or_create's locking read and savepoints.
+        cart_box, = CartGiftBox.objects.bulk_create(
+            [CartGiftBox(cart=cart, gift_box=gift_box, quantity=quantity)],
+            update_conflicts=True,
+            unique_fields=['cart', 'gift_box'],
+            update_fields=['quantity'],
+        )
+        return Response(CartGiftBoxSerializer(cart_box).data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary="Remove Gift Box from Cart",
+        request=None,
+        responses={204: None, 404: {"error": "Gift box not in cart"}}
+    )
+    @cart.mapping.delete
+    @carts.precondition
+    def remove_from_cart(self, request, pk=None):
+        deleted, _ = CartGiftBox.objects.filter(
+            cart__user=request.user, gift_box_id=pk).delete()
+        if not deleted:
+            return Response({'error': 'Gift box not in cart'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-#     def get_queryset(self):
-#         return GiftBoxItem.objects.filter(gift_box__user=self.request.user)
 
-#     def perform_create(self, serializer):
-#         gift_box_id = self.request.data.get('gift_box')
-#         try:
-#             gift_box = GiftBox.objects.get(
-#                 id=gift_box_id, user=self.request.user)
-#         except GiftBox.DoesNotExist:
-#             raise serializer.ValidationError('Gift box not found.')
+class GiftBoxItemViewSet(viewsets.ModelViewSet):
+    permission_classes = [IsAuthenticated]
+    serializer_class = GiftBoxItemSerializer
 
-#         serializer.save(gift_box_id=gift_box_id)
+    def get_queryset(self):
+        return (GiftBoxItem.objects.filter(gift_box__user=self.request.user)
+                .select_related('product').defer('product__info', 'product__info_html')
+                .order_by('id'))
 
 
 class OrderView(generics.GenericAPIView):
     serializer_class = OrderCreateSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'checkout'
+    throttle_classes = [ScopedUserThrottle, ScopedIPThrottle]
 
+    @idempotent('checkout')
+    @carts.precondition
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(
             data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         order = serializer.save()
         return Response({'message': 'Order placed successfully.'}, status=status.HTTP_201_CREATED)
+
+
+class ProductSnapshotStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        summary="Product Snapshot Cache Stats",
+        description="Hit/miss counters of the product snapshot cache in the worker that serves the request.",
+        responses={200: dict}
+    )
+    def get(self, request):
+        return Response(snapshot_stats(), status=status.HTTP_200_OK)
+
+
+class OrderHistoryPagination(CursorPagination):
+    ordering = ('-created_at', '-id')
+    page_size = 20
+
+
+def user_orders(user):
+    ''' ``user``'s orders; none predate the account, so older partitions are skipped. '''
+    return Order.objects.filter(user=user, created_at__gte=user.created_at)
+
+
+class OrderHistoryView(generics.ListAPIView):
+    ''' The user's orders, newest first, read from the user_history index. '''
+    serializer_class = OrderListSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = OrderHistoryPagination
+
+    def get_queryset(self):
+        return user_orders(self.request.user).only(
+            'id', 'status', 'total_price', 'created_at')
+
+
+class OrderDetailView(generics.RetrieveAPIView):
+    ''' One order with its lines, priced from the checkout snapshots. '''
+    serializer_class = OrderDetailSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return user_orders(self.request.user)
+
+    def get_object(self):
+        order = super().get_object()
+        prefetch_order_rows([order], 'products', 'giftboxes')
+        return order
+
+
+class SalesReportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        summary="Sales Report",
+        description="Units, revenue and orders between two dates, read from the daily sales rollups.",
+        parameters=[SalesReportQuerySerializer],
+        responses={200: SalesReportRowSerializer(many=True)}
+    )
+    def get(self, request):
+        query = SalesReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        rows = sales_report(**query.validated_data)
+        serializer = SalesReportRowSerializer(rows, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class OrderExportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        summary="Export Orders",
+        description="Stream orders with their lines as CSV (one row per line) or JSONL (one object per order).",
+        parameters=[OrderExportQuerySerializer],
+        responses={(200, 'text/csv'): str, (200, 'application/x-ndjson'): str}
+    )
+    def get(self, request):
+        query = OrderExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        filters = dict(query.validated_data)
+        output = filters.pop('output')
+        return export_orders(filter_orders(Order.objects.all(), **filters), output)
@@ -1,3 +1,10 @@
+# Live feed cursors only resume in the process that issued them, so every
+# client is pinned to one live container (each runs a single process).
+upstream live {
+    ip_hash;
+    server ${LIVE_HOST}:${LIVE_PORT};
+}
+
 server {
     listen ${LISTEN_PORT};
     
@@ -5,6 +12,26 @@ server {
         alias /vol/static;
     }
 
+    # Server-sent events and long polls for the live product feed, answered by
+    # the ASGI service. Responses must not be buffered and idle streams stay open.
+    location /legerity/live/ {
+        proxy_pass              http://live;
+        proxy_http_version      1.1;
+        proxy_set_header        Connection "";
+        proxy_buffering         off;
+        proxy_cache             off;
+        proxy_read_timeout      1h;
+    }
+
+    # Streaming exports (the API and the order changelist's export actions) and
+    # catalog imports may run for minutes.
+    location ~ ^/(legerity/orders/export|admin/legerity/order|admin/legerity/product/import)/$ {
+        uwsgi_pass              ${APP_HOST}:${APP_PORT};
+        include                 /etc/nginx/uwsgi_params;
+        client_max_body_size    10M;
+        uwsgi_read_timeout      600s;
+    }
+
     location / {
         uwsgi_pass              ${APP_HOST}:${APP_PORT};
         include                 /etc/nginx/uwsgi_params;
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+'''
+Compare uwsgi serving profiles by per-worker memory and throughput.
+
+Each configuration is a set of WEB_* overrides for scripts/uwsgi.ini:
+
+    python /scripts/bench_uwsgi.py --path /legerity/products/ \
+        --config baseline:WEB_MIN_WORKERS=3,WEB_MAX_WORKERS=4,WEB_THREADS=1 \
+        --config threaded:WEB_MIN_WORKERS=2,WEB_MAX_WORKERS=8,WEB_THREADS=4
+
+For every configuration uwsgi is started on a local HTTP socket, warmed up,
+loaded by ``--clients`` concurrent clients for ``--duration`` seconds, and
+the RSS and PSS (shared pages split between the processes using them) of the
+master and every worker are read from /proc.
+'''
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+SCRIPTS = Path(__file__).resolve().parent
+DEFAULTS = {
+    'WEB_THREADS': '4',
+    'WEB_MIN_WORKERS': '2',
+    'WEB_MAX_WORKERS': '8',
+    'WEB_MAX_REQUESTS': '5000',
+    'WEB_RELOAD_ON_RSS': '256',
+    'WEB_HARAKIRI': '600',
+    'WEB_LISTEN': '100',
+}
+
+
+def parse_config(value):
+    name, _, overrides = value.partition(':')
+    env = dict(item.split('=', 1) for item in overrides.split(',') if item)
+    return name, env
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def memory(pid):
+    ''' Return ``(rss_kb, pss_kb)`` for a process. '''
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as fh:
+        for line in fh:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                values[key] = int(rest.split()[0])
+    return values['Rss'], values['Pss']
+
+
+def read_stats(port):
+    with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+        chunks = []
+        while chunk := sock.recv(65536):
+            chunks.append(chunk)
+    return json.loads(b''.join(chunks), strict=False)
+
+
+def wait_until_ready(process, port, path, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            request(port, path)
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def request(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        conn.request('GET', path, headers={'Host': 'localhost'})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def load(port, path, clients, duration):
+    ''' Hammer ``path`` and return ``(latencies, errors)``. '''
+    deadline = time.monotonic() + duration
+    latencies, errors = [], []
+
+    def client():
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                status = request(port, path)
+            except OSError as e:
+                errors.append(str(e))
+                continue
+            if status >= 500:
+                errors.append(status)
+            latencies.append(time.monotonic() - started)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def bench(name, overrides, args):
+    http_port, stats_port = free_port(), free_port()
+    with tempfile.TemporaryDirectory() as tmp, open(Path(tmp) / 'uwsgi.log', 'w+') as log:
+        env = {**os.environ, **DEFAULTS, **overrides,
+               'WEB_SOCKET': str(Path(tmp) / 'uwsgi.sock')}
+        process = subprocess.Popen(
+            ['uwsgi', '--ini', str(args.ini),
+             '--http-socket', f'127.0.0.1:{http_port}',
+             '--stats', f'127.0.0.1:{stats_port}',
+             '--disable-logging'],
+            cwd=args.chdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        try:
+            if not wait_until_ready(process, http_port, args.path):
+                log.seek(0)
+                raise RuntimeError(f'{name}: uwsgi did not start serving\n{log.read()}')
+            load(http_port, args.path, args.clients, args.warmup)
+            latencies, errors = load(http_port, args.path, args.clients, args.duration)
+
+            stats = read_stats(stats_port)
+            workers = [worker['pid'] for worker in stats['workers'] if worker['pid']]
+            master_rss, master_pss = memory(process.pid)
+            usage = [memory(pid) for pid in workers]
+        finally:
+            process.terminate()
+            process.wait(timeout=60)
+
+    latencies.sort()
+    return {
+        'config': name,
+        'workers': len(workers),
+        'threads': int(env['WEB_THREADS']),
+        'requests_per_second': round(len(latencies) / args.duration, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1) if latencies else None,
+        'errors': len(errors),
+        'master_rss_kb': master_rss,
+        'worker_rss_kb': round(statistics.mean(rss for rss, _ in usage)) if usage else None,
+        'worker_pss_kb': round(statistics.mean(pss for _, pss in usage)) if usage else None,
+        'total_pss_kb': master_pss + sum(pss for _, pss in usage),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', action='append', type=parse_config, required=True,
+                        help='name:VAR=value,VAR=value (repeatable).')
+    parser.add_argument('--path', default='/legerity/products/')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--ini', type=Path, default=SCRIPTS / 'uwsgi.ini')
+    parser.add_argument('--chdir', type=Path, default=Path.cwd())
+    parser.add_argument('--json', action='store_true', help='Print one JSON object per config.')
+    args = parser.parse_args()
+
+    results = [bench(name, overrides, args) for name, overrides in args.config]
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+
+    columns = list(results[0])
+    widths = [max(len(column), *(len(str(row[column])) for row in results))
+              for column in columns]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in results:
+        print('  '.join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,8 +2,21 @@
 
 set -e
 
-python manage.py wait_for_db
-python manage.py collectstatic --noinput
-python manage.py migrate
+# Waits for the database, then collects static files and migrates only when needed.
+python manage.py fast_boot
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# Serving profile defaults, see /scripts/uwsgi.ini.
+export WEB_SOCKET="${WEB_SOCKET:-:9000}"
+export WEB_THREADS="${WEB_THREADS:-4}"
+export WEB_MIN_WORKERS="${WEB_MIN_WORKERS:-2}"
+export WEB_MAX_WORKERS="${WEB_MAX_WORKERS:-8}"
+export WEB_MAX_REQUESTS="${WEB_MAX_REQUESTS:-5000}"
+export WEB_RELOAD_ON_RSS="${WEB_RELOAD_ON_RSS:-256}"
+export WEB_HARAKIRI="${WEB_HARAKIRI:-600}"
+export WEB_LISTEN="${WEB_LISTEN:-100}"
+
+# Per-statement limit for web requests, in milliseconds. Set only here, so
+# fast_boot's migrations above and the job worker run without it.
+export DB_STATEMENT_TIMEOUT="${WEB_STATEMENT_TIMEOUT:-30000}"
+
+exec uwsgi --ini /scripts/uwsgi.ini
@@ -0,0 +1,18 @@
+#!/bin/sh
+
+set -e
+
+python manage.py wait_for_db
+
+# One process per container: cursors only resume in the process that issued
+# them, and the proxy pins each client to a container, not to a worker inside
+# it. Scale out with more containers; watchers are cheap, so one event loop
+# and LISTEN connection carry thousands of them. Open streams are cut after
+# the graceful timeout so deploys are not held up by idle watchers.
+export LIVE_PORT="${LIVE_PORT:-9001}"
+
+exec uvicorn app.asgi:application \
+    --host 0.0.0.0 \
+    --port "$LIVE_PORT" \
+    --no-access-log \
+    --timeout-graceful-shutdown 5